@@ -1,14 +1,16 @@
 """
 分类接口路由
 /api/v1/classify/check-cache - 查询缓存
+/api/v1/classify/upload-profile - 上传规格协商
 /api/v1/classify - 图片分类
 """
 
 from fastapi import APIRouter, File, UploadFile, Form, Header, HTTPException, Request
-from typing import Optional, List
+from typing import Optional, Tuple
 from datetime import datetime
 import time
 import json
+import asyncio
 
 from app.models.schemas import (
     CheckCacheRequest,
@@ -20,14 +22,22 @@ from app.models.schemas import (
     ClassificationData,
     BatchClassifyItem,
     BatchClassifyResponse,
-    ErrorResponse
+    UploadProfileResponse
 )
 from app.services.classifier import classifier
-from app.utils.image_utils import ImageUtils
+from app.services.cache_service import cache_service
+from app.utils.image_probe import ImageProbe
+from app.utils.upload_utils import UploadUtils
+from app.utils.multipart_stream import MultipartStream, MultipartPart
+from app.utils.hash_utils import HashUtils
+from app.config import settings
 from loguru import logger
 
 router = APIRouter(prefix="/api/v1", tags=["classify"])
 
+# 所有批量分类请求共享的并发上限（每个进程）
+batch_global_semaphore = asyncio.Semaphore(max(1, settings.BATCH_CLASSIFY_GLOBAL_CONCURRENCY))
+
 
 @router.post("/classify/check-cache", response_model=CheckCacheResponse)
 async def check_cache(
@@ -187,31 +197,58 @@ async def batch_check_cache(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/classify/upload-profile", response_model=UploadProfileResponse)
+async def get_upload_profile():
+    """
+    上传规格协商接口
+    
+    返回当前推理方式下建议客户端上传的图片尺寸、格式和质量；
+    客户端用原图计算SHA-256，按规格缩放后上传到/classify（original_sha256传原图哈希），
+    缓存仍以原图为键
+    """
+    return UploadProfileResponse(success=True, timestamp=datetime.now(), **UploadUtils.upload_profile())
+
+
 @router.post("/classify", response_model=ClassificationResponse)
 async def classify_image(
-    image: UploadFile = File(..., description="图片文件"),
-    image_hash: Optional[str] = Form(None, description="客户端计算的SHA-256哈希"),
+    image: UploadFile = File(..., description="图片文件（建议按/classify/upload-profile缩放）"),
+    image_hash: Optional[str] = Form(None, description="客户端计算的SHA-256哈希（兼容旧版本，同original_sha256）"),
+    original_sha256: Optional[str] = Form(None, description="原图SHA-256哈希（上传缩放图时作为缓存键）"),
     x_user_id: Optional[str] = Header(None, alias="X-User-ID"),
+    x_latency_budget_ms: Optional[int] = Header(None, alias="X-Latency-Budget-Ms"),
     request: Request = None
 ):
     """
     图片分类接口
     
     上传图片进行分类，如果缓存未命中则调用大模型
+    上传缩放图时传原图哈希，缓存以原图为键；未传哈希时使用上传数据的哈希
+    传X-Latency-Budget-Ms时按延迟预算选择推理方式（预算不足时降级到低分辨率单次请求或本地推理），
+    响应中返回实际使用的推理方式和是否在预算内完成
     注意：图片分类不扣减额度，只有图像增强（image-edit）才扣减额度
     """
     try:
-        # 读取图片数据
-        image_bytes = await image.read()
-        
-        # 验证图片
-        is_valid, error_msg = ImageUtils.validate_image(image_bytes)
+        # 原图哈希（优先original_sha256，image_hash保持原样兼容旧客户端）
+        if original_sha256 and not HashUtils.is_sha256(original_sha256):
+            raise HTTPException(status_code=400, detail="original_sha256无效（需为SHA-256十六进制字符串）")
+        client_hash = original_sha256.lower() if original_sha256 else image_hash
+        
+        # 请求头无效时不读取图片
+        if x_latency_budget_ms is not None and x_latency_budget_ms <= 0:
+            raise HTTPException(status_code=400, detail="X-Latency-Budget-Ms需为正整数（毫秒）")
+        
+        # 分块读取图片数据，边读边计算哈希，超过大小上限立即中止
+        try:
+            image_bytes, streamed_hash = await UploadUtils.read_image(image)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        # 解析并验证图片（只读取文件头；探针在整个分类链路中共享，只解析一次）
+        probe = ImageProbe(image_bytes)
+        is_valid, error_msg = probe.validate()
         if not is_valid:
             raise HTTPException(status_code=400, detail=error_msg)
         
-        # 标准化图片格式（将MPO等特殊格式转换为JPEG）
-        image_bytes = ImageUtils.normalize_image_format(image_bytes)
-        
         # 获取user_id和IP
         user_id = x_user_id
         ip_address = request.client.host if request else None
@@ -219,16 +256,19 @@ async def classify_image(
         # 分类
         result, from_cache, request_id, processing_time, inference_method = await classifier.classify_image(
             image_bytes=image_bytes,
-            image_hash=image_hash,
+            image_hash=client_hash or streamed_hash,
             user_id=user_id,
-            ip_address=ip_address
+            ip_address=ip_address,
+            probe=probe,
+            latency_budget_ms=x_latency_budget_ms
         )
         
         # 记录统一日志（单个分类请求）
         from app.services.stats_service import stats_service
         cached_count = 1 if from_cache else 0
         llm_count = 1 if not from_cache and inference_method in ('llm', 'llm_fallback') else 0
-        local_count = 1 if not from_cache and inference_method in ('local', 'local_fallback', 'local_test') else 0
+        local_count = 1 if not from_cache and inference_method in ('local', 'local_fallback', 'local_test', 'local_mapped') else 0
+        rule_count = 1 if not from_cache and inference_method == 'rule' else 0
         
         await stats_service.log_unified_request(
             request_id=request_id,
@@ -239,7 +279,8 @@ async def classify_image(
             total_images=1,
             cached_count=cached_count,
             llm_count=llm_count,
-            local_count=local_count
+            local_count=local_count,
+            rule_count=rule_count
         )
         
         return ClassificationResponse(
@@ -248,6 +289,9 @@ async def classify_image(
             from_cache=from_cache,
             processing_time_ms=processing_time,
             request_id=request_id,
+            inference_method="cache" if from_cache else inference_method,
+            latency_budget_ms=x_latency_budget_ms,
+            latency_budget_met=processing_time <= x_latency_budget_ms if x_latency_budget_ms else None,
             timestamp=datetime.now()
         )
         
@@ -258,41 +302,195 @@ async def classify_image(
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.post("/classify/batch", response_model=BatchClassifyResponse)
+# 批量分类请求体（流式解析，不使用File/Form参数，需手动声明OpenAPI文档）
+BATCH_CLASSIFY_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["images"],
+                    "properties": {
+                        "images": {
+                            "type": "array",
+                            "items": {"type": "string", "format": "binary"},
+                            "description": "图片文件列表"
+                        },
+                        "image_hashes": {
+                            "type": "string",
+                            "description": "图片哈希列表JSON字符串（建议放在图片之前）"
+                        }
+                    }
+                }
+            }
+        }
+    }
+}
+
+
+async def _classify_batch_item(
+    index: int,
+    part: MultipartPart,
+    image_hash: Optional[str],
+    user_id: Optional[str],
+    ip_address: Optional[str],
+    cache_checked: bool = False
+) -> Tuple[BatchClassifyItem, Optional[str]]:
+    """
+    处理批量分类中的单张图片（cache_checked为True表示客户端哈希已批量查询且未命中）
+    
+    Returns:
+        (结果项, 推理方式)，来自缓存时推理方式为cache，失败时为None
+    """
+    item_start_time = time.time()
+    filename = part.filename or f"image_{index}"
+    
+    try:
+        # 接收时已边读边计算哈希，超过大小上限的数据已丢弃
+        if part.too_large:
+            raise Exception(UploadUtils.size_error(part.size))
+        image_bytes = part.data
+        
+        # 解析并验证图片（只读取文件头；探针在整个分类链路中共享，只解析一次）
+        probe = ImageProbe(image_bytes)
+        is_valid, error_msg = probe.validate()
+        if not is_valid:
+            raise Exception(error_msg)
+        
+        # 调用分类服务（没有客户端哈希时使用接收时计算的哈希）
+        timeout = settings.BATCH_CLASSIFY_ITEM_TIMEOUT or None
+        try:
+            result, from_cache, request_id, processing_time, inference_method = await asyncio.wait_for(
+                classifier.classify_image(
+                    image_bytes=image_bytes,
+                    image_hash=image_hash or part.sha256,
+                    user_id=user_id,
+                    ip_address=ip_address,
+                    probe=probe,
+                    cache_checked=cache_checked
+                ),
+                timeout
+            )
+        except asyncio.TimeoutError:
+            raise Exception(f"处理超时（超过{timeout}秒）")
+        
+        item_processing_time = int((time.time() - item_start_time) * 1000)
+        
+        # 成功结果
+        item = BatchClassifyItem(
+            index=index,
+            filename=filename,
+            success=True,
+            data=ClassificationData(**result),
+            error=None,
+            from_cache=from_cache,
+            processing_time_ms=item_processing_time
+        )
+        return item, "cache" if from_cache else inference_method
+    
+    except Exception as e:
+        item_processing_time = int((time.time() - item_start_time) * 1000)
+        logger.error(f"批量分类-图片{index}失败: {e}")
+        
+        # 失败结果
+        item = BatchClassifyItem(
+            index=index,
+            filename=filename,
+            success=False,
+            data=None,
+            error=str(e),
+            from_cache=False,
+            processing_time_ms=item_processing_time
+        )
+        return item, None
+
+
+async def _run_batch_item(
+    semaphore: asyncio.Semaphore,
+    index: int,
+    part: MultipartPart,
+    image_hash: Optional[str],
+    user_id: Optional[str],
+    ip_address: Optional[str],
+    cache_checked: bool = False
+) -> Tuple[BatchClassifyItem, Optional[str]]:
+    """在请求内和全局并发上限下处理单张图片（排队时间不计入processing_time_ms）"""
+    async with semaphore, batch_global_semaphore:
+        return await _classify_batch_item(index, part, image_hash, user_id, ip_address, cache_checked)
+
+
+def _cached_batch_item(index: int, part: MultipartPart, cached: dict) -> BatchClassifyItem:
+    """批量查询缓存命中的图片直接返回结果（不校验、不解码）"""
+    return BatchClassifyItem(
+        index=index,
+        filename=part.filename or f"image_{index}",
+        success=True,
+        data=ClassificationData(
+            category=cached['category'],
+            confidence=float(cached['confidence']),
+            description=cached.get('description')
+        ),
+        error=None,
+        from_cache=True,
+        processing_time_ms=0
+    )
+
+
+async def _duplicate_batch_item(
+    first: asyncio.Task,
+    index: int,
+    part: MultipartPart
+) -> Tuple[BatchClassifyItem, Optional[str]]:
+    """同一批次中重复的图片等待第一张的结果后直接复用"""
+    item_start_time = time.time()
+    item, _ = await asyncio.shield(first)
+    duplicate = item.model_copy(update={
+        "index": index,
+        "filename": part.filename or f"image_{index}",
+        "from_cache": item.success,
+        "processing_time_ms": int((time.time() - item_start_time) * 1000)
+    })
+    return duplicate, "cache" if item.success else None
+
+
+def _completed(result) -> asyncio.Future:
+    """已完成的Future（与处理任务一起gather）"""
+    future = asyncio.get_running_loop().create_future()
+    future.set_result(result)
+    return future
+
+
+@router.post("/classify/batch", response_model=BatchClassifyResponse, openapi_extra=BATCH_CLASSIFY_OPENAPI)
 async def batch_classify(
-    images: List[UploadFile] = File(..., description="图片文件列表"),
-    image_hashes: Optional[str] = Form(None, description="图片哈希列表JSON字符串"),
-    x_user_id: Optional[str] = Header(None, alias="X-User-ID"),
-    request: Request = None
+    request: Request,
+    x_user_id: Optional[str] = Header(None, alias="X-User-ID")
 ):
     """
     批量图片分类接口
     
     一次性上传多张图片进行分类
     最多支持20张图片
+    
+    请求体边接收边解析：每张图片接收完立即开始哈希、查缓存和分类，
+    后续图片仍在上传时前面的图片已在处理；多张图片在并发上限内同时处理，
+    结果按图片顺序返回。
+    image_hashes先于图片到达时一次批量查询缓存，命中的图片直接返回；
+    同一批次中的重复图片只处理一次
     """
+    tasks = []
     try:
         # 限制最大数量
         max_images = 20
-        if len(images) > max_images:
-            raise HTTPException(
-                status_code=400,
-                detail=f"一次最多上传{max_images}张图片，当前: {len(images)}"
-            )
         
-        # 解析image_hashes
-        hashes_list = []
-        if image_hashes:
-            try:
-                hashes_list = json.loads(image_hashes)
-                if not isinstance(hashes_list, list):
-                    hashes_list = []
-            except:
-                hashes_list = []
+        try:
+            parser = MultipartStream(request.headers.get("content-type", ""), settings.max_image_size_bytes)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
         # 获取user_id
         user_id = x_user_id
-        ip_address = request.client.host if request else None
+        ip_address = request.client.host if request.client else None
         
         # 生成批量请求ID
         from app.utils.id_generator import IDGenerator
@@ -301,77 +499,108 @@ async def batch_classify(
         # 记录开始时间
         batch_start_time = time.time()
         
-        # 处理每张图片
-        results = []
-        success_count = 0
-        fail_count = 0
-        cached_count = 0
-        llm_count = 0
-        local_count = 0
+        # 每张图片接收完立即创建处理任务（与后续图片的接收并行），请求内和全局各有并发上限
+        semaphore = asyncio.Semaphore(max(1, settings.BATCH_CLASSIFY_CONCURRENCY))
         
-        for index, image in enumerate(images):
-            item_start_time = time.time()
+        hashes_list = []
+        received = []
+        item_tasks = []
+        cache_lookup = None
+        cache_hits = []
+        inflight = {}
+        duplicates = []
+        total_images = 0
+        async for part in parser.parts(request.stream()):
+            if not part.is_file:
+                # 解析image_hashes
+                if part.name == "image_hashes":
+                    try:
+                        hashes_list = json.loads(part.text)
+                        if not isinstance(hashes_list, list):
+                            hashes_list = []
+                    except:
+                        hashes_list = []
+                    # 客户端哈希已知：一次批量查询缓存（与后续图片的上传并行）
+                    known_hashes = [h for h in hashes_list if isinstance(h, str) and h]
+                    if known_hashes:
+                        cache_lookup = asyncio.create_task(cache_service.get_cached_results(known_hashes))
+                        tasks.append(cache_lookup)
+                continue
+            if part.name != "images":
+                continue
             
-            try:
-                # 读取图片
-                image_bytes = await image.read()
-                
-                # 验证图片
-                is_valid, error_msg = ImageUtils.validate_image(image_bytes)
-                if not is_valid:
-                    raise Exception(error_msg)
-                
-                # 标准化图片格式（将MPO等特殊格式转换为JPEG）
-                image_bytes = ImageUtils.normalize_image_format(image_bytes)
-                
-                # 获取对应的hash（如果有）
-                image_hash = hashes_list[index] if index < len(hashes_list) else None
-                
-                # 调用分类服务
-                result, from_cache, request_id, processing_time, inference_method = await classifier.classify_image(
-                    image_bytes=image_bytes,
-                    image_hash=image_hash,
-                    user_id=user_id,
-                    ip_address=ip_address
+            if total_images >= max_images:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"一次最多上传{max_images}张图片，当前超过{max_images}张"
                 )
-                
-                # 统计处理方式
-                if from_cache:
-                    cached_count += 1
-                elif inference_method in ('llm', 'llm_fallback'):
-                    llm_count += 1
-                elif inference_method in ('local', 'local_fallback', 'local_test'):
-                    local_count += 1
-                
-                item_processing_time = int((time.time() - item_start_time) * 1000)
-                
-                # 成功结果
-                results.append(BatchClassifyItem(
-                    index=index,
-                    filename=image.filename or f"image_{index}",
-                    success=True,
-                    data=ClassificationData(**result),
-                    error=None,
-                    from_cache=from_cache,
-                    processing_time_ms=item_processing_time
-                ))
-                success_count += 1
-                
-            except Exception as e:
-                item_processing_time = int((time.time() - item_start_time) * 1000)
-                logger.error(f"批量分类-图片{index}失败: {e}")
-                
-                # 失败结果
-                results.append(BatchClassifyItem(
-                    index=index,
-                    filename=image.filename or f"image_{index}",
-                    success=False,
-                    data=None,
-                    error=str(e),
-                    from_cache=False,
-                    processing_time_ms=item_processing_time
+            
+            # 获取对应的hash（如果有）
+            image_hash = hashes_list[total_images] if total_images < len(hashes_list) else None
+            if not isinstance(image_hash, str):
+                image_hash = None
+            cache_checked = bool(image_hash) and cache_lookup is not None
+            
+            cached = (await cache_lookup).get(image_hash) if cache_checked else None
+            dedupe_key = image_hash or part.sha256
+            if cached:
+                # 批量查询已命中：直接返回，不校验、不解码、不推理
+                item = _cached_batch_item(total_images, part, cached)
+                item_tasks.append(_completed((item, "cache")))
+                cache_hits.append({
+                    "image_hash": image_hash,
+                    "image_size": part.size,
+                    "category": cached['category'],
+                    "confidence": float(cached['confidence']),
+                    "processing_time_ms": 0
+                })
+            elif dedupe_key in inflight:
+                # 同一批次中的重复图片：复用第一张的处理结果
+                item_tasks.append(asyncio.create_task(
+                    _duplicate_batch_item(inflight[dedupe_key], total_images, part)
                 ))
-                fail_count += 1
+                duplicates.append((total_images, part, dedupe_key))
+            else:
+                task = asyncio.create_task(
+                    _run_batch_item(semaphore, total_images, part, image_hash, user_id, ip_address, cache_checked)
+                )
+                inflight[dedupe_key] = task
+                item_tasks.append(task)
+            tasks.append(item_tasks[-1])
+            received.append((part, image_hash))
+            total_images += 1
+        
+        if total_images == 0:
+            raise HTTPException(status_code=400, detail="未上传图片")
+        
+        # 请求体接收完毕，等待剩余图片处理完成（结果与图片顺序一致）
+        outcomes = await asyncio.gather(*item_tasks)
+        await classifier.record_batch_cache_hits(cache_hits, user_id, ip_address)
+        
+        # 统计处理方式
+        results = [item for item, _ in outcomes]
+        
+        # 同一批次中的重复图片写入请求日志（推理方式dedup）
+        await classifier.record_batch_duplicates([{
+            "image_hash": dedupe_key,
+            "image_size": part.size,
+            "category": results[index].data.category,
+            "confidence": results[index].data.confidence,
+            "processing_time_ms": results[index].processing_time_ms
+        } for index, part, dedupe_key in duplicates if results[index].success], user_id, ip_address)
+        methods = [method for _, method in outcomes]
+        success_count = sum(1 for item in results if item.success)
+        fail_count = total_images - success_count
+        cached_count = methods.count("cache")
+        llm_count = sum(1 for method in methods if method in ('llm', 'llm_fallback'))
+        local_count = sum(1 for method in methods if method in ('local', 'local_fallback', 'local_test', 'local_mapped'))
+        rule_count = methods.count("rule")
+        
+        # image_hashes在图片之后才到达时，图片已按接收时计算的哈希缓存，再复制一份到客户端哈希下
+        for index, (part, image_hash) in enumerate(received):
+            client_hash = hashes_list[index] if index < len(hashes_list) else None
+            if results[index].success and not image_hash and client_hash and client_hash != part.sha256:
+                await cache_service.copy_result(part.sha256, client_hash)
         
         # 计算总耗时
         total_processing_time = int((time.time() - batch_start_time) * 1000)
@@ -384,10 +613,11 @@ async def batch_classify(
             ip_address=ip_address,
             client_id=user_id,
             openid=None,
-            total_images=len(images),
+            total_images=total_images,
             cached_count=cached_count,
             llm_count=llm_count,
-            local_count=local_count
+            local_count=local_count,
+            rule_count=rule_count
         )
         
         # 保留旧的批量分类统计（兼容性）
@@ -395,7 +625,7 @@ async def batch_classify(
             request_id=batch_request_id,
             user_id=user_id,
             ip_address=ip_address,
-            total_count=len(images),
+            total_count=total_images,
             success_count=success_count,
             fail_count=fail_count,
             total_processing_time_ms=total_processing_time
@@ -403,7 +633,7 @@ async def batch_classify(
         
         return BatchClassifyResponse(
             success=True,
-            total=len(images),
+            total=total_images,
             success_count=success_count,
             fail_count=fail_count,
             items=results,
@@ -414,7 +644,16 @@ async def batch_classify(
         
     except HTTPException:
         raise
+    except ValueError as e:
+        # 请求体格式错误
+        logger.error(f"批量分类请求解析失败: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"批量分类失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        # 提前结束（超出数量、请求体错误、客户端断开）时停止处理任务
+        for task in tasks:
+            if not task.done():
+                task.cancel()
 
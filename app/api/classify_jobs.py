@@ -0,0 +1,321 @@
+"""
+异步批量分类任务路由
+/api/v1/classify/jobs - 创建任务
+/api/v1/classify/jobs/{job_id}/images - 上传图片
+/api/v1/classify/jobs/{job_id} - 查询进度
+/api/v1/classify/jobs/{job_id}/results - 分页获取结果
+"""
+
+from fastapi import APIRouter, Header, HTTPException, Request, Query
+from typing import Optional
+from datetime import datetime
+import asyncio
+import json
+
+from app.models.schemas import (
+    ClassifyJobCreateRequest,
+    ClassifyJobCreateResponse,
+    ClassifyJobStatus,
+    ClassifyJobUploadItem,
+    ClassifyJobUploadResponse,
+    ClassifyJobItem,
+    ClassifyJobResultsResponse,
+    ClassificationData
+)
+from app.services.classify_job_service import classify_job_service
+from app.utils.multipart_stream import MultipartStream
+from app.utils.hash_utils import HashUtils
+from app.config import settings
+from loguru import logger
+
+router = APIRouter(prefix="/api/v1/classify/jobs", tags=["classify"])
+
+JOB_ITEM_STATUSES = {"pending", "queued", "completed", "failed"}
+JOB_MODES = {"interactive", "offline"}
+# 进程繁忙（未处理完的图片达到上限）时建议客户端重试的间隔（秒）
+JOB_BUSY_RETRY_AFTER = 30
+
+# 上传图片请求体（流式解析，不使用File/Form参数，需手动声明OpenAPI文档）
+UPLOAD_JOB_IMAGES_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["images"],
+                    "properties": {
+                        "images": {
+                            "type": "array",
+                            "items": {"type": "string", "format": "binary"},
+                            "description": "图片文件列表"
+                        },
+                        "image_hashes": {
+                            "type": "string",
+                            "description": "图片哈希列表JSON字符串（创建任务时提交的哈希，需放在图片之前）"
+                        }
+                    }
+                }
+            }
+        }
+    }
+}
+
+
+def _job_status(job: dict) -> ClassifyJobStatus:
+    """任务进度响应"""
+    total = job['total_images']
+    completed = job['completed_images']
+    return ClassifyJobStatus(
+        job_id=job['job_id'],
+        status=job['status'],
+        mode=job.get('mode') or 'interactive',
+        total=total,
+        pending_count=job['pending_images'],
+        completed_count=completed,
+        success_count=job['success_count'],
+        fail_count=job['fail_count'],
+        cached_count=job['cached_count'],
+        progress=round(completed * 100 / total, 2) if total else 100.0,
+        created_at=job.get('created_at'),
+        updated_at=job.get('updated_at'),
+        finished_at=job.get('finished_at')
+    )
+
+
+async def _get_job_or_404(job_id: str) -> dict:
+    """
+    查询任务（轻量重试，缓解极短时间内读写竞态或连接池延迟）；
+    处理中的任务顺带恢复处理中断的图片
+    """
+    attempts = 3
+    delay_ms = 200
+    for i in range(attempts):
+        job = await classify_job_service.get_job(job_id)
+        if job:
+            if await classify_job_service.recover_stale_items(job):
+                job = await classify_job_service.get_job(job_id) or job
+            return job
+        if i < attempts - 1:
+            await asyncio.sleep(delay_ms / 1000)
+    raise HTTPException(status_code=404, detail="任务不存在")
+
+
+@router.post("", response_model=ClassifyJobCreateResponse)
+async def create_job(
+    request_body: ClassifyJobCreateRequest,
+    x_user_id: Optional[str] = Header(None, alias="X-User-ID"),
+    request: Request = None
+):
+    """
+    创建异步批量分类任务
+    
+    提交所有图片的哈希（最多CLASSIFY_JOB_MAX_IMAGES张），服务端一次批量查询缓存，
+    命中的图片立即完成；返回任务ID和需要上传图片的哈希列表
+    
+    mode=offline时上传的图片不立即分类，攒批后通过大模型批量接口处理（需开启OFFLINE_BATCH_ENABLED），
+    通常数分钟到数小时完成，适合相册补分类等不急用的场景
+    """
+    try:
+        if request_body.mode not in JOB_MODES:
+            raise HTTPException(status_code=400, detail=f"无效的处理方式：{request_body.mode}")
+        if request_body.mode == "offline" and not settings.OFFLINE_BATCH_ENABLED:
+            raise HTTPException(status_code=400, detail="离线批量分类未启用")
+        
+        image_hashes = request_body.image_hashes
+        max_images = settings.CLASSIFY_JOB_MAX_IMAGES
+        if len(image_hashes) > max_images:
+            raise HTTPException(
+                status_code=400,
+                detail=f"一个任务最多{max_images}张图片，当前{len(image_hashes)}张"
+            )
+        for index, image_hash in enumerate(image_hashes):
+            if not HashUtils.is_sha256(image_hash):
+                raise HTTPException(status_code=400, detail=f"第{index + 1}个图片哈希无效（需为SHA-256十六进制字符串）")
+        
+        # 获取user_id（优先使用Header）和IP
+        user_id = x_user_id or request_body.user_id
+        ip_address = request.client.host if request and request.client else None
+        
+        job, upload_hashes = await classify_job_service.create_job(
+            image_hashes=[h.lower() for h in image_hashes],
+            filenames=request_body.filenames,
+            user_id=user_id,
+            ip_address=ip_address,
+            mode=request_body.mode
+        )
+        if not job:
+            raise HTTPException(status_code=500, detail="任务创建失败")
+        
+        return ClassifyJobCreateResponse(
+            success=True,
+            job=_job_status(job),
+            upload_hashes=upload_hashes,
+            timestamp=datetime.now()
+        )
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"创建分类任务失败: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/{job_id}/images", response_model=ClassifyJobUploadResponse, openapi_extra=UPLOAD_JOB_IMAGES_OPENAPI)
+async def upload_job_images(job_id: str, request: Request):
+    """
+    上传任务中的图片（可分多次上传，单次最多CLASSIFY_JOB_UPLOAD_MAX_IMAGES张）
+    
+    请求体边接收边解析，每张图片接收完立即交给后台处理，接口在请求体接收完后返回，
+    不等待分类完成；处理失败的图片可以重新上传
+    
+    当前进程未处理完的图片达到CLASSIFY_JOB_MAX_PENDING时返回503（请求体接收过程中达到上限时，
+    之后的图片accepted为false），客户端稍后重新上传
+    """
+    try:
+        job = await _get_job_or_404(job_id)
+        if classify_job_service.busy:
+            raise HTTPException(
+                status_code=503,
+                detail="服务繁忙，请稍后重新上传",
+                headers={"Retry-After": str(JOB_BUSY_RETRY_AFTER)}
+            )
+        
+        try:
+            parser = MultipartStream(request.headers.get("content-type", ""), settings.max_image_size_bytes)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        max_images = settings.CLASSIFY_JOB_UPLOAD_MAX_IMAGES
+        hashes_list = []
+        items = []
+        async for part in parser.parts(request.stream()):
+            if not part.is_file:
+                # 解析image_hashes
+                if part.name == "image_hashes":
+                    try:
+                        hashes_list = json.loads(part.text)
+                        if not isinstance(hashes_list, list):
+                            hashes_list = []
+                    except:
+                        hashes_list = []
+                continue
+            if part.name != "images":
+                continue
+            
+            index = len(items)
+            if index >= max_images:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"一次最多上传{max_images}张图片，当前超过{max_images}张"
+                )
+            
+            # 获取对应的hash（如果有）
+            image_hash = hashes_list[index] if index < len(hashes_list) else None
+            image_hash = image_hash.lower() if isinstance(image_hash, str) else None
+            
+            matched_hash, item_count, error = await classify_job_service.enqueue_image(job, part, image_hash)
+            items.append(ClassifyJobUploadItem(
+                index=index,
+                filename=part.filename or f"image_{index}",
+                image_hash=matched_hash or image_hash or part.sha256,
+                accepted=matched_hash is not None,
+                item_count=item_count,
+                error=error
+            ))
+        
+        if not items:
+            raise HTTPException(status_code=400, detail="未上传图片")
+        
+        await classify_job_service.refresh_progress(job_id)
+        
+        accepted = sum(1 for item in items if item.accepted)
+        logger.info(f"分类任务接收图片: {job_id}, 上传: {len(items)}, 接收: {accepted}")
+        
+        return ClassifyJobUploadResponse(
+            success=True,
+            job_id=job_id,
+            received=len(items),
+            accepted=accepted,
+            items=items,
+            timestamp=datetime.now()
+        )
+    
+    except HTTPException:
+        raise
+    except ValueError as e:
+        # 请求体格式错误
+        logger.error(f"分类任务上传解析失败: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"分类任务上传失败: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/{job_id}", response_model=ClassifyJobStatus)
+async def get_job_status(job_id: str):
+    """查询任务进度"""
+    try:
+        job = await _get_job_or_404(job_id)
+        return _job_status(job)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"查询分类任务失败: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/{job_id}/results", response_model=ClassifyJobResultsResponse)
+async def get_job_results(
+    job_id: str,
+    cursor: int = Query(-1, description="游标（返回序号大于该值的图片，首页传-1）"),
+    limit: Optional[int] = Query(None, ge=1, description="每页条数（默认且最多CLASSIFY_JOB_RESULTS_PAGE_SIZE）"),
+    status: Optional[str] = Query(None, description="只返回指定状态的图片（pending/queued/completed/failed）")
+):
+    """
+    分页获取任务结果
+    
+    按图片序号排列，用上一页返回的next_cursor获取下一页；
+    处理中的任务也可以获取，已完成的图片已带结果
+    """
+    try:
+        if status and status not in JOB_ITEM_STATUSES:
+            raise HTTPException(status_code=400, detail=f"无效的状态：{status}")
+        page_size = settings.CLASSIFY_JOB_RESULTS_PAGE_SIZE
+        limit = min(limit or page_size, page_size)
+        
+        job = await _get_job_or_404(job_id)
+        rows, next_cursor = await classify_job_service.get_results(job_id, cursor, limit, status)
+        
+        items = [
+            ClassifyJobItem(
+                index=row['item_index'],
+                image_hash=row['image_hash'],
+                filename=row.get('filename'),
+                status=row['status'],
+                data=ClassificationData(
+                    category=row['category'],
+                    confidence=float(row['confidence']),
+                    description=row.get('description'),
+                    local_inference_result=row.get('local_inference_result')
+                ) if row['status'] == 'completed' else None,
+                error=row.get('error'),
+                from_cache=bool(row.get('from_cache')),
+                processing_time_ms=row.get('processing_time_ms')
+            )
+            for row in rows
+        ]
+        
+        return ClassifyJobResultsResponse(
+            success=True,
+            job=_job_status(job),
+            items=items,
+            next_cursor=next_cursor,
+            timestamp=datetime.now()
+        )
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"获取分类任务结果失败: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
@@ -3,17 +3,19 @@
 /api/v1/local-classify - 使用本地ONNX模型进行图片分类
 """
 
-from fastapi import APIRouter, File, UploadFile, HTTPException, Request, Header
+from fastapi import APIRouter, File, UploadFile, HTTPException, Request, Header, Depends
 from typing import Optional
 from datetime import datetime
 import time
 
 from app.models.schemas import ClassificationResponse, ClassificationData, ErrorResponse
-from app.services.local_model_inference import local_model_inference
+from app.services.classifier import get_local_inference
+from app.services.model_registry import model_registry
 from app.services.stats_service import stats_service
-from app.utils.image_utils import ImageUtils
-from app.utils.hash_utils import HashUtils
+from app.utils.image_probe import ImageProbe
+from app.utils.upload_utils import UploadUtils
 from app.utils.id_generator import IDGenerator
+from app.auth import get_current_user
 from loguru import logger
 
 router = APIRouter(prefix="/api/v1", tags=["local-classify"])
@@ -35,21 +37,26 @@ async def classify_image_local(
     - 推荐使用 /local-classify/detailed 接口获取完整信息
     """
     try:
-        # 读取图片数据
-        image_bytes = await image.read()
-        
-        # 验证图片
-        is_valid, error_msg = ImageUtils.validate_image(image_bytes)
+        # 分块读取图片数据，超过大小上限立即中止
+        try:
+            image_bytes, _ = await UploadUtils.read_image(image)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        # 解析并验证图片
+        probe = ImageProbe(image_bytes)
+        is_valid, error_msg = probe.validate()
         if not is_valid:
             raise HTTPException(status_code=400, detail=error_msg)
         
         # 确保模型已初始化
-        if not local_model_inference.is_initialized:
+        local_inference = get_local_inference()
+        if not local_inference.is_initialized:
             logger.info("🚀 首次调用，初始化本地模型...")
-            await local_model_inference.initialize()
+            await local_inference.initialize()
         
         # 使用本地模型进行推理
-        result = await local_model_inference.classify_image(image_bytes)
+        result = await local_inference.classify_image(image_bytes, probe=probe)
         
         if not result['success']:
             raise HTTPException(status_code=500, detail=result['message'])
@@ -91,17 +98,20 @@ async def classify_image_local_detailed(
     - 会记录统计数据（推理方式为 'local_test'）
     """
     try:
-        # 读取图片数据
-        image_bytes = await image.read()
-        
-        # 验证图片
-        is_valid, error_msg = ImageUtils.validate_image(image_bytes)
+        # 分块读取图片数据，边读边计算哈希，超过大小上限立即中止
+        try:
+            image_bytes, image_hash = await UploadUtils.read_image(image)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        # 解析并验证图片
+        probe = ImageProbe(image_bytes)
+        is_valid, error_msg = probe.validate()
         if not is_valid:
             raise HTTPException(status_code=400, detail=error_msg)
         
-        # 生成请求ID和计算哈希
+        # 生成请求ID
         request_id = IDGenerator.generate_request_id()
-        image_hash = HashUtils.calculate_sha256(image_bytes)
         image_size = len(image_bytes)
         user_id = x_user_id or "admin_test"
         ip_address = request.client.host if request else None
@@ -109,12 +119,13 @@ async def classify_image_local_detailed(
         start_time = time.time()
         
         # 确保模型已初始化
-        if not local_model_inference.is_initialized:
+        local_inference = get_local_inference()
+        if not local_inference.is_initialized:
             logger.info("🚀 首次调用，初始化本地模型...")
-            await local_model_inference.initialize()
+            await local_inference.initialize()
         
         # 使用本地模型进行推理
-        result = await local_model_inference.classify_image(image_bytes)
+        result = await local_inference.classify_image(image_bytes, probe=probe)
         
         processing_time = int((time.time() - start_time) * 1000)
         
@@ -146,6 +157,9 @@ async def classify_image_local_detailed(
                 "generalDetections": result['generalDetections'],
                 "mobileNetV3Detections": result['mobileNetV3Detections']
             },
+            "model_version": result.get('modelVersion'),
+            "execution_mode": result.get('executionMode'),
+            "timings": result.get('timings'),
             "processing_time_ms": processing_time,
             "request_id": request_id,
             "timestamp": datetime.now()
@@ -164,19 +178,59 @@ async def get_local_models_status():
     获取本地模型加载状态
     """
     try:
-        return {
-            "initialized": local_model_inference.is_initialized,
-            "models": {
-                name: {
-                    "loaded": name in local_model_inference.models,
-                    "path": path
-                }
-                for name, path in local_model_inference.model_paths.items()
-            },
-            "total_models": len(local_model_inference.model_paths),
-            "loaded_models": len(local_model_inference.models)
-        }
+        return await get_local_inference().get_status()
     except Exception as e:
         logger.error(f"获取模型状态失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+
+@router.get("/local-classify/versions", summary="获取本地模型版本列表")
+async def list_model_versions(current_user: str = Depends(get_current_user)):
+    """
+    获取可用的本地模型版本及当前版本状态（需要认证）
+    """
+    return {
+        "versions": model_registry.list_versions(),
+        "state": model_registry.read_state()
+    }
+
+
+@router.post("/local-classify/versions/rollback", summary="回滚本地模型版本")
+async def rollback_model_version(current_user: str = Depends(get_current_user)):
+    """
+    回滚到上一个模型版本（需要认证）
+    
+    上一版本仍在内存中时立即切换，否则在后台重新加载
+    """
+    try:
+        return await model_registry.rollback(current_user)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        logger.error(f"回滚模型版本失败: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/local-classify/versions/{version}/activate", summary="切换本地模型版本")
+async def activate_model_version(version: str, current_user: str = Depends(get_current_user)):
+    """
+    切换到指定模型版本（需要认证）
+    
+    新版本在后台加载并预热后原子替换当前版本，切换期间请求继续使用旧版本
+    返回的 status：
+    - active: 已是当前版本
+    - swapped: 从内存中的上一版本立即切换
+    - loading: 后台加载中（通过 /local-classify/models 查看进度）
+    - pending: 由模型服务进程或其他worker在同步时切换
+    """
+    try:
+        return await model_registry.request_activation(version, current_user)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        logger.error(f"切换模型版本失败: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
@@ -98,6 +98,68 @@ async def get_batch_classify_stats(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/progressive", summary="获取渐进式分类统计")
+async def get_progressive_stats(
+    days: int = 7,
+    current_user: str = Depends(get_current_user)
+):
+    """
+    获取渐进式分类统计（需要认证）
+    
+    Args:
+        days: 查询最近几天的数据，默认7天
+    """
+    try:
+        stats = await stats_service.get_progressive_stats(days=days)
+        return {"success": True, "data": stats}
+    except Exception as e:
+        logger.error(f"获取渐进式分类统计失败: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/pre-classifier", summary="获取规则预分类命中统计")
+async def get_pre_classifier_stats(
+    current_user: str = Depends(get_current_user)
+):
+    """
+    获取规则预分类各规则的命中次数和命中率（需要认证）
+    
+    统计为当前进程启动以来的数据，各worker独立统计；所有进程的命中总数见推理方式统计的rule
+    """
+    try:
+        from app.config import settings
+        from app.services.pre_classifier import pre_classifier
+        return {
+            "success": True,
+            "data": {"enabled": settings.PRE_CLASSIFIER_ENABLED, **pre_classifier.snapshot()}
+        }
+    except Exception as e:
+        logger.error(f"获取规则预分类统计失败: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/llm-calls", summary="获取大模型调用统计")
+async def get_llm_call_stats(
+    days: int = 7,
+    current_user: str = Depends(get_current_user)
+):
+    """
+    获取大模型调用统计（需要认证）
+    
+    Args:
+        days: 查询最近几天的数据，默认7天
+    """
+    try:
+        stats = await stats_service.get_llm_call_stats(days=days)
+        # 当前进程的推理方式延迟估计（延迟预算选择推理方式使用）
+        from app.services.latency_tracker import latency_tracker
+        stats["latency_estimates"] = latency_tracker.snapshot()
+        return {"success": True, "data": stats}
+    except Exception as e:
+        logger.error(f"获取大模型调用统计失败: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.get("/image-edit", summary="获取图片编辑统计")
 async def get_image_edit_stats(
     days: int = 7,
@@ -5,7 +5,7 @@
 
 from pydantic_settings import BaseSettings
 from pydantic import Field
-from typing import List
+from typing import List, Dict
 
 
 class Settings(BaseSettings):
@@ -26,10 +26,123 @@ class Settings(BaseSettings):
     LLM_MODEL: str = Field(default="gpt-4-vision-preview", description="模型名称")
     LLM_MAX_TOKENS: int = Field(default=500, description="最大token数")
     LLM_TIMEOUT: int = Field(default=30, description="请求超时(秒)")
+    LLM_PROGRESSIVE_ENABLED: bool = Field(
+        default=False,
+        description="是否启用渐进式分类（先用低分辨率副本请求大模型，置信度不足时再用上传的图片重新请求）"
+    )
+    LLM_PROGRESSIVE_LONG_SIDE: int = Field(default=512, description="渐进式分类首轮低分辨率副本的长边(像素)")
+    LLM_PROGRESSIVE_QUALITY: int = Field(default=75, description="渐进式分类首轮低分辨率副本的JPEG质量")
+    LLM_PROGRESSIVE_CONFIDENCE: float = Field(default=0.8, description="首轮置信度低于该值时用上传的图片重新请求")
+    LLM_PROGRESSIVE_REFINE_OTHER: bool = Field(default=True, description="首轮类别为other时是否重新请求")
+    LLM_PROMPT_PROFILE: str = Field(
+        default="default",
+        description="提示词模式（default: CLASSIFICATION_PROMPT文本返回JSON；compact: 精简提示词+提供商原生结构化输出）"
+    )
+    LLM_COMPACT_MAX_TOKENS: int = Field(default=100, description="compact模式的最大输出token数")
+    LLM_CASCADE_MODELS: str = Field(
+        default="",
+        description="级联模型（同一提供商，从快/便宜到强/贵用分号分隔，如qwen-vl-plus;qwen-vl-max；为空时只调用LLM_MODEL）"
+    )
+    LLM_CASCADE_CONFIDENCE: float = Field(
+        default=0.8,
+        description="级联模型结果置信度低于该值（或无法解析为JSON、调用失败）时升级到下一级模型"
+    )
+    
+    # ===== 延迟预算配置 =====
+    LATENCY_BUDGET_EWMA_ALPHA: float = Field(default=0.2, description="推理方式延迟估计的指数加权系数（越大越偏重最近的请求）")
+    LATENCY_BUDGET_PRIOR_LOCAL_MS: int = Field(default=500, description="本地推理耗时的初始估计(毫秒)")
+    LATENCY_BUDGET_PRIOR_LLM_LOW_RES_MS: int = Field(default=2000, description="大模型低分辨率单次请求耗时的初始估计(毫秒)")
+    LATENCY_BUDGET_PRIOR_LLM_MS: int = Field(default=4000, description="大模型默认方式耗时的初始估计(毫秒，含渐进式分类的重新请求)")
+    LATENCY_BUDGET_ALLOW_LOCAL: bool = Field(
+        default=True,
+        description="延迟预算不足时是否允许降级到本地推理（结果需客户端映射分类）"
+    )
     
     # ===== 本地推理配置 =====
     USE_LOCAL_INFERENCE: bool = Field(default=False, description="是否使用本地推理（开启后不调用大模型）")
     LOCAL_INFERENCE_FALLBACK: bool = Field(default=True, description="大模型失败时是否降级到本地推理")
+    LOCAL_INFERENCE_PARALLEL: bool = Field(default=False, description="是否并行执行三个本地模型（每个模型独立线程）")
+    LOCAL_INFERENCE_INTRA_OP_THREADS: int = Field(
+        default=0,
+        description="每个ORT会话的intra-op线程数（0表示自动：并行模式按CPU核数均分，串行模式使用ORT默认值）"
+    )
+    LOCAL_INFERENCE_THREAD_BUDGET_ENABLED: bool = Field(
+        default=True,
+        description="是否按线程预算分配ORT线程（按CPU核数和推理进程数计算每个进程的线程数）"
+    )
+    LOCAL_INFERENCE_THREAD_BUDGET: int = Field(default=0, description="所有推理进程的ORT计算线程总数（0表示等于可用CPU核数）")
+    LOCAL_INFERENCE_WORKERS: int = Field(
+        default=0,
+        description="执行本地推理的worker数（0表示自动：使用gunicorn_config.py导出的worker数）"
+    )
+    LOCAL_INFERENCE_CPU_AFFINITY: bool = Field(default=False, description="是否将每个worker绑定到独立的CPU核（gunicorn部署时生效）")
+    LOCAL_INFERENCE_IO_BINDING: bool = Field(
+        default=True,
+        description="MobileNetV3是否使用ORT IO Binding（复用预分配的输入输出缓冲区，每次推理不再分配新内存）"
+    )
+    LOCAL_INFERENCE_CPU_MEM_ARENA: bool = Field(default=True, description="ORT会话是否启用CPU内存池（arena）")
+    LOCAL_INFERENCE_MEM_PATTERN: bool = Field(default=True, description="ORT会话是否启用内存模式优化（按首次推理规划内存分配）")
+    LOCAL_INFERENCE_TRACE_ALLOCATIONS: bool = Field(
+        default=False,
+        description="是否用tracemalloc统计每次推理的内存分配（Python和numpy分配，不含ORT内存池；有性能开销，仅用于排查）"
+    )
+    LOCAL_MODEL_VARIANTS: str = Field(
+        default="",
+        description="本地模型精度变体（格式: idCard=int8_dynamic;mobilenetv3=int8_static，可选fp32/int8_dynamic/int8_static，未配置的模型使用fp32）"
+    )
+    LOCAL_INFERENCE_GRAPH_ENABLED: bool = Field(default=False, description="是否启用条件推理图（按顺序执行模型，高置信度时提前退出）")
+    LOCAL_INFERENCE_GRAPH_ORDER: str = Field(
+        default="idCard;mobilenetv3;yolo8s",
+        description="推理图中模型的执行顺序（用分号分隔，未列出的模型不执行）"
+    )
+    LOCAL_INFERENCE_IDCARD_EXIT_CONF: float = Field(default=0.85, description="证件检测置信度达到该值时提前退出")
+    LOCAL_INFERENCE_MOBILENET_EXIT_CONF: float = Field(default=0.9, description="MobileNetV3截图类界面类别概率达到该值时提前退出")
+    LOCAL_INFERENCE_MOBILENET_EXIT_CLASSES: str = Field(
+        default="916;782;664;851;917;918;922",
+        description="可触发提前退出的ImageNet类别（网页、屏幕、显示器、电视、漫画、填字游戏、菜单，用分号分隔）"
+    )
+    LOCAL_MODEL_REGISTRY_DIR: str = Field(
+        default="",
+        description="本地模型版本目录（每个子目录为一个模型版本，为空时使用app/models/versions）"
+    )
+    LOCAL_MODEL_WARMUP_RUNS: int = Field(default=3, description="新模型版本切换前的预热推理次数")
+    LOCAL_MODEL_REGISTRY_SYNC_INTERVAL: int = Field(default=5, description="检查其他进程是否切换了模型版本的间隔(秒)")
+    LOCAL_MODEL_SERVER_ENABLED: bool = Field(default=False, description="是否使用独立模型服务进程（所有worker共享一份模型）")
+    LOCAL_MODEL_SERVER_SOCKET: str = Field(
+        default="/tmp/image-classifier-models.sock",
+        description="模型服务Unix Socket路径"
+    )
+    LOCAL_MODEL_SERVER_TIMEOUT: int = Field(default=30, description="模型服务请求超时(秒)")
+    
+    # ===== 规则预分类配置 =====
+    PRE_CLASSIFIER_ENABLED: bool = Field(
+        default=False,
+        description="是否启用规则预分类（缓存未命中后先按文件头/EXIF/尺寸规则判断，命中时不调用模型）"
+    )
+    PRE_CLASSIFIER_RULES: str = Field(
+        default="screenshot_metadata;screenshot_resolution",
+        description="启用的规则（按顺序匹配，用分号分隔）"
+    )
+    PRE_CLASSIFIER_CONFIDENCE: float = Field(default=0.95, description="规则命中时返回的置信度")
+    PRE_CLASSIFIER_SCREEN_RESOLUTIONS: str = Field(
+        default="750x1334;828x1792;1125x2436;1170x2532;1179x2556;1242x2688;1284x2778;1290x2796;"
+                "1080x1920;1080x2340;1080x2400;1080x2412;1220x2712;1260x2800;1440x3120;1440x3200",
+        description="手机屏幕分辨率（宽x高，用分号分隔；横屏截图按宽高互换匹配）"
+    )
+    
+    # ===== 本地优先分类配置 =====
+    LOCAL_FIRST_ENABLED: bool = Field(
+        default=False,
+        description="是否本地优先（先本地推理并在服务端映射类别，校准后的置信度足够时不调用大模型）"
+    )
+    LOCAL_FIRST_CONFIDENCE: float = Field(default=0.75, description="校准后的置信度达到该值时直接使用本地映射结果")
+    LOCAL_FIRST_CALIBRATION: str = Field(
+        default="",
+        description=(
+            "各类别的置信度校准系数（类别=系数，用分号分隔；未列出的类别总是调用大模型；"
+            "为空时不使用本地优先）。用tools/测试/calibrate_local_mapping.py在标注图片上统计后填写"
+        )
+    )
     
     # ===== 应用配置 =====
     APP_HOST: str = Field(default="0.0.0.0", description="应用主机")
@@ -43,6 +156,69 @@ class Settings(BaseSettings):
         default="jpg,jpeg,png,webp,gif,mpo",
         description="允许的图片格式"
     )
+    MAX_IMAGE_PIXELS: int = Field(
+        default=89478485,
+        description="最大图片像素数（宽x高，上传校验时从文件头读取，超出直接拒绝，防止解压炸弹；默认与Pillow的解压炸弹上限相同）"
+    )
+    IMAGE_DRAFT_DECODE: bool = Field(
+        default=True,
+        description="缩小图片时是否使用降分辨率解码（JPEG在DCT域直接按1/2、1/4、1/8解码）"
+    )
+    
+    # ===== 上传规格协商配置 =====
+    UPLOAD_PROFILE_LLM_LONG_SIDE: int = Field(default=1024, description="大模型推理时建议客户端上传的图片长边(像素)")
+    UPLOAD_PROFILE_LLM_QUALITY: int = Field(default=80, description="大模型推理时建议客户端上传的JPEG质量")
+    UPLOAD_PROFILE_LOCAL_LONG_SIDE: int = Field(default=640, description="本地推理时建议客户端上传的图片长边（YOLO输入尺寸）")
+    UPLOAD_PROFILE_LOCAL_SHORT_SIDE: int = Field(default=256, description="本地推理时上传图片的最小短边（MobileNetV3缩放尺寸）")
+    UPLOAD_PROFILE_LOCAL_QUALITY: int = Field(default=90, description="本地推理时建议客户端上传的JPEG质量")
+    
+    # ===== 批量分类配置 =====
+    BATCH_CLASSIFY_CONCURRENCY: int = Field(default=4, description="单个批量分类请求内同时处理的图片数")
+    BATCH_CLASSIFY_GLOBAL_CONCURRENCY: int = Field(
+        default=16,
+        description="每个进程内所有批量分类请求同时处理的图片总数上限（保护大模型接口和本地推理）"
+    )
+    BATCH_CLASSIFY_ITEM_TIMEOUT: int = Field(default=60, description="批量分类单张图片处理超时(秒，0表示不限制)")
+    
+    # ===== 异步批量分类任务配置 =====
+    CLASSIFY_JOB_MAX_IMAGES: int = Field(default=1000, description="单个异步批量分类任务的最大图片数")
+    CLASSIFY_JOB_UPLOAD_MAX_IMAGES: int = Field(default=50, description="异步批量分类任务单次上传的最大图片数")
+    CLASSIFY_JOB_CONCURRENCY: int = Field(default=8, description="每个进程内异步批量分类任务同时处理的图片数")
+    CLASSIFY_JOB_RESULTS_PAGE_SIZE: int = Field(default=100, description="异步批量分类任务结果每页最大条数")
+    CLASSIFY_JOB_SPOOL_DIR: str = Field(
+        default="/var/lib/image-classifier/classify-jobs",
+        description="异步批量分类任务已接收、未处理完的图片暂存目录（接收时先写入再确认，处理完删除；同一服务器的所有worker共享）"
+    )
+    CLASSIFY_JOB_MAX_PENDING: int = Field(
+        default=200,
+        description="每个进程内已接收、未处理完的任务图片数上限（达到上限时上传接口返回503，客户端稍后重试）"
+    )
+    CLASSIFY_JOB_STALE_SECONDS: int = Field(
+        default=600,
+        description="处理中的任务图片超过该时间(秒)没有进展视为处理中断（worker重启、崩溃），重新处理暂存的图片或标记为失败"
+    )
+    
+    # ===== 离线批量分类配置 =====
+    OFFLINE_BATCH_ENABLED: bool = Field(
+        default=False,
+        description="是否启用离线批量分类（mode=offline的分类任务通过大模型批量接口处理，由gunicorn主进程拉起离线批量处理进程）"
+    )
+    OFFLINE_BATCH_PROVIDER: str = Field(
+        default="",
+        description="批量接口提供商（openai/aliyun/stub，为空时使用LLM_PROVIDER；stub为本地测试桩，不调用外部接口）"
+    )
+    OFFLINE_BATCH_MODEL: str = Field(default="", description="批量接口使用的模型（为空时使用LLM_MODEL）")
+    OFFLINE_BATCH_SPOOL_DIR: str = Field(
+        default="/var/lib/image-classifier/offline-batch",
+        description="离线批量分类待提交图片的暂存目录（所有worker和离线批量处理进程共享）"
+    )
+    OFFLINE_BATCH_MIN_IMAGES: int = Field(default=50, description="待提交图片达到该数量时提交批量任务")
+    OFFLINE_BATCH_MAX_WAIT_SECONDS: int = Field(default=600, description="最早的待提交图片等待超过该时间(秒)时不足数量也提交")
+    OFFLINE_BATCH_MAX_IMAGES: int = Field(default=500, description="单个批量任务的最大图片数")
+    OFFLINE_BATCH_MAX_MB: int = Field(default=150, description="单个批量任务请求文件的最大大小(MB，Base64编码后)")
+    OFFLINE_BATCH_POLL_INTERVAL: int = Field(default=60, description="离线批量处理进程提交和轮询批量任务的间隔(秒)")
+    OFFLINE_BATCH_COMPLETION_WINDOW: str = Field(default="24h", description="批量任务完成时限（提供商参数）")
+    OFFLINE_BATCH_STUB_DELAY: int = Field(default=5, description="stub提供商的批量任务完成延迟(秒)")
     
     # ===== 日志配置 =====
     LOG_LEVEL: str = Field(default="INFO", description="日志级别")
@@ -53,10 +229,16 @@ class Settings(BaseSettings):
     
     # ===== 统计配置 =====
     ENABLE_REQUEST_LOG: bool = Field(default=True, description="是否记录请求日志")
+    ENABLE_LLM_CALL_LOG: bool = Field(default=True, description="是否记录大模型调用明细（llm_call_log表）")
     LOG_RETENTION_DAYS: int = Field(default=90, description="日志保留天数")
     
     # ===== 成本配置 =====
     COST_PER_API_CALL: float = Field(default=0.01, description="每次API调用成本(元)")
+    LLM_COST_PER_1K_INPUT_TOKENS: float = Field(
+        default=0.0,
+        description="大模型每千输入token成本(元)，输入/输出单价都为0时按COST_PER_API_CALL估算调用成本"
+    )
+    LLM_COST_PER_1K_OUTPUT_TOKENS: float = Field(default=0.0, description="大模型每千输出token成本(元)")
     
     # ===== 预定义分类 =====
     CATEGORIES: List[str] = [
@@ -93,6 +275,10 @@ class Settings(BaseSettings):
 只返回JSON，不要有其他文字。""",
         description="图片分类提示词"
     )
+    COMPACT_CLASSIFICATION_PROMPT: str = Field(
+        default="图片分类。category取值：social_activities多人社交/合影，pets宠物，single_person单人，foods美食，travel_scenery风景，screenshot手机截图，idcard证件，other其它。以JSON返回category、confidence(0-1)、description(中文15字内)。",
+        description="compact模式提示词（类别取值由结构化输出的枚举约束）"
+    )
     
     # ===== 认证配置 =====
     JWT_SECRET_KEY: str = Field(
@@ -159,6 +345,33 @@ class Settings(BaseSettings):
         """获取允许的图片格式列表"""
         return [fmt.strip().lower() for fmt in self.ALLOWED_IMAGE_FORMATS.split(",")]
     
+    @property
+    def local_inference_mobilenet_exit_classes(self) -> List[int]:
+        """获取可触发提前退出的MobileNetV3类别索引列表"""
+        return [int(idx) for idx in self.LOCAL_INFERENCE_MOBILENET_EXIT_CLASSES.split(";") if idx.strip()]
+    
+    @property
+    def llm_cascade_models(self) -> List[str]:
+        """获取级联模型列表（未配置时只有LLM_MODEL）"""
+        models = [model.strip() for model in self.LLM_CASCADE_MODELS.split(";") if model.strip()]
+        return models or [self.LLM_MODEL]
+    
+    @property
+    def pre_classifier_rules(self) -> List[str]:
+        """获取启用的规则预分类规则（按匹配顺序）"""
+        return [name.strip() for name in self.PRE_CLASSIFIER_RULES.split(";") if name.strip()]
+    
+    @property
+    def local_model_variants(self) -> Dict[str, str]:
+        """获取本地模型精度变体配置（模型名称 -> 变体）"""
+        variants = {}
+        for item in self.LOCAL_MODEL_VARIANTS.split(";"):
+            if "=" not in item:
+                continue
+            name, variant = item.split("=", 1)
+            variants[name.strip()] = variant.strip().lower()
+        return variants
+    
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
@@ -4,7 +4,7 @@
 """
 
 import aiomysql
-from typing import Optional
+from typing import Dict, Optional, Tuple
 from contextlib import asynccontextmanager
 from app.config import settings
 from loguru import logger
@@ -15,6 +15,8 @@ class Database:
     
     def __init__(self):
         self.pool: Optional[aiomysql.Pool] = None
+        # 字段是否存在（每个进程只查询一次，执行迁移脚本后重启生效）
+        self._columns: Dict[Tuple[str, str], bool] = {}
     
     async def connect(self):
         """创建数据库连接池"""
@@ -68,6 +70,33 @@ class Database:
             async with conn.cursor(aiomysql.DictCursor) as cursor:
                 yield cursor
                 await conn.commit()
+    
+    
+    async def has_column(self, table: str, column: str) -> bool:
+        """
+        表中是否有该字段（兼容未执行迁移的表结构，查询失败时视为没有该字段且不缓存）
+        
+        Args:
+            table: 表名
+            column: 字段名
+        """
+        key = (table, column)
+        if key not in self._columns:
+            try:
+                async with self.get_cursor() as cursor:
+                    await cursor.execute(
+                        """SELECT COUNT(*) AS n FROM information_schema.COLUMNS
+                           WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s""",
+                        (table, column)
+                    )
+                    row = await cursor.fetchone()
+            except Exception as e:
+                logger.warning(f"查询表结构失败: {table}.{column}, 错误: {e}")
+                return False
+            self._columns[key] = bool(row and row['n'])
+            if not self._columns[key]:
+                logger.warning(f"表 {table} 没有字段 {column}（未执行迁移脚本），不记录该字段")
+        return self._columns[key]
 
 
 # 全局数据库实例
@@ -5,7 +5,7 @@ FastAPI应用主入口
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse
 from contextlib import asynccontextmanager
 from loguru import logger
 import sys
@@ -13,7 +13,8 @@ import os
 
 from app.config import settings
 from app.database import db
-from app.api import classify, stats, health, location, auth, config, release, image_edit, user, payment
+from app.utils.upload_utils import UploadUtils
+from app.api import classify, classify_jobs, stats, health, location, auth, config, release, image_edit, user, payment
 # 延迟导入local_classify（避免启动时导入ultralytics导致的问题）
 try:
     from app.api import local_classify
@@ -74,7 +75,15 @@ app = FastAPI(
     redoc_url="/redoc"
 )
 
-# CORS中间件
+# 单图上传大小限制：Content-Length已超过上限时直接拒绝，不再接收和解析请求体
+@app.middleware("http")
+async def limit_upload_size(request: Request, call_next):
+    if request.method == "POST" and UploadUtils.request_too_large(request.url.path, request.headers.get("content-length")):
+        size = int(request.headers["content-length"])
+        return JSONResponse(status_code=413, content={"detail": UploadUtils.size_error(size)})
+    return await call_next(request)
+
+# CORS中间件（后注册的在外层，保证413响应也带CORS头）
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # 生产环境应该配置具体的域名
@@ -87,6 +96,7 @@ app.add_middleware(
 app.include_router(auth.router)
 app.include_router(user.router)  # 用户管理（额度查询）
 app.include_router(classify.router)
+app.include_router(classify_jobs.router)  # 异步批量分类任务
 if local_classify is not None:
     app.include_router(local_classify.router)  # 本地模型推理
 app.include_router(config.router)  # 运行时配置
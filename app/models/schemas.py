@@ -39,6 +39,9 @@ class ClassificationResponse(BaseModel):
     from_cache: bool = Field(..., description="是否来自缓存")
     processing_time_ms: int = Field(..., description="处理耗时(毫秒)")
     request_id: str = Field(..., description="请求ID")
+    inference_method: Optional[str] = Field(None, description="推理方式（cache/rule/llm/llm_fallback/local/local_fallback/local_mapped/local_test）")
+    latency_budget_ms: Optional[int] = Field(None, description="请求的延迟预算(毫秒)，未传X-Latency-Budget-Ms时为空")
+    latency_budget_met: Optional[bool] = Field(None, description="是否在延迟预算内完成")
     timestamp: datetime = Field(default_factory=datetime.now, description="时间戳")
 
 
@@ -92,6 +95,92 @@ class BatchClassifyResponse(BaseModel):
     timestamp: datetime = Field(default_factory=datetime.now, description="时间戳")
 
 
+class UploadProfileResponse(BaseModel):
+    """上传规格协商响应"""
+    success: bool = Field(True, description="是否成功")
+    inference_mode: str = Field(..., description="当前推理方式（llm/local）")
+    max_long_side: int = Field(..., description="建议上传的图片长边(像素)，原图更小时不放大")
+    min_short_side: int = Field(..., description="缩放后的最小短边(像素)，0表示不限制")
+    format: str = Field(..., description="建议上传的图片格式")
+    quality: int = Field(..., description="建议的JPEG质量")
+    max_size_mb: int = Field(..., description="上传图片大小上限(MB)")
+    timestamp: datetime = Field(default_factory=datetime.now, description="时间戳")
+
+
+class ClassifyJobCreateRequest(BaseModel):
+    """创建异步批量分类任务请求"""
+    image_hashes: List[str] = Field(..., description="图片SHA-256哈希值列表（按图片顺序）", min_items=1)
+    filenames: Optional[List[str]] = Field(None, description="文件名列表（与哈希顺序一致）")
+    user_id: Optional[str] = Field(None, description="用户ID/设备ID")
+    mode: str = Field("interactive", description="处理方式（interactive即时处理/offline通过大模型批量接口离线处理，适合不急用的大批量补分类）")
+
+
+class ClassifyJobStatus(BaseModel):
+    """异步批量分类任务进度"""
+    job_id: str = Field(..., description="任务ID")
+    status: str = Field(..., description="状态（pending待上传/processing处理中/completed已完成）")
+    mode: str = Field("interactive", description="处理方式（interactive/offline）")
+    total: int = Field(..., description="总数")
+    pending_count: int = Field(..., description="待上传数")
+    completed_count: int = Field(..., description="已完成数（成功+失败）")
+    success_count: int = Field(..., description="成功数")
+    fail_count: int = Field(..., description="失败数")
+    cached_count: int = Field(..., description="缓存命中数")
+    progress: float = Field(..., description="进度（0-100）")
+    created_at: Optional[datetime] = Field(None, description="创建时间")
+    updated_at: Optional[datetime] = Field(None, description="更新时间")
+    finished_at: Optional[datetime] = Field(None, description="首次全部完成时间")
+
+
+class ClassifyJobCreateResponse(BaseModel):
+    """创建异步批量分类任务响应"""
+    success: bool = Field(True, description="是否成功")
+    job: ClassifyJobStatus = Field(..., description="任务进度")
+    upload_hashes: List[str] = Field(..., description="需要上传图片的哈希列表（缓存未命中，已去重）")
+    timestamp: datetime = Field(default_factory=datetime.now, description="时间戳")
+
+
+class ClassifyJobUploadItem(BaseModel):
+    """异步批量分类任务中单张上传图片的接收结果"""
+    index: int = Field(..., description="图片在本次上传中的序号")
+    filename: str = Field(..., description="文件名")
+    image_hash: str = Field(..., description="图片哈希")
+    accepted: bool = Field(..., description="是否已接收并开始处理")
+    item_count: int = Field(0, description="任务中对应的图片数（哈希相同的图片共用一次处理）")
+    error: Optional[str] = Field(None, description="未接收的原因")
+
+
+class ClassifyJobUploadResponse(BaseModel):
+    """异步批量分类任务上传图片响应"""
+    success: bool = Field(True, description="是否成功")
+    job_id: str = Field(..., description="任务ID")
+    received: int = Field(..., description="本次上传的图片数")
+    accepted: int = Field(..., description="已接收的图片数")
+    items: List[ClassifyJobUploadItem] = Field(..., description="每张图片的接收结果")
+    timestamp: datetime = Field(default_factory=datetime.now, description="时间戳")
+
+
+class ClassifyJobItem(BaseModel):
+    """异步批量分类任务中单张图片的结果"""
+    index: int = Field(..., description="图片在任务中的序号")
+    image_hash: str = Field(..., description="图片哈希")
+    filename: Optional[str] = Field(None, description="文件名")
+    status: str = Field(..., description="状态（pending待上传/queued处理中/completed成功/failed失败）")
+    data: Optional[ClassificationData] = Field(None, description="分类数据")
+    error: Optional[str] = Field(None, description="错误信息")
+    from_cache: bool = Field(False, description="是否来自缓存")
+    processing_time_ms: Optional[int] = Field(None, description="处理耗时(毫秒)")
+
+
+class ClassifyJobResultsResponse(BaseModel):
+    """异步批量分类任务结果（分页）"""
+    success: bool = Field(True, description="是否成功")
+    job: ClassifyJobStatus = Field(..., description="任务进度")
+    items: List[ClassifyJobItem] = Field(..., description="本页结果（按序号排列）")
+    next_cursor: Optional[int] = Field(None, description="下一页游标（为空表示没有更多）")
+    timestamp: datetime = Field(default_factory=datetime.now, description="时间戳")
+
+
 class ErrorResponse(BaseModel):
     """错误响应"""
     success: bool = Field(False, description="是否成功")
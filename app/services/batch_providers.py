@@ -0,0 +1,182 @@
+"""
+大模型批量接口提供商
+离线批量分类把多张图片的分类请求打包成一个批量任务提交，完成后一次取回结果
+
+- openai: OpenAI Batch API（上传JSONL请求文件，创建/v1/chat/completions批量任务）
+- aliyun/qwen: 阿里云百炼Batch接口（OpenAI兼容模式，文件和批量任务接口与OpenAI相同）
+- stub: 本地测试桩，不调用外部接口，延迟OFFLINE_BATCH_STUB_DELAY秒后返回固定结果（仅用于测试环境）
+"""
+
+import base64
+import json
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+from loguru import logger
+
+from app.config import settings
+from app.services.model_client import model_client, ModelClient
+from app.utils.id_generator import IDGenerator
+
+# 批量任务状态
+BATCH_RUNNING = "running"
+BATCH_COMPLETED = "completed"
+BATCH_FAILED = "failed"
+
+
+class OpenAIBatchProvider:
+    """OpenAI兼容的批量接口（OpenAI / 阿里云百炼兼容模式）"""
+    
+    DASHSCOPE_BASE_URL = "https://dashscope.aliyuncs.com/compatible-mode/v1"
+    ENDPOINT = "/v1/chat/completions"
+    
+    def __init__(self, name: str, base_url: Optional[str] = None):
+        self.name = name
+        self.base_url = base_url
+        self.model = settings.OFFLINE_BATCH_MODEL or settings.LLM_MODEL
+    
+    def _client(self):
+        from openai import AsyncOpenAI
+        return AsyncOpenAI(api_key=settings.LLM_API_KEY, base_url=self.base_url)
+    
+    def build_request(self, image_hash: str, image_bytes: bytes) -> dict:
+        """构建一张图片的批量请求（请求体与同步调用相同，custom_id为图片哈希）"""
+        compact = settings.LLM_PROMPT_PROFILE == "compact"
+        image_base64 = base64.b64encode(image_bytes).decode('utf-8')
+        body = {
+            "model": self.model,
+            "messages": [
+                {
+                    "role": "user",
+                    "content": [
+                        {"type": "text", "text": model_client._build_prompt(compact)},
+                        {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{image_base64}"}}
+                    ]
+                }
+            ],
+            "max_tokens": settings.LLM_COMPACT_MAX_TOKENS if compact else settings.LLM_MAX_TOKENS
+        }
+        if compact:
+            if self.base_url:
+                body["response_format"] = {"type": "json_object"}
+            else:
+                body["response_format"] = {
+                    "type": "json_schema",
+                    "json_schema": {"name": "classification", "strict": True, "schema": ModelClient.CLASSIFICATION_SCHEMA}
+                }
+        return {"custom_id": image_hash, "method": "POST", "url": self.ENDPOINT, "body": body}
+    
+    async def submit(self, items: List[Tuple[str, bytes]]) -> str:
+        """
+        提交批量任务
+        
+        Args:
+            items: (图片哈希, 图片数据)列表
+        
+        Returns:
+            提供商的批量任务ID
+        """
+        lines = [json.dumps(self.build_request(image_hash, image_bytes)) for image_hash, image_bytes in items]
+        content = ("\n".join(lines) + "\n").encode('utf-8')
+        
+        client = self._client()
+        input_file = await client.files.create(file=("offline_batch.jsonl", content), purpose="batch")
+        batch = await client.batches.create(
+            input_file_id=input_file.id,
+            endpoint=self.ENDPOINT,
+            completion_window=settings.OFFLINE_BATCH_COMPLETION_WINDOW
+        )
+        logger.info(f"批量任务已提交: {self.name} {batch.id}, 图片数: {len(items)}, 请求文件: {len(content) // 1024}KB")
+        return batch.id
+    
+    async def poll(self, provider_batch_id: str) -> Tuple[str, Optional[str]]:
+        """
+        查询批量任务状态
+        
+        Returns:
+            (状态（running/completed/failed）, 失败原因)
+        """
+        batch = await self._client().batches.retrieve(provider_batch_id)
+        if batch.status == "completed":
+            return BATCH_COMPLETED, None
+        if batch.status in ("failed", "expired", "cancelled"):
+            return BATCH_FAILED, f"批量任务状态: {batch.status}"
+        return BATCH_RUNNING, None
+    
+    async def fetch_results(self, provider_batch_id: str) -> Dict[str, dict]:
+        """
+        取回批量任务结果（输出文件和错误文件）
+        
+        Returns:
+            {图片哈希: {"content": 模型返回的文本} 或 {"error": 失败原因}}
+        """
+        client = self._client()
+        batch = await client.batches.retrieve(provider_batch_id)
+        results = {}
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            content = await client.files.content(file_id)
+            for line in content.text.splitlines():
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                response = record.get("response") or {}
+                if response.get("status_code") == 200:
+                    results[record["custom_id"]] = {"content": response["body"]["choices"][0]["message"]["content"]}
+                else:
+                    error = record.get("error") or response.get("body") or "批量请求失败"
+                    results[record["custom_id"]] = {"error": str(error)[:500]}
+        return results
+
+
+class StubBatchProvider:
+    """本地测试桩（批量任务信息保存在暂存目录，提交后延迟完成，所有图片返回固定结果）"""
+    
+    name = "stub"
+    model = "stub"
+    
+    def _path(self, provider_batch_id: str) -> str:
+        return os.path.join(settings.OFFLINE_BATCH_SPOOL_DIR, f"{provider_batch_id}.json")
+    
+    async def submit(self, items: List[Tuple[str, bytes]]) -> str:
+        provider_batch_id = IDGenerator.generate_request_id("stub")
+        with open(self._path(provider_batch_id), "w") as f:
+            json.dump({"submitted_at": time.time(), "image_hashes": [image_hash for image_hash, _ in items]}, f)
+        logger.info(f"批量任务已提交: stub {provider_batch_id}, 图片数: {len(items)}")
+        return provider_batch_id
+    
+    async def poll(self, provider_batch_id: str) -> Tuple[str, Optional[str]]:
+        try:
+            with open(self._path(provider_batch_id)) as f:
+                batch = json.load(f)
+        except FileNotFoundError:
+            return BATCH_FAILED, "stub批量任务不存在"
+        if time.time() - batch["submitted_at"] < settings.OFFLINE_BATCH_STUB_DELAY:
+            return BATCH_RUNNING, None
+        return BATCH_COMPLETED, None
+    
+    async def fetch_results(self, provider_batch_id: str) -> Dict[str, dict]:
+        path = self._path(provider_batch_id)
+        with open(path) as f:
+            batch = json.load(f)
+        os.remove(path)
+        content = json.dumps({"category": "other", "confidence": 0.9, "description": "离线批量测试结果"}, ensure_ascii=False)
+        return {image_hash: {"content": content} for image_hash in batch["image_hashes"]}
+
+
+def get_batch_provider(name: Optional[str] = None):
+    """
+    获取批量接口提供商
+    
+    Args:
+        name: 提供商（默认使用OFFLINE_BATCH_PROVIDER，为空时使用LLM_PROVIDER）
+    """
+    name = name or settings.OFFLINE_BATCH_PROVIDER or settings.LLM_PROVIDER
+    if name == "stub":
+        return StubBatchProvider()
+    if name == "openai":
+        return OpenAIBatchProvider(name)
+    if name in ("aliyun", "qwen"):
+        return OpenAIBatchProvider(name, base_url=OpenAIBatchProvider.DASHSCOPE_BASE_URL)
+    raise ValueError(f"不支持的批量接口提供商: {name}")
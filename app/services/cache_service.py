@@ -3,7 +3,7 @@
 负责查询和更新image_classification_cache表
 """
 
-from typing import Optional
+from typing import Optional, List, Dict
 from app.database import db
 from loguru import logger
 
@@ -48,6 +48,44 @@ class CacheService:
             logger.error(f"查询缓存失败: {e}")
             return None
     
+    async def get_cached_results(self, image_hashes: List[str]) -> Dict[str, dict]:
+        """
+        批量查询缓存结果（一次IN查询）
+        
+        Args:
+            image_hashes: 图片SHA-256哈希列表
+        
+        Returns:
+            {哈希: 缓存结果}，只包含命中的哈希
+        """
+        image_hashes = list(dict.fromkeys(h for h in image_hashes if h))
+        if not image_hashes:
+            return {}
+        
+        try:
+            async with db.get_cursor() as cursor:
+                placeholders = ','.join(['%s'] * len(image_hashes))
+                sql = f"""
+                SELECT 
+                    image_hash,
+                    category,
+                    confidence,
+                    description,
+                    model_used,
+                    hit_count,
+                    created_at
+                FROM image_classification_cache
+                WHERE image_hash IN ({placeholders})
+                """
+                await cursor.execute(sql, image_hashes)
+                results = {row['image_hash']: row for row in await cursor.fetchall()}
+                logger.debug(f"批量查询缓存: {len(image_hashes)}个哈希，命中{len(results)}个")
+                return results
+        
+        except Exception as e:
+            logger.error(f"批量查询缓存失败: {e}")
+            return {}
+    
     async def save_result(self, image_hash: str, category: str, confidence: float,
                          description: Optional[str], model_used: str) -> bool:
         """
@@ -80,6 +118,67 @@ class CacheService:
             logger.error(f"保存缓存失败: {e}")
             return False
     
+    async def increment_hit_counts(self, image_hashes: List[str]) -> bool:
+        """
+        批量增加缓存命中次数（同一哈希出现多次时累加多次）
+        
+        Args:
+            image_hashes: 图片哈希列表
+        
+        Returns:
+            是否更新成功
+        """
+        counts: Dict[str, int] = {}
+        for image_hash in image_hashes:
+            counts[image_hash] = counts.get(image_hash, 0) + 1
+        if not counts:
+            return True
+        
+        try:
+            async with db.get_cursor() as cursor:
+                sql = """
+                UPDATE image_classification_cache
+                SET 
+                    hit_count = hit_count + %s,
+                    last_hit_at = NOW()
+                WHERE image_hash = %s
+                """
+                await cursor.executemany(sql, [(count, image_hash) for image_hash, count in counts.items()])
+                return True
+        
+        except Exception as e:
+            logger.error(f"批量更新命中次数失败: {e}")
+            return False
+    
+    async def copy_result(self, source_hash: str, target_hash: str) -> bool:
+        """
+        将已缓存的结果复制到另一个哈希下（目标已存在或来源未缓存时不做任何操作）
+        
+        Args:
+            source_hash: 已缓存结果的图片哈希
+            target_hash: 新的图片哈希
+        
+        Returns:
+            是否复制成功
+        """
+        try:
+            async with db.get_cursor() as cursor:
+                sql = """
+                INSERT IGNORE INTO image_classification_cache 
+                (image_hash, category, confidence, description, model_used, hit_count)
+                SELECT %s, category, confidence, description, model_used, 1
+                FROM image_classification_cache
+                WHERE image_hash = %s
+                """
+                await cursor.execute(sql, (target_hash, source_hash))
+                if cursor.rowcount:
+                    logger.info(f"缓存已复制: {source_hash[:16]}... -> {target_hash[:16]}...")
+                return cursor.rowcount > 0
+        
+        except Exception as e:
+            logger.error(f"复制缓存失败: {e}")
+            return False
+    
     async def increment_hit_count(self, image_hash: str) -> bool:
         """
         增加缓存命中次数
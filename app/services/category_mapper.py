@@ -0,0 +1,134 @@
+"""
+本地推理结果分类映射
+把本地模型的原始检测结果（证件检测、YOLO通用检测、MobileNetV3分类）映射到8个分类，
+并按类别校准置信度，供本地优先分类判断是否还需要调用大模型
+
+映射规则（按顺序匹配）：
+1. 检测到证件 → idcard（证件检测置信度）
+2. MobileNetV3 Top-1 属于截图类界面类别 → screenshot（Top-1概率）
+3. 人数：1人 → single_person（该人的置信度），多人 → social_activities（第二高的人物置信度）
+4. 检测到宠物 → pets（宠物检测置信度）
+5. 检测到食物 → foods（食物检测置信度）
+6. 检测物体少（≤3个）→ travel_scenery，否则 → other（没有直接证据，原始得分为0）
+
+与客户端 mapDetectionsToCategory 不完全相同：客户端没有第2步（截图），食物类别也更少，
+同一张图片两边的映射结果可能不同；local_mapped结果以服务端映射为准
+"""
+
+import math
+from typing import Dict, List, Optional, Tuple
+from loguru import logger
+from app.config import settings
+
+
+class CategoryMapper:
+    """本地推理结果分类映射类"""
+    
+    # COCO类别名称（YOLO通用检测）
+    PET_CLASSES = {"cat", "dog", "bird"}
+    FOOD_CLASSES = {"banana", "apple", "sandwich", "orange", "broccoli", "carrot", "hot dog", "pizza", "donut", "cake"}
+    SCENERY_MAX_OBJECTS = 3
+    
+    def __init__(self):
+        # 校准系数（启动时解析一次，配置修改后才重新解析）
+        self._calibration_source: Optional[str] = None
+        self._calibration: Dict[str, float] = {}
+        self.calibration()
+    
+    @staticmethod
+    def _max_conf(detections: List[Dict], classes=None) -> float:
+        """指定类别（为空时不限类别）检测框的最高置信度"""
+        scores = [det['confidence'] for det in detections if classes is None or det['className'] in classes]
+        return max(scores) if scores else 0.0
+    
+    def map(self, local_result: dict) -> Tuple[str, float, str]:
+        """
+        把原始检测结果映射到分类
+        
+        Args:
+            local_result: 本地推理返回的原始检测结果
+        
+        Returns:
+            (类别, 原始得分（映射依据的模型置信度，0~1）, 映射依据描述)
+        """
+        id_cards = local_result.get('idCardDetections') or []
+        general = local_result.get('generalDetections') or []
+        mobilenet = local_result.get('mobileNetV3Detections') or {}
+        
+        if id_cards:
+            return "idcard", self._max_conf(id_cards), f"检测到证件（{len(id_cards)}个）"
+        
+        top = mobilenet.get('topPrediction')
+        if top and top['index'] in settings.local_inference_mobilenet_exit_classes:
+            return "screenshot", top['probability'], f"MobileNetV3界面类别{top['index']}"
+        
+        persons = sorted((det['confidence'] for det in general if det['className'] == 'person'), reverse=True)
+        if len(persons) == 1:
+            return "single_person", persons[0], "检测到1人"
+        if len(persons) > 1:
+            return "social_activities", persons[1], f"检测到{len(persons)}人"
+        
+        if any(det['className'] in self.PET_CLASSES for det in general):
+            return "pets", self._max_conf(general, self.PET_CLASSES), "检测到宠物"
+        
+        if any(det['className'] in self.FOOD_CLASSES for det in general):
+            return "foods", self._max_conf(general, self.FOOD_CLASSES), "检测到食物"
+        
+        if len(general) <= self.SCENERY_MAX_OBJECTS:
+            return "travel_scenery", 0.0, f"检测物体{len(general)}个"
+        return "other", 0.0, f"检测物体{len(general)}个"
+    
+    def calibration(self) -> Dict[str, float]:
+        """
+        LOCAL_FIRST_CALIBRATION解析后的校准系数（类别 -> 系数）
+        
+        配置不变时直接返回上次的解析结果；格式不对的项（如pets=、pets=x）、未知类别和
+        负数/非有限的系数跳过并记录警告
+        """
+        source = settings.LOCAL_FIRST_CALIBRATION
+        if source != self._calibration_source:
+            calibration = {}
+            for item in source.split(";"):
+                item = item.strip()
+                if not item:
+                    continue
+                category, _, value = (part.strip() for part in item.partition("="))
+                try:
+                    scale = float(value)
+                except ValueError:
+                    scale = -1.0
+                if category not in settings.CATEGORIES or not math.isfinite(scale) or scale < 0:
+                    logger.warning(f"LOCAL_FIRST_CALIBRATION中的校准系数无效，已跳过: {item}")
+                    continue
+                calibration[category] = scale
+            self._calibration_source = source
+            self._calibration = calibration
+        return self._calibration
+    
+    def calibrate(self, category: str, score: float) -> float:
+        """
+        按类别校准置信度（原始得分乘以LOCAL_FIRST_CALIBRATION中该类别的系数，未配置的类别为0）
+        
+        不同类别的映射可靠程度不同（证件检测很少误报，单人/多人容易受背景人物影响），
+        系数用 tools/测试/calibrate_local_mapping.py 在标注图片上统计得出
+        """
+        scale = self.calibration().get(category, 0.0)
+        return round(min(1.0, max(0.0, score * scale)), 4)
+    
+    def classify(self, local_result: dict) -> dict:
+        """
+        映射并校准本地推理结果
+        
+        Returns:
+            分类结果（category、confidence为校准后的置信度、description）
+        """
+        category, score, reason = self.map(local_result)
+        return {
+            "category": category,
+            "confidence": self.calibrate(category, score),
+            "description": f"本地推理映射: {reason}"
+        }
+
+
+# 全局分类映射实例
+category_mapper = CategoryMapper()
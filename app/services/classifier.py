@@ -1,7 +1,7 @@
 """
 分类服务
-整合缓存查询、大模型调用、本地推理和日志记录
-支持：优先本地推理、大模型失败时降级到本地推理
+整合缓存查询、规则预分类、大模型调用、本地推理和日志记录
+支持：优先本地推理、本地优先（置信度不足时调用大模型）、大模型失败时降级到本地推理
 """
 
 import time
@@ -11,6 +11,9 @@ from app.utils.id_generator import IDGenerator
 from app.services.cache_service import cache_service
 from app.services.model_client import model_client
 from app.services.stats_service import stats_service
+from app.services.latency_tracker import latency_tracker
+from app.services.category_mapper import category_mapper
+from app.services.pre_classifier import pre_classifier
 from app.config import settings
 from loguru import logger
 
@@ -18,11 +21,20 @@ from loguru import logger
 _local_inference = None
 
 def get_local_inference():
-    """获取本地推理服务实例"""
+    """
+    获取本地推理服务实例
+    
+    开启独立模型服务时返回Unix Socket客户端（worker内不加载模型），
+    否则返回进程内的模型版本注册表（当前版本的本地推理服务，支持热切换）
+    """
     global _local_inference
     if _local_inference is None:
-        from app.services.local_model_inference import local_model_inference
-        _local_inference = local_model_inference
+        if settings.LOCAL_MODEL_SERVER_ENABLED:
+            from app.services.model_server_client import model_server_client
+            _local_inference = model_server_client
+        else:
+            from app.services.model_registry import model_registry
+            _local_inference = model_registry
     return _local_inference
 
 
@@ -54,6 +66,149 @@ class ClassifierService:
         
         return True
     
+    async def _call_llm(self, image_bytes: bytes, purpose: str, calls: Optional[list], started_at: Optional[float]) -> dict:
+        """
+        调用一次大模型（配置了级联模型时按级联依次调用），调用明细追加到calls（用于写入llm_call_log）
+        
+        Args:
+            image_bytes: 发送给大模型的图片数据
+            purpose: 调用用途（primary直接请求/low_res低分辨率首轮/refine重新请求）
+            calls: 本次请求的调用明细列表，为None时不记录
+            started_at: 请求开始时间，用于计算调用前的等待时间
+        """
+        call_info = {
+            "purpose": purpose,
+            "queue_ms": int((time.time() - started_at) * 1000) if started_at else None
+        }
+        return await model_client.classify_with_cascade(image_bytes, calls=calls, call_info=call_info)
+    
+    @staticmethod
+    def _result_model(calls: list) -> str:
+        """给出分类结果的模型（最后一次调用成功的模型，级联调用时可能不是LLM_MODEL）"""
+        return next((call['model'] for call in reversed(calls) if call.get('model') and not call.get('error')), settings.LLM_MODEL)
+    
+    async def _classify_with_llm(
+        self,
+        image_bytes: bytes,
+        probe=None,
+        calls: Optional[list] = None,
+        started_at: Optional[float] = None,
+        low_res_only: bool = False
+    ) -> Tuple[dict, Optional[dict]]:
+        """
+        调用大模型分类（开启渐进式分类时先用低分辨率副本请求）
+        
+        首轮结果无效、置信度低于LLM_PROGRESSIVE_CONFIDENCE或类别为other时，
+        再用上传的图片重新请求；上传的图片本身不大于低分辨率尺寸时只请求一次。
+        low_res_only为True时（延迟预算不足）只用低分辨率副本请求一次，不重新请求
+        
+        Args:
+            image_bytes: 图片二进制数据（已标准化）
+            probe: 上传时创建的图片探针（ImageProbe），复用其解码结果生成低分辨率副本
+            calls: 调用明细列表（可选，每次调用大模型追加一项）
+            started_at: 请求开始时间（可选，用于计算调用前的等待时间）
+            low_res_only: 只用低分辨率副本请求一次（不论是否开启渐进式分类）
+        
+        Returns:
+            (分类结果, 渐进式分类信息)，信息包含refined、low_res_category、low_res_confidence，
+            未使用渐进式分类时为None
+        """
+        if not settings.LLM_PROGRESSIVE_ENABLED and not low_res_only:
+            return await self._call_llm(image_bytes, "primary", calls, started_at), None
+        
+        try:
+            if probe is None:
+                from app.utils.image_probe import ImageProbe
+                probe = ImageProbe(image_bytes)
+            low_res = probe.rendition(settings.LLM_PROGRESSIVE_LONG_SIDE, settings.LLM_PROGRESSIVE_QUALITY)
+        except Exception as e:
+            logger.warning(f"生成低分辨率副本失败，直接使用上传的图片: {e}")
+            low_res = None
+        
+        if low_res is None:
+            return await self._call_llm(image_bytes, "primary", calls, started_at), None
+        
+        first = await self._call_llm(low_res, "low_res", calls, started_at)
+        if low_res_only:
+            logger.info(f"延迟预算只够低分辨率请求: {first['category']} ({first['confidence']:.2f}, {len(low_res) // 1024}KB)")
+            return first, None
+        
+        refined = (
+            not self._is_valid_classification(first)
+            or first['confidence'] < settings.LLM_PROGRESSIVE_CONFIDENCE
+            or (settings.LLM_PROGRESSIVE_REFINE_OTHER and first['category'] == 'other')
+        )
+        progressive = {
+            "refined": refined,
+            "low_res_category": first['category'],
+            "low_res_confidence": first['confidence']
+        }
+        
+        if not refined:
+            logger.info(f"低分辨率分类已足够: {first['category']} ({first['confidence']:.2f}, {len(low_res) // 1024}KB)")
+            return first, progressive
+        
+        logger.info(f"低分辨率分类置信度不足: {first['category']} ({first['confidence']:.2f})，使用上传的图片重新分类")
+        return await self._call_llm(image_bytes, "refine", calls, started_at), progressive
+    
+    async def _classify_local_first(self, image_bytes: bytes, probe, request_id: str) -> Tuple[Optional[dict], Optional[dict]]:
+        """
+        本地优先分类：本地推理后在服务端映射类别，校准后的置信度达到LOCAL_FIRST_CONFIDENCE时直接使用
+        
+        Returns:
+            (映射结果（置信度不足或推理失败时为None）, 本地推理原始结果（推理失败时为None）)
+        """
+        try:
+            local_start = time.time()
+            local_inference = get_local_inference()
+            if not local_inference.is_initialized:
+                await local_inference.initialize()
+            local_result = await local_inference.classify_image(image_bytes, probe=probe)
+            if not local_result['success']:
+                raise Exception(local_result.get('message') or "本地推理失败")
+            latency_tracker.observe("local", (time.time() - local_start) * 1000)
+        except Exception as e:
+            logger.warning(f"本地优先推理失败，调用大模型 [{request_id}]: {e}")
+            return None, None
+        
+        mapped = category_mapper.classify(local_result)
+        if mapped['confidence'] >= settings.LOCAL_FIRST_CONFIDENCE:
+            logger.info(f"本地优先分类: {mapped['category']} ({mapped['confidence']:.2f}) [{request_id}]")
+            return mapped, local_result
+        
+        logger.info(f"本地映射置信度不足，调用大模型 [{request_id}]: {mapped['category']} ({mapped['confidence']:.2f})")
+        return None, local_result
+    
+    def _select_path(self, remaining_ms: float, local_first: bool = False) -> Tuple[str, bool]:
+        """
+        按剩余延迟预算选择推理方式
+        
+        从默认方式（llm，开启渐进式分类时含重新请求）开始，估计耗时超出预算时
+        依次降级到低分辨率单次请求（llm_low_res）、本地推理（local）；都超出时使用估计最快的方式。
+        开启本地优先时，本地优先推理在大模型之前执行，大模型方式的估计耗时加上本地推理的估计耗时
+        仍在预算内才使用本地优先，否则跳过本地优先
+        
+        Args:
+            remaining_ms: 剩余延迟预算(毫秒)
+            local_first: 是否开启本地优先
+        
+        Returns:
+            (推理方式, 是否使用本地优先)
+        """
+        if local_first:
+            local_ms = latency_tracker.estimate("local")
+            for path in ("llm", "llm_low_res"):
+                if local_ms + latency_tracker.estimate(path) <= remaining_ms:
+                    return path, True
+        
+        paths = ["llm", "llm_low_res"]
+        if settings.LATENCY_BUDGET_ALLOW_LOCAL:
+            paths.append("local")
+        for path in paths:
+            if latency_tracker.estimate(path) <= remaining_ms:
+                return path, False
+        return min(paths, key=latency_tracker.estimate), False
+    
     async def classify_by_hash(
         self,
         image_hash: str,
@@ -128,15 +283,17 @@ class ClassifierService:
         request_id = IDGenerator.generate_request_id()
         results = []
         
-        # 并发查询所有哈希的缓存
-        for i, image_hash in enumerate(image_hashes):
-            # 正常的缓存查询逻辑
-            cached_result = await cache_service.get_cached_result(image_hash)
+        # 一次IN查询所有哈希的缓存，命中的哈希一次更新命中次数
+        cached_results = await cache_service.get_cached_results(image_hashes)
+        hit_hashes = [image_hash for image_hash in image_hashes if image_hash in cached_results]
+        if hit_hashes:
+            await cache_service.increment_hit_counts(hit_hashes)
+        
+        for image_hash in image_hashes:
+            cached_result = cached_results.get(image_hash)
             
             if cached_result:
                 # 缓存命中
-                await cache_service.increment_hit_count(image_hash)
-                
                 results.append({
                     "image_hash": image_hash,
                     "cached": True,
@@ -157,21 +314,88 @@ class ClassifierService:
         
         return results, request_id
     
+    async def record_batch_cache_hits(
+        self,
+        hits: List[dict],
+        user_id: Optional[str] = None,
+        ip_address: Optional[str] = None
+    ):
+        """
+        批量记录缓存命中（批量分类中直接由缓存返回的图片）：一次更新命中次数，一次写入请求日志
+        
+        Args:
+            hits: 命中列表，每项包含image_hash、image_size、category、confidence、processing_time_ms
+            user_id: 用户ID
+            ip_address: IP地址
+        """
+        if not hits:
+            return
+        await cache_service.increment_hit_counts([hit['image_hash'] for hit in hits])
+        await stats_service.log_requests([{
+            "request_id": IDGenerator.generate_request_id(),
+            "user_id": user_id,
+            "ip_address": ip_address,
+            "image_hash": hit['image_hash'],
+            "image_size": hit['image_size'],
+            "category": hit['category'],
+            "confidence": hit['confidence'],
+            "from_cache": True,
+            "processing_time_ms": hit['processing_time_ms'],
+            "inference_method": "cache"
+        } for hit in hits])
+    
+    async def record_batch_duplicates(
+        self,
+        duplicates: List[dict],
+        user_id: Optional[str] = None,
+        ip_address: Optional[str] = None
+    ):
+        """
+        批量记录同一批次中重复的图片（复用第一张的结果，未查缓存、未推理）：一次写入请求日志
+        
+        按缓存返回计入请求数和缓存命中率（from_cache=1），推理方式为dedup；不更新缓存命中次数
+        
+        Args:
+            duplicates: 重复图片列表，字段同record_batch_cache_hits的hits
+            user_id: 用户ID
+            ip_address: IP地址
+        """
+        if not duplicates:
+            return
+        await stats_service.log_requests([{
+            "request_id": IDGenerator.generate_request_id(),
+            "user_id": user_id,
+            "ip_address": ip_address,
+            "image_hash": item['image_hash'],
+            "image_size": item['image_size'],
+            "category": item['category'],
+            "confidence": item['confidence'],
+            "from_cache": True,
+            "processing_time_ms": item['processing_time_ms'],
+            "inference_method": "dedup"
+        } for item in duplicates])
+    
     async def classify_image(
         self,
         image_bytes: bytes,
         image_hash: Optional[str] = None,
         user_id: Optional[str] = None,
-        ip_address: Optional[str] = None
+        ip_address: Optional[str] = None,
+        probe=None,
+        cache_checked: bool = False,
+        latency_budget_ms: Optional[int] = None
     ) -> Tuple[dict, bool, str, int, str]:
         """
         完整的图片分类流程
         
         Args:
             image_bytes: 图片二进制数据
-            image_hash: 可选的预计算哈希
+            image_hash: 可选的预计算哈希（上传原始数据的SHA-256）
             user_id: 用户ID
             ip_address: IP地址
+            probe: 上传时创建的图片探针（ImageProbe），缓存未命中时用于标准化图片，本地推理复用其解析结果
+            cache_checked: 调用方已批量查询过该哈希且未命中时为True，跳过缓存查询
+            latency_budget_ms: 客户端的延迟预算(毫秒)，缓存未命中时按剩余预算选择推理方式
             
         Returns:
             (分类结果, 是否来自缓存, 请求ID, 处理耗时, 推理方式)
@@ -187,7 +411,7 @@ class ClassifierService:
         image_size = len(image_bytes)
         
         # 查询缓存
-        cached_result = await cache_service.get_cached_result(image_hash)
+        cached_result = None if cache_checked else await cache_service.get_cached_result(image_hash)
         
         if cached_result:
             # 缓存命中
@@ -218,19 +442,77 @@ class ClassifierService:
             logger.info(f"缓存命中 [{request_id}]: {result['category']} ({processing_time}ms)")
             return result, True, request_id, processing_time, "cache"
         
+        # 规则预分类：只看文件头、EXIF和尺寸，确定性高的图片不调用任何模型
+        if settings.PRE_CLASSIFIER_ENABLED:
+            if probe is None:
+                from app.utils.image_probe import ImageProbe
+                probe = ImageProbe(image_bytes)
+            rule_result = pre_classifier.classify(probe)
+            if rule_result:
+                rule = rule_result.pop("rule")
+                await cache_service.save_result(
+                    image_hash=image_hash,
+                    category=rule_result['category'],
+                    confidence=rule_result['confidence'],
+                    description=rule_result['description'],
+                    model_used=f"rule_{rule}"
+                )
+                processing_time = int((time.time() - start_time) * 1000)
+                await stats_service.log_request(
+                    request_id=request_id,
+                    user_id=user_id,
+                    ip_address=ip_address,
+                    image_hash=image_hash,
+                    image_size=image_size,
+                    category=rule_result['category'],
+                    confidence=rule_result['confidence'],
+                    from_cache=False,
+                    processing_time_ms=processing_time,
+                    inference_method="rule"
+                )
+                logger.info(f"规则预分类命中 [{request_id}]: {rule_result['category']} ({rule}, {processing_time}ms)")
+                return rule_result, False, request_id, processing_time, "rule"
+        
+        # 缓存未命中才标准化图片格式（MPO转JPEG），缓存命中时不解码图片
+        if probe is not None:
+            image_bytes = probe.normalized_bytes
+        
         # 缓存未命中，根据配置选择推理方式
         model_result = None
         inference_method = "unknown"
+        progressive = None
+        llm_calls = []
+        
+        # 延迟预算：按剩余预算和各推理方式的估计耗时选择推理方式，以及是否还有时间先做本地优先（开启本地推理开关时不选择）
+        budget_path = None
+        # 本地优先（未配置校准系数时任何类别都不会直接使用映射结果，不做本地优先）
+        local_first = settings.LOCAL_FIRST_ENABLED and not settings.USE_LOCAL_INFERENCE \
+            and bool(category_mapper.calibration())
+        if latency_budget_ms and not settings.USE_LOCAL_INFERENCE:
+            remaining_ms = latency_budget_ms - (time.time() - start_time) * 1000
+            budget_path, local_first = self._select_path(remaining_ms, local_first)
+            logger.info(
+                f"延迟预算 [{request_id}]: 剩余{int(remaining_ms)}ms，选择推理方式: {budget_path}"
+                f"{'（先本地优先）' if local_first else ''}"
+            )
+        
+        # 本地优先：先本地推理并映射类别，置信度足够时不调用大模型（结果可能需用于降级，保留原始结果）
+        local_first_result = None
+        if local_first:
+            model_result, local_first_result = await self._classify_local_first(image_bytes, probe, request_id)
+            if model_result:
+                inference_method = "local_mapped"
+        model_start = time.time()
         
-        # 策略1：如果开启本地推理开关，直接使用本地推理
-        if settings.USE_LOCAL_INFERENCE:
-            logger.info(f"缓存未命中，使用本地推理 [{request_id}]（配置开关已开启）")
+        # 策略1：如果开启本地推理开关（或延迟预算只够本地推理），直接使用本地推理
+        if settings.USE_LOCAL_INFERENCE or budget_path == "local":
+            logger.info(f"缓存未命中，使用本地推理 [{request_id}]（{'配置开关已开启' if settings.USE_LOCAL_INFERENCE else '延迟预算'}）")
             try:
                 local_inference = get_local_inference()
                 if not local_inference.is_initialized:
                     await local_inference.initialize()
                 
-                local_result = await local_inference.classify_image(image_bytes)
+                local_result = await local_inference.classify_image(image_bytes, probe=probe)
                 if local_result['success']:
                     # 本地推理需要客户端做分类映射，category留空作为标识
                     model_result = {
@@ -248,16 +530,19 @@ class ClassifierService:
                 # 如果本地推理失败，尝试大模型
                 if settings.LOCAL_INFERENCE_FALLBACK:
                     logger.warning(f"本地推理失败，降级到大模型 [{request_id}]")
-                    model_result = await model_client.classify_image(image_bytes)
+                    model_result, progressive = await self._classify_with_llm(image_bytes, probe, llm_calls, start_time)
                     inference_method = "llm_fallback"
                 else:
                     raise
         
-        # 策略2：优先大模型，失败时降级到本地推理
-        else:
+        # 策略2：优先大模型，失败时降级到本地推理（本地优先结果置信度足够时不调用）
+        elif model_result is None:
             logger.info(f"缓存未命中，调用大模型 [{request_id}]")
             try:
-                model_result = await model_client.classify_image(image_bytes)
+                model_result, progressive = await self._classify_with_llm(
+                    image_bytes, probe, llm_calls, start_time,
+                    low_res_only=budget_path == "llm_low_res"
+                )
                 inference_method = "llm"
             except Exception as e:
                 logger.error(f"大模型调用失败: {e}")
@@ -266,11 +551,14 @@ class ClassifierService:
                 if settings.LOCAL_INFERENCE_FALLBACK:
                     logger.warning(f"大模型失败，降级到本地推理 [{request_id}]")
                     try:
-                        local_inference = get_local_inference()
-                        if not local_inference.is_initialized:
-                            await local_inference.initialize()
+                        # 本地优先已推理过时复用结果
+                        local_result = local_first_result
+                        if local_result is None:
+                            local_inference = get_local_inference()
+                            if not local_inference.is_initialized:
+                                await local_inference.initialize()
+                            local_result = await local_inference.classify_image(image_bytes, probe=probe)
                         
-                        local_result = await local_inference.classify_image(image_bytes)
                         if local_result['success']:
                             model_result = {
                                 "category": "",  # 留空，客户端根据此判断需要使用本地映射
@@ -288,22 +576,38 @@ class ClassifierService:
                 else:
                     raise
         
+        # 更新推理方式延迟估计（降级的结果耗时包含失败的尝试，不计入）
+        model_ms = (time.time() - model_start) * 1000
+        if inference_method == "local":
+            latency_tracker.observe("local", model_ms)
+        elif inference_method == "llm":
+            latency_tracker.observe("llm_low_res" if budget_path == "llm_low_res" else "llm", model_ms)
+        
         # 判断是否成功分类（只有成功的结果才缓存）
         is_success = self._is_valid_classification(model_result)
         
-        # 注意：本地推理结果不缓存（因为需要客户端映射）
-        if is_success and inference_method in ["llm", "llm_fallback"]:
-            # 保存到缓存（仅大模型成功的分类结果）
+        # 延迟预算下的低分辨率结果置信度不足时不缓存（之后的请求可以用上传的图片重新分类）
+        low_res_unsure = (
+            is_success and inference_method == "llm" and budget_path == "llm_low_res"
+            and model_result['confidence'] < settings.LLM_PROGRESSIVE_CONFIDENCE
+        )
+        
+        # 注意：本地推理结果不缓存（因为需要客户端映射），服务端映射的本地优先结果可以缓存
+        if is_success and not low_res_unsure and inference_method in ["llm", "llm_fallback", "local_mapped"]:
+            # 保存到缓存（大模型成功的分类结果和本地优先结果）
             await cache_service.save_result(
                 image_hash=image_hash,
                 category=model_result['category'],
                 confidence=model_result['confidence'],
                 description=model_result.get('description'),
-                model_used=f"{settings.LLM_MODEL}_{inference_method}"
+                model_used="local_mapped" if inference_method == "local_mapped"
+                else f"{self._result_model(llm_calls)}_{inference_method}"
             )
             logger.info(f"分类结果已缓存: {model_result['category']}")
         elif inference_method in ["local", "local_fallback"]:
             logger.info(f"本地推理结果不缓存（需客户端映射）")
+        elif low_res_unsure:
+            logger.info(f"低分辨率结果置信度不足，不缓存: {model_result['category']} ({model_result['confidence']:.2f})")
         else:
             logger.warning(f"分类失败，不缓存此结果: {model_result.get('description')}")
         
@@ -320,8 +624,11 @@ class ClassifierService:
             confidence=model_result['confidence'],
             from_cache=False,
             processing_time_ms=processing_time,
-            inference_method=inference_method
+            inference_method=inference_method,
+            progressive=progressive
         )
+        if llm_calls:
+            await stats_service.log_llm_calls(request_id, llm_calls)
         
         logger.info(f"分类完成 [{request_id}]: {model_result['category']} ({processing_time}ms) [方式: {inference_method}]")
         return model_result, False, request_id, processing_time, inference_method
@@ -0,0 +1,509 @@
+"""
+异步批量分类任务服务
+大批量图片（数百张）分类：先提交哈希列表创建任务（缓存命中的图片立即完成），
+再分多次上传未命中的图片，后台在并发上限内处理；客户端轮询进度并分页获取结果，
+不受单个请求超时限制；mode=offline的任务通过大模型批量接口处理（见offline_batch_service）
+
+接收的图片先写入CLASSIFY_JOB_SPOOL_DIR再确认，处理完删除；worker重启或崩溃导致处理中断的图片
+（超过CLASSIFY_JOB_STALE_SECONDS没有进展）在查询任务时重新处理暂存的图片，暂存图片不存在时标记为失败
+"""
+
+import asyncio
+import json
+import os
+import shutil
+import time
+from typing import List, Optional, Tuple
+from loguru import logger
+
+from app.database import db
+from app.config import settings
+from app.services.cache_service import cache_service
+from app.services.classifier import classifier
+from app.services.pre_classifier import pre_classifier
+from app.utils.image_probe import ImageProbe
+from app.utils.upload_utils import UploadUtils
+from app.utils.multipart_stream import MultipartPart
+from app.utils.id_generator import IDGenerator
+
+
+class ClassifyJobService:
+    """异步批量分类任务服务类"""
+    
+    def __init__(self):
+        # 每个进程内所有任务共享的并发上限
+        self._semaphore = asyncio.Semaphore(max(1, settings.CLASSIFY_JOB_CONCURRENCY))
+        # 持有后台处理任务的引用，避免被垃圾回收（数量即当前进程已接收、未处理完的图片数）
+        self._tasks = set()
+    
+    @property
+    def busy(self) -> bool:
+        """当前进程已接收、未处理完的图片数是否达到CLASSIFY_JOB_MAX_PENDING"""
+        return len(self._tasks) >= max(1, settings.CLASSIFY_JOB_MAX_PENDING)
+    
+    def spool_path(self, job_id: str, image_hash: str) -> str:
+        """任务图片暂存路径"""
+        return os.path.join(settings.CLASSIFY_JOB_SPOOL_DIR, job_id, image_hash)
+    
+    @staticmethod
+    def _stale_condition(job: dict) -> str:
+        """
+        处理中断的图片条件（处理中且超过CLASSIFY_JOB_STALE_SECONDS没有进展，参数为秒数）；
+        离线任务中已进入离线批量队列的图片在等待批量接口结果，不算中断
+        """
+        condition = "(status = 'queued' AND updated_at < NOW() - INTERVAL %s SECOND"
+        if job.get('mode') == 'offline':
+            condition += (
+                " AND NOT EXISTS (SELECT 1 FROM offline_batch_images b"
+                " WHERE b.image_hash = classify_job_items.image_hash)"
+            )
+        return condition + ")"
+    
+    async def create_job(
+        self,
+        image_hashes: List[str],
+        filenames: Optional[List[str]] = None,
+        user_id: Optional[str] = None,
+        ip_address: Optional[str] = None,
+        mode: str = "interactive"
+    ) -> Tuple[dict, List[str]]:
+        """
+        创建任务（一次批量查询缓存，命中的图片直接完成）
+        
+        Args:
+            image_hashes: 图片哈希列表（按图片顺序）
+            filenames: 文件名列表（与哈希顺序一致）
+            user_id: 用户ID
+            ip_address: IP地址
+            mode: 处理方式（interactive即时处理/offline大模型批量接口离线处理）
+        
+        Returns:
+            (任务信息, 需要上传图片的哈希列表（已去重）)
+        """
+        job_id = IDGenerator.generate_request_id("job")
+        filenames = filenames or []
+        cached = await cache_service.get_cached_results(image_hashes)
+        
+        rows = []
+        cache_hits = []
+        upload_hashes = []
+        for index, image_hash in enumerate(image_hashes):
+            filename = filenames[index] if index < len(filenames) and filenames[index] else f"image_{index}"
+            hit = cached.get(image_hash)
+            if hit:
+                rows.append((
+                    job_id, index, image_hash, filename[:255], 'completed',
+                    hit['category'], float(hit['confidence']), hit.get('description'), 1, 'cache', 0
+                ))
+                cache_hits.append({
+                    "image_hash": image_hash,
+                    "image_size": 0,
+                    "category": hit['category'],
+                    "confidence": float(hit['confidence']),
+                    "processing_time_ms": 0
+                })
+            else:
+                rows.append((job_id, index, image_hash, filename[:255], 'pending', None, None, None, 0, None, None))
+                if image_hash not in upload_hashes:
+                    upload_hashes.append(image_hash)
+        
+        async with db.get_cursor() as cursor:
+            await cursor.execute(
+                """INSERT INTO classify_jobs (job_id, user_id, ip_address, total_images, status, mode)
+                   VALUES (%s, %s, %s, %s, %s, %s)""",
+                (job_id, user_id, ip_address, len(image_hashes), 'pending', mode)
+            )
+            await cursor.executemany(
+                """INSERT INTO classify_job_items
+                   (job_id, item_index, image_hash, filename, status, category, confidence, description,
+                    from_cache, inference_method, processing_time_ms)
+                   VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)""",
+                rows
+            )
+        
+        logger.info(f"分类任务已创建: {job_id} ({mode}), 图片数: {len(image_hashes)}, 缓存命中: {len(cache_hits)}, 待上传: {len(upload_hashes)}")
+        
+        await classifier.record_batch_cache_hits(cache_hits, user_id, ip_address)
+        await self.refresh_progress(job_id)
+        
+        return await self.get_job(job_id), upload_hashes
+    
+    async def get_job(self, job_id: str) -> Optional[dict]:
+        """查询任务进度"""
+        try:
+            # 规则命中数（未执行add_rule_count.sql时不查询）
+            rule_count = "rule_count, " if await db.has_column('classify_jobs', 'rule_count') else ""
+            async with db.get_cursor() as cursor:
+                await cursor.execute(
+                    "SELECT job_id, user_id, ip_address, status, mode, total_images, pending_images, completed_images, "
+                    f"success_count, fail_count, cached_count, llm_count, local_count, {rule_count}"
+                    "created_at, updated_at, finished_at "
+                    "FROM classify_jobs WHERE job_id = %s",
+                    (job_id,)
+                )
+                return await cursor.fetchone()
+        except Exception as e:
+            logger.error(f"查询分类任务失败: {job_id}, 错误: {e}")
+            return None
+    
+    async def get_results(
+        self,
+        job_id: str,
+        cursor_index: int = -1,
+        limit: int = 100,
+        status: Optional[str] = None
+    ) -> Tuple[List[dict], Optional[int]]:
+        """
+        分页查询任务结果（按序号排列）
+        
+        Args:
+            job_id: 任务ID
+            cursor_index: 游标（返回序号大于该值的图片）
+            limit: 每页条数
+            status: 只返回指定状态的图片
+        
+        Returns:
+            (本页结果, 下一页游标（没有更多时为None）)
+        """
+        sql = (
+            "SELECT item_index, image_hash, filename, status, category, confidence, description, "
+            "local_inference_result, from_cache, error, processing_time_ms "
+            "FROM classify_job_items WHERE job_id = %s AND item_index > %s"
+        )
+        params = [job_id, cursor_index]
+        if status:
+            sql += " AND status = %s"
+            params.append(status)
+        sql += " ORDER BY item_index LIMIT %s"
+        params.append(limit + 1)
+        
+        async with db.get_cursor() as cursor:
+            await cursor.execute(sql, params)
+            rows = await cursor.fetchall()
+        
+        for row in rows:
+            if row.get('local_inference_result'):
+                row['local_inference_result'] = json.loads(row['local_inference_result'])
+        
+        # 多查一条判断是否还有下一页
+        if len(rows) > limit:
+            rows = rows[:limit]
+            return rows, rows[-1]['item_index']
+        return rows, None
+    
+    async def enqueue_image(
+        self,
+        job: dict,
+        part: MultipartPart,
+        image_hash: Optional[str] = None
+    ) -> Tuple[Optional[str], int, Optional[str]]:
+        """
+        接收任务中一张图片并交给后台处理
+        
+        按客户端哈希（没有时按接收时计算的哈希）认领任务中待上传、失败或处理中断的图片，
+        同一任务中哈希相同的图片共用一次处理；认领是一条UPDATE，多次上传同一张图片只处理一次。
+        图片写入暂存目录后才确认接收，当前进程未处理完的图片达到上限时不接收
+        
+        Args:
+            job: 任务信息
+            part: 接收完成的图片
+            image_hash: 客户端提供的哈希
+        
+        Returns:
+            (认领的哈希, 对应的图片数, 未接收的原因)
+        """
+        if part.too_large:
+            return None, 0, UploadUtils.size_error(part.size)
+        if self.busy:
+            return None, 0, "服务繁忙，请稍后重新上传"
+        
+        job_id = job['job_id']
+        candidates = [h for h in (image_hash, part.sha256) if h]
+        async with db.get_cursor() as cursor:
+            for candidate in dict.fromkeys(candidates):
+                await cursor.execute(
+                    f"""UPDATE classify_job_items SET status = 'queued', error = NULL, updated_at = NOW()
+                        WHERE job_id = %s AND image_hash = %s
+                          AND (status IN ('pending', 'failed') OR {self._stale_condition(job)})""",
+                    (job_id, candidate, settings.CLASSIFY_JOB_STALE_SECONDS)
+                )
+                if cursor.rowcount:
+                    matched_hash, item_count = candidate, cursor.rowcount
+                    break
+            else:
+                return None, 0, "图片不属于该任务，或已上传"
+        
+        try:
+            await self._write_spool(job_id, matched_hash, part.data)
+        except Exception as e:
+            logger.error(f"分类任务图片暂存失败: {job_id}, {matched_hash[:16]}..., 错误: {e}")
+            await self._save_item_result(job_id, matched_hash, 'failed', error="图片暂存失败，请重新上传")
+            return None, 0, "图片暂存失败，请重新上传"
+        
+        self._start(job, matched_hash)
+        return matched_hash, item_count, None
+    
+    async def _write_spool(self, job_id: str, image_hash: str, image_bytes: bytes):
+        """写入暂存图片（先写临时文件再改名，不会留下不完整的文件）"""
+        path = self.spool_path(job_id, image_hash)
+        
+        def write():
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path + ".tmp", "wb") as f:
+                f.write(image_bytes)
+            os.replace(path + ".tmp", path)
+        
+        await asyncio.get_running_loop().run_in_executor(None, write)
+    
+    def _start(self, job: dict, image_hash: str):
+        """创建后台处理任务"""
+        task = asyncio.create_task(self._process_image(job, image_hash))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+    
+    async def recover_stale_items(self, job: dict) -> bool:
+        """
+        恢复处理中断的图片（查询任务时调用）：暂存图片还在时重新处理，否则标记为失败（客户端可重新上传）
+        
+        认领是一条带中断条件的UPDATE，多个worker同时查询时同一张图片只恢复一次；
+        当前进程未处理完的图片达到上限时暂不恢复
+        
+        Returns:
+            是否有图片被恢复或标记为失败
+        """
+        if job.get('status') != 'processing':
+            return False
+        
+        job_id = job['job_id']
+        stale = self._stale_condition(job)
+        try:
+            async with db.get_cursor() as cursor:
+                await cursor.execute(
+                    f"SELECT DISTINCT image_hash FROM classify_job_items WHERE job_id = %s AND {stale}",
+                    (job_id, settings.CLASSIFY_JOB_STALE_SECONDS)
+                )
+                image_hashes = [row['image_hash'] for row in await cursor.fetchall()]
+            
+            changed = False
+            for image_hash in image_hashes:
+                spooled = os.path.exists(self.spool_path(job_id, image_hash))
+                if spooled and self.busy:
+                    break
+                async with db.get_cursor() as cursor:
+                    await cursor.execute(
+                        f"""UPDATE classify_job_items SET updated_at = NOW()
+                            WHERE job_id = %s AND image_hash = %s AND {stale}""",
+                        (job_id, image_hash, settings.CLASSIFY_JOB_STALE_SECONDS)
+                    )
+                    if not cursor.rowcount:
+                        continue
+                
+                changed = True
+                if spooled:
+                    logger.warning(f"分类任务图片处理中断，重新处理: {job_id}, {image_hash[:16]}...")
+                    self._start(job, image_hash)
+                else:
+                    logger.warning(f"分类任务图片处理中断且暂存图片不存在，标记为失败: {job_id}, {image_hash[:16]}...")
+                    await self._save_item_result(job_id, image_hash, 'failed', error="处理中断，请重新上传")
+        except Exception as e:
+            logger.error(f"恢复分类任务中断图片失败: {job_id}, 错误: {e}")
+            return False
+        
+        if changed:
+            await self.refresh_progress(job_id)
+        return changed
+    
+    async def _process_image(self, job: dict, image_hash: str):
+        """
+        后台处理一张暂存的图片，结果写入任务中哈希相同的所有图片，处理完删除暂存图片
+        
+        离线任务只验证图片并转入离线批量队列，图片保持处理中，由离线批量处理进程写回结果（规则预分类命中的图片除外）
+        """
+        job_id = job['job_id']
+        path = self.spool_path(job_id, image_hash)
+        async with self._semaphore:
+            start_time = time.time()
+            try:
+                # 开始处理时刷新进度时间，排队等待并发名额的时间不计入中断判断
+                async with db.get_cursor() as cursor:
+                    await cursor.execute(
+                        """UPDATE classify_job_items SET updated_at = NOW()
+                           WHERE job_id = %s AND image_hash = %s AND status = 'queued'""",
+                        (job_id, image_hash)
+                    )
+                
+                def read():
+                    with open(path, "rb") as f:
+                        return f.read()
+                
+                image_bytes = await asyncio.get_running_loop().run_in_executor(None, read)
+                
+                # 解析并验证图片（只读取文件头）
+                probe = ImageProbe(image_bytes)
+                is_valid, error_msg = probe.validate()
+                if not is_valid:
+                    raise Exception(error_msg)
+                
+                # 规则预分类能命中的图片（如截图）不必等批量接口，直接按即时方式处理
+                if job.get('mode') == 'offline' and not (
+                    settings.PRE_CLASSIFIER_ENABLED and pre_classifier.classify(probe, count=False)
+                ):
+                    from app.services.offline_batch_service import offline_batch_service
+                    await offline_batch_service.enqueue(image_hash, probe.normalized_bytes)
+                    return
+                
+                timeout = settings.BATCH_CLASSIFY_ITEM_TIMEOUT or None
+                try:
+                    result, from_cache, _, _, inference_method = await asyncio.wait_for(
+                        classifier.classify_image(
+                            image_bytes=image_bytes,
+                            image_hash=image_hash,
+                            user_id=job.get('user_id'),
+                            ip_address=job.get('ip_address'),
+                            probe=probe
+                        ),
+                        timeout
+                    )
+                except asyncio.TimeoutError:
+                    raise Exception(f"处理超时（超过{timeout}秒）")
+                
+                processing_time = int((time.time() - start_time) * 1000)
+                await self._save_item_result(
+                    job_id, image_hash, 'completed',
+                    category=result['category'],
+                    confidence=result['confidence'],
+                    description=result.get('description'),
+                    local_inference_result=result.get('local_inference_result'),
+                    from_cache=from_cache,
+                    inference_method="cache" if from_cache else inference_method,
+                    processing_time_ms=processing_time
+                )
+            
+            except Exception as e:
+                processing_time = int((time.time() - start_time) * 1000)
+                logger.error(f"分类任务图片处理失败: {job_id}, {image_hash[:16]}..., 错误: {e}")
+                await self._save_item_result(
+                    job_id, image_hash, 'failed',
+                    error=str(e)[:500],
+                    processing_time_ms=processing_time
+                )
+            finally:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+        
+        await self.refresh_progress(job_id)
+    
+    async def _save_item_result(
+        self,
+        job_id: str,
+        image_hash: str,
+        status: str,
+        category: Optional[str] = None,
+        confidence: Optional[float] = None,
+        description: Optional[str] = None,
+        local_inference_result: Optional[dict] = None,
+        from_cache: bool = False,
+        inference_method: Optional[str] = None,
+        error: Optional[str] = None,
+        processing_time_ms: Optional[int] = None
+    ):
+        """保存图片处理结果（只更新处理中的图片）"""
+        try:
+            async with db.get_cursor() as cursor:
+                await cursor.execute(
+                    """UPDATE classify_job_items
+                       SET status = %s, category = %s, confidence = %s, description = %s, local_inference_result = %s,
+                           from_cache = %s, inference_method = %s, error = %s, processing_time_ms = %s
+                       WHERE job_id = %s AND image_hash = %s AND status = 'queued'""",
+                    (status, category, confidence, description,
+                     json.dumps(local_inference_result) if local_inference_result else None,
+                     from_cache, inference_method, error, processing_time_ms, job_id, image_hash)
+                )
+        except Exception as e:
+            logger.error(f"保存分类任务结果失败: {job_id}, 错误: {e}")
+    
+    async def refresh_progress(self, job_id: str):
+        """
+        根据图片表重新统计任务进度（一条UPDATE，重复执行结果一致）；
+        任务首次全部完成时记录统一日志
+        """
+        try:
+            # 规则命中数（未执行add_rule_count.sql时不更新）
+            rule_set = "j.rule_count = s.rule_count," if await db.has_column('classify_jobs', 'rule_count') else ""
+            async with db.get_cursor() as cursor:
+                await cursor.execute(
+                    f"""UPDATE classify_jobs j
+                       JOIN (
+                           SELECT
+                               COUNT(*) AS total,
+                               SUM(status = 'pending') AS pending,
+                               SUM(status = 'queued') AS queued,
+                               SUM(status = 'completed') AS success,
+                               SUM(status = 'failed') AS failed,
+                               SUM(status = 'completed' AND from_cache = 1) AS cached,
+                               SUM(status = 'completed' AND inference_method IN ('llm', 'llm_fallback', 'llm_batch')) AS llm,
+                               SUM(status = 'completed' AND inference_method IN ('local', 'local_fallback', 'local_test', 'local_mapped')) AS local_count,
+                               SUM(status = 'completed' AND inference_method = 'rule') AS rule_count
+                           FROM classify_job_items WHERE job_id = %s
+                       ) s
+                       SET
+                           j.pending_images = s.pending,
+                           j.completed_images = s.success + s.failed,
+                           j.success_count = s.success,
+                           j.fail_count = s.failed,
+                           j.cached_count = s.cached,
+                           j.llm_count = s.llm,
+                           j.local_count = s.local_count,
+                           {rule_set}
+                           j.status = IF(s.pending > 0, 'pending', IF(s.queued > 0, 'processing', 'completed'))
+                       WHERE j.job_id = %s""",
+                    (job_id, job_id)
+                )
+                await cursor.execute(
+                    """UPDATE classify_jobs SET finished_at = NOW()
+                       WHERE job_id = %s AND status = 'completed' AND finished_at IS NULL""",
+                    (job_id,)
+                )
+                finished = cursor.rowcount > 0
+        except Exception as e:
+            logger.error(f"更新分类任务进度失败: {job_id}, 错误: {e}")
+            return
+        
+        if finished:
+            # 删除任务暂存目录（处理完成但删除前中断时残留的暂存图片）
+            await asyncio.get_running_loop().run_in_executor(
+                None, shutil.rmtree, os.path.join(settings.CLASSIFY_JOB_SPOOL_DIR, job_id), True
+            )
+            await self._log_finished(job_id)
+    
+    async def _log_finished(self, job_id: str):
+        """任务全部完成时记录统一日志（批量分类）"""
+        try:
+            job = await self.get_job(job_id)
+            if not job:
+                return
+            from app.services.stats_service import stats_service
+            await stats_service.log_unified_request(
+                request_id=job_id,
+                request_type='batch_classify',
+                ip_address=job.get('ip_address'),
+                client_id=job.get('user_id'),
+                openid=None,
+                total_images=job['total_images'],
+                cached_count=job['cached_count'],
+                llm_count=job['llm_count'],
+                local_count=job['local_count'],
+                rule_count=job.get('rule_count', 0)
+            )
+            logger.info(
+                f"分类任务处理完成: {job_id}, 成功: {job['success_count']}, 失败: {job['fail_count']}, "
+                f"缓存命中: {job['cached_count']}"
+            )
+        except Exception as e:
+            logger.error(f"记录分类任务统一日志失败: {job_id}, 错误: {e}")
+
+
+# 全局分类任务服务实例
+classify_job_service = ClassifyJobService()
@@ -0,0 +1,43 @@
+"""
+推理方式延迟估计
+按推理方式记录最近的处理耗时（指数加权移动平均），供延迟预算选择推理方式；
+每个进程独立统计，启动时使用配置的初始估计值
+"""
+
+from typing import Dict
+from app.config import settings
+
+
+class LatencyTracker:
+    """推理方式延迟估计类"""
+    
+    def __init__(self):
+        self._estimates: Dict[str, float] = {
+            "local": float(settings.LATENCY_BUDGET_PRIOR_LOCAL_MS),
+            "llm_low_res": float(settings.LATENCY_BUDGET_PRIOR_LLM_LOW_RES_MS),
+            "llm": float(settings.LATENCY_BUDGET_PRIOR_LLM_MS)
+        }
+        self._counts: Dict[str, int] = {path: 0 for path in self._estimates}
+    
+    def observe(self, path: str, elapsed_ms: float):
+        """记录一次处理耗时"""
+        if path not in self._estimates:
+            return
+        alpha = settings.LATENCY_BUDGET_EWMA_ALPHA
+        self._estimates[path] = alpha * elapsed_ms + (1 - alpha) * self._estimates[path]
+        self._counts[path] += 1
+    
+    def estimate(self, path: str) -> float:
+        """当前估计耗时(毫秒)"""
+        return self._estimates[path]
+    
+    def snapshot(self) -> dict:
+        """各推理方式的估计耗时和样本数"""
+        return {
+            path: {"estimate_ms": int(value), "samples": self._counts[path]}
+            for path, value in self._estimates.items()
+        }
+
+
+# 全局延迟估计实例
+latency_tracker = LatencyTracker()
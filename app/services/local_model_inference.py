@@ -1,48 +1,213 @@
 """
 本地神经网络模型推理服务
 使用Ultralytics库简化YOLO预处理和后处理
-使用torchvision.transforms简化MobileNetV3预处理
+MobileNetV3使用numpy预处理，并通过ORT IO Binding复用预分配的输入输出缓冲区
 """
 
 import os
+import time
+import asyncio
+import threading
+import functools
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 from PIL import Image
-import io
-from typing import Dict, List, Tuple, Optional
+from typing import Dict, List, Tuple, Optional, Callable, Any
 from loguru import logger
 
 # 导入必需的库（服务器环境已确保安装）
 from ultralytics import YOLO
-import torchvision.transforms as transforms
 
 import onnxruntime as ort
 
+from app.config import settings
+from app.utils.model_utils import ModelUtils
+from app.utils.image_utils import ImageUtils
+from app.utils.image_probe import ImageProbe
+from app.utils.thread_budget import ThreadBudget
+
 
 class LocalModelInference:
     """本地模型推理服务类（只做模型推理，不做分类映射）"""
     
-    def __init__(self):
-        """初始化模型推理服务"""
+    # 降分辨率解码的尺寸下限：YOLO按长边letterbox到640，MobileNetV3短边缩放到256
+    YOLO_INPUT_SIZE = 640
+    MOBILENET_RESIZE = 256
+    MOBILENET_CROP = 224
+    
+    def __init__(self, model_dir: Optional[str] = None, version: Optional[str] = None):
+        """
+        初始化模型推理服务
+        
+        Args:
+            model_dir: 模型目录（为空时使用内置模型目录 app/models/）
+            version: 模型版本名称（由模型版本注册表管理）
+        """
         self.models = {}
-        self.model_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "models")
+        self.model_dir = model_dir or ModelUtils.BUILTIN_MODEL_DIR
+        self.version = version or ModelUtils.BUILTIN_VERSION
         
-        # 模型路径
-        self.model_paths = {
-            "idCard": os.path.join(self.model_dir, "id_card_detection.onnx"),
-            "yolo8s": os.path.join(self.model_dir, "yolov8s.onnx"),
-            "mobilenetv3": os.path.join(self.model_dir, "mobilenetv3_rw_Opset17.onnx")
-        }
+        # 模型精度变体（fp32/int8_dynamic/int8_static）及对应模型路径
+        self.model_variants = self._resolve_model_variants()
+        self.model_paths = ModelUtils.resolve_model_paths(self.model_dir, self.model_variants)
         
-        # MobileNetV3标准预处理（使用torchvision）
-        self.mobilenet_transform = transforms.Compose([
-            transforms.Resize(256),                      # 缩放到256
-            transforms.CenterCrop(224),                  # 中心裁剪到224
-            transforms.ToTensor(),                       # 转换为Tensor并归一化到[0,1]
-            # 注意：MobileNetV3通常不需要ImageNet标准化，已经在[0,1]范围
-        ])
+        # MobileNetV3预分配的输入输出缓冲区及IO Binding（模型加载后创建，在模型锁内复用）
+        self._mobilenet_input: Optional[np.ndarray] = None
+        self._mobilenet_output: Optional[np.ndarray] = None
+        self._mobilenet_binding = None
+        
+        # 推理内存分配统计（开启LOCAL_INFERENCE_TRACE_ALLOCATIONS时由tracemalloc测量，单位字节）
+        self.allocation_stats = {name: {"calls": 0, "peak_bytes": 0, "retained_bytes": 0} for name in self.model_paths}
+        
+        # 每个模型一把锁：Ultralytics预测器不是线程安全的，同一模型同一时刻只允许一个推理
+        self._model_locks = {name: threading.Lock() for name in self.model_paths}
+        
+        # 并行模式使用的线程池（每个模型一个线程，ORT推理期间会释放GIL）
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.intra_op_threads = 0
+        self.thread_plan: Dict = {}
         
         self.is_initialized = False
     
+    def _resolve_model_variants(self) -> Dict[str, str]:
+        """读取各模型的精度变体配置（非法配置回退到fp32）"""
+        configured = settings.local_model_variants
+        variants = {}
+        for name in ModelUtils.MODEL_FILES:
+            variant = configured.get(name, ModelUtils.VARIANT_FP32)
+            if variant not in ModelUtils.VARIANTS:
+                logger.error(f"{name}模型精度配置无效: {variant}，使用fp32")
+                variant = ModelUtils.VARIANT_FP32
+            variants[name] = variant
+        return variants
+    
+    @property
+    def execution_mode(self) -> str:
+        """当前执行模式（graph/parallel/sequential）"""
+        if settings.LOCAL_INFERENCE_GRAPH_ENABLED:
+            return "graph"
+        return "parallel" if settings.LOCAL_INFERENCE_PARALLEL else "sequential"
+    
+    def _graph_order(self) -> List[str]:
+        """
+        推理图中的模型执行顺序
+        
+        未出现在配置中的模型不执行；无法识别的模型名忽略
+        """
+        order = []
+        for name in settings.LOCAL_INFERENCE_GRAPH_ORDER.split(";"):
+            name = name.strip()
+            if name in self.model_paths and name not in order:
+                order.append(name)
+        return order
+    
+    def _check_early_exit(self, model_name: str, output) -> Optional[str]:
+        """
+        检查模型输出是否满足提前退出规则
+        
+        - idCard: 任一证件检测框置信度达到阈值
+        - mobilenetv3: Top-1属于截图类界面类别（网页、屏幕、显示器等）且概率达到阈值
+        
+        Returns:
+            满足规则时返回原因描述，否则返回None
+        """
+        if model_name == "idCard" and output:
+            best = max(det['confidence'] for det in output)
+            if best >= settings.LOCAL_INFERENCE_IDCARD_EXIT_CONF:
+                return f"idCard置信度{best:.2f}≥{settings.LOCAL_INFERENCE_IDCARD_EXIT_CONF}"
+        
+        if model_name == "mobilenetv3" and output and output.get('topPrediction'):
+            top = output['topPrediction']
+            if top['index'] in settings.local_inference_mobilenet_exit_classes \
+                    and top['probability'] >= settings.LOCAL_INFERENCE_MOBILENET_EXIT_CONF:
+                return f"mobilenetv3类别{top['index']}概率{top['probability']:.2f}≥{settings.LOCAL_INFERENCE_MOBILENET_EXIT_CONF}"
+        
+        return None
+    
+    def _resolve_thread_plan(self) -> Dict:
+        """
+        按线程预算计算每个ORT会话的线程数
+        
+        多个worker同时推理时，每个进程只分到 线程预算/推理进程数 个线程；
+        并行模式下三个模型同时运行，再按会话数均分
+        """
+        concurrent_sessions = len(self.model_paths) if self.execution_mode == "parallel" else 1
+        return ThreadBudget.plan(concurrent_sessions)
+    
+    def _apply_torch_threads(self):
+        """限制PyTorch线程数（Ultralytics预处理和NMS使用torch，默认同样按核数创建线程）"""
+        if not settings.LOCAL_INFERENCE_THREAD_BUDGET_ENABLED:
+            return
+        try:
+            import torch
+            torch.set_num_threads(self.thread_plan["threads_per_process"])
+        except ImportError:
+            pass
+    
+    def _build_session_options(self) -> ort.SessionOptions:
+        """构建ORT会话选项"""
+        session_options = ort.SessionOptions()
+        session_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        session_options.enable_cpu_mem_arena = settings.LOCAL_INFERENCE_CPU_MEM_ARENA
+        session_options.enable_mem_pattern = settings.LOCAL_INFERENCE_MEM_PATTERN
+        if self.intra_op_threads > 0:
+            session_options.intra_op_num_threads = self.intra_op_threads
+            session_options.inter_op_num_threads = self.thread_plan["inter_op_threads"] or 1
+        return session_options
+    
+    def _has_custom_session_options(self) -> bool:
+        """会话选项是否与ORT默认值不同（不同时需要重建Ultralytics内部会话）"""
+        return (
+            self.intra_op_threads > 0
+            or not settings.LOCAL_INFERENCE_CPU_MEM_ARENA
+            or not settings.LOCAL_INFERENCE_MEM_PATTERN
+        )
+    
+    def _retune_yolo_session(self, model_name: str, providers: List[str]):
+        """
+        按会话选项（线程数、内存池配置）重建YOLO的ORT会话
+        
+        Ultralytics内部使用默认选项创建InferenceSession，无法传入SessionOptions，
+        因此先执行一次预热推理让预测器完成初始化，再替换其底层会话。
+        AutoBackend加载时按原会话缓存了输出名称和IO Binding（固定输入形状的模型），
+        替换会话后需要绑定到新会话，否则推理仍走原会话
+        """
+        yolo = self.models[model_name]
+        yolo(Image.new('RGB', (640, 640)), verbose=False)
+        
+        backend = getattr(yolo.predictor, 'model', None) if yolo.predictor else None
+        if backend is None or not hasattr(backend, 'session'):
+            logger.warning(f"{model_name}无法获取ORT会话，保持默认会话配置")
+            return
+        
+        session = ort.InferenceSession(
+            self.model_paths[model_name],
+            sess_options=self._build_session_options(),
+            providers=providers
+        )
+        backend.session = session
+        if hasattr(backend, 'output_names'):
+            backend.output_names = [output.name for output in session.get_outputs()]
+        
+        # 输出张量（backend.bindings）保持不变，只把它们重新绑定到新会话的IO Binding
+        bindings = getattr(backend, 'bindings', None)
+        if getattr(backend, 'io', None) is not None and isinstance(bindings, list):
+            io = session.io_binding()
+            for output, tensor in zip(session.get_outputs(), bindings):
+                io.bind_output(
+                    name=output.name,
+                    device_type=tensor.device.type,
+                    device_id=tensor.device.index or 0,
+                    element_type=np.float16 if 'float16' in str(tensor.dtype) else np.float32,
+                    shape=tuple(tensor.shape),
+                    buffer_ptr=tensor.data_ptr()
+                )
+            backend.io = io
+        
+        # 用新会话再预热一次，确认替换后可以正常推理
+        yolo(Image.new('RGB', (640, 640)), verbose=False)
+    
     async def initialize(self):
         """
         初始化模型（严格模式）
@@ -53,7 +218,19 @@ class LocalModelInference:
         if self.is_initialized:
             return
         
-        logger.info("🚀 开始初始化本地ONNX模型（严格模式）...")
+        logger.info(f"🚀 开始初始化本地ONNX模型（严格模式）[版本: {self.version}]...")
+        
+        if settings.LOCAL_INFERENCE_TRACE_ALLOCATIONS and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            logger.info("📏 已开启推理内存分配统计（tracemalloc）")
+        
+        self.thread_plan = self._resolve_thread_plan()
+        self.intra_op_threads = self.thread_plan["intra_op_threads"]
+        self._apply_torch_threads()
+        logger.info(f"🧵 线程分配: {ThreadBudget.describe(self.thread_plan)}")
+        providers = ['CUDAExecutionProvider', 'CPUExecutionProvider'] \
+            if 'CUDAExecutionProvider' in ort.get_available_providers() \
+            else ['CPUExecutionProvider']
         
         # 加载YOLO模型（严格模式：必须成功）
         for model_name in ["idCard", "yolo8s"]:
@@ -65,7 +242,9 @@ class LocalModelInference:
             
             # 加载模型（失败将抛异常）
             self.models[model_name] = YOLO(model_path, task='detect')
-            logger.info(f"✅ {model_name}模型加载成功")
+            if self._has_custom_session_options():
+                self._retune_yolo_session(model_name, providers)
+            logger.info(f"✅ {model_name}模型加载成功 [{self.model_variants[model_name]}]")
         
         # 加载MobileNetV3（严格模式：必须成功）
         model_path = self.model_paths["mobilenetv3"]
@@ -73,24 +252,147 @@ class LocalModelInference:
         if not os.path.exists(model_path):
             raise FileNotFoundError(f"模型文件不存在: {model_path}")
         
-        session_options = ort.SessionOptions()
-        session_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
-        
-        providers = ['CUDAExecutionProvider', 'CPUExecutionProvider'] \
-            if 'CUDAExecutionProvider' in ort.get_available_providers() \
-            else ['CPUExecutionProvider']
-        
         self.models["mobilenetv3"] = ort.InferenceSession(
             model_path,
-            sess_options=session_options,
+            sess_options=self._build_session_options(),
             providers=providers
         )
-        logger.info(f"✅ MobileNetV3模型加载成功")
+        self._setup_mobilenet_buffers()
+        logger.info(
+            f"✅ MobileNetV3模型加载成功 [{self.model_variants['mobilenetv3']}] "
+            f"[IO Binding: {'开启' if self._mobilenet_binding is not None else '关闭'}]"
+        )
+        
+        self._executor = ThreadPoolExecutor(
+            max_workers=len(self.model_paths),
+            thread_name_prefix="local-infer"
+        )
         
         self.is_initialized = True
-        logger.info(f"✅ 本地模型初始化完成，共加载 {len(self.models)} 个模型")
+        logger.info(
+            f"✅ 本地模型初始化完成，共加载 {len(self.models)} 个模型 "
+            f"[版本: {self.version}, 模式: {self.execution_mode}, intra-op线程: {self.intra_op_threads or 'ORT默认'}]"
+        )
+    
+    @staticmethod
+    def _static_shape(shape: List, default: List[int]) -> Tuple[int, ...]:
+        """将ORT输入输出形状中的动态维度替换为默认值"""
+        return tuple(dim if isinstance(dim, int) and dim > 0 else fallback for dim, fallback in zip(shape, default))
+    
+    def _setup_mobilenet_buffers(self):
+        """
+        为MobileNetV3预分配输入输出缓冲区，并绑定到IO Binding
+        
+        缓冲区只在加载时分配一次，之后每次推理原地写入输入、由ORT直接写入输出，
+        避免每次推理分配新的张量，长时间运行的worker内存保持平稳
+        """
+        session = self.models["mobilenetv3"]
+        input_meta = session.get_inputs()[0]
+        output_meta = session.get_outputs()[0]
+        
+        self._mobilenet_input = np.zeros(
+            self._static_shape(input_meta.shape, [1, 3, self.MOBILENET_CROP, self.MOBILENET_CROP]),
+            dtype=np.float32
+        )
+        self._mobilenet_output = np.zeros(self._static_shape(output_meta.shape, [1, 1000]), dtype=np.float32)
+        
+        if not settings.LOCAL_INFERENCE_IO_BINDING:
+            self._mobilenet_binding = None
+            return
+        
+        binding = session.io_binding()
+        binding.bind_input(
+            input_meta.name, 'cpu', 0, np.float32,
+            list(self._mobilenet_input.shape), self._mobilenet_input.ctypes.data
+        )
+        binding.bind_output(
+            output_meta.name, 'cpu', 0, np.float32,
+            list(self._mobilenet_output.shape), self._mobilenet_output.ctypes.data
+        )
+        self._mobilenet_binding = binding
+    
+    def _preprocess_mobilenet(self, image: Image.Image):
+        """
+        MobileNetV3预处理（与torchvision Resize(256) + CenterCrop(224) + ToTensor一致），
+        结果直接写入预分配的输入缓冲区
+        
+        注意：MobileNetV3通常不需要ImageNet标准化，已经在[0,1]范围
+        """
+        width, height = image.size
+        if width <= height:
+            new_size = (self.MOBILENET_RESIZE, int(self.MOBILENET_RESIZE * height / width))
+        else:
+            new_size = (int(self.MOBILENET_RESIZE * width / height), self.MOBILENET_RESIZE)
+        image = image.resize(new_size, Image.BILINEAR)
+        
+        crop = self.MOBILENET_CROP
+        left = int(round((new_size[0] - crop) / 2.0))
+        top = int(round((new_size[1] - crop) / 2.0))
+        pixels = np.asarray(image.crop((left, top, left + crop, top + crop)), dtype=np.uint8)
+        
+        # HWC -> CHW，归一化到[0,1]
+        np.multiply(pixels.transpose(2, 0, 1), 1.0 / 255.0, out=self._mobilenet_input[0], casting='unsafe')
+    
+    async def get_status(self) -> Dict:
+        """获取模型加载状态"""
+        return {
+            "initialized": self.is_initialized,
+            "version": self.version,
+            "models": {
+                name: {
+                    "loaded": name in self.models,
+                    "path": path,
+                    "variant": self.model_variants.get(name)
+                }
+                for name, path in self.model_paths.items()
+            },
+            "total_models": len(self.model_paths),
+            "loaded_models": len(self.models),
+            "execution_mode": self.execution_mode,
+            "intra_op_threads": self.intra_op_threads,
+            "thread_plan": self.thread_plan,
+            "io_binding": self._mobilenet_binding is not None,
+            "allocations": {
+                name: {
+                    "calls": stats["calls"],
+                    "mean_peak_kb": round(stats["peak_bytes"] / stats["calls"] / 1024, 2),
+                    "mean_retained_kb": round(stats["retained_bytes"] / stats["calls"] / 1024, 2)
+                }
+                for name, stats in self.allocation_stats.items() if stats["calls"]
+            } if tracemalloc.is_tracing() else None
+        }
     
-    def detect_with_yolo(self, image_bytes: bytes, model_name: str, conf_threshold: float = 0.25) -> List[Dict]:
+    def _run_timed(self, model_name: str, func: Callable, *args, **kwargs) -> Tuple[Any, float]:
+        """
+        在模型锁内执行推理并计时
+        
+        Returns:
+            (推理结果, 耗时毫秒)
+        """
+        start = time.perf_counter()
+        with self._model_locks[model_name]:
+            if not tracemalloc.is_tracing():
+                result = func(*args, **kwargs)
+            else:
+                # 峰值为本次推理期间新增的内存（含预处理、后处理的临时数组），保留为推理结束后仍未释放的内存
+                before = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+                result = func(*args, **kwargs)
+                current, peak = tracemalloc.get_traced_memory()
+                stats = self.allocation_stats[model_name]
+                stats["calls"] += 1
+                stats["peak_bytes"] += max(0, peak - before)
+                stats["retained_bytes"] += max(0, current - before)
+        return result, round((time.perf_counter() - start) * 1000, 2)
+    
+    def detect_with_yolo(
+        self,
+        image_bytes: bytes,
+        model_name: str,
+        conf_threshold: float = 0.25,
+        image: Optional[Image.Image] = None,
+        scale: Tuple[float, float] = (1.0, 1.0)
+    ) -> List[Dict]:
         """
         使用Ultralytics YOLO进行检测（自动预处理和后处理）
         
@@ -98,13 +400,16 @@ class LocalModelInference:
             image_bytes: 图片二进制数据
             model_name: 模型名称 ('idCard' 或 'yolo8s')
             conf_threshold: 置信度阈值
-            
+            image: 已解码的图片（为空时从image_bytes降分辨率解码）
+            scale: 原图相对image的缩放比例(宽, 高)，用于将检测框换算回原图坐标
+        
         Returns:
             检测结果列表
         """
         try:
-            # 加载图片
-            image = Image.open(io.BytesIO(image_bytes))
+            # 加载图片（降分辨率解码，长边不小于模型输入尺寸）
+            if image is None:
+                image, scale = ImageUtils.decode_reduced(image_bytes, min_long_side=self.YOLO_INPUT_SIZE)
             
             # 使用Ultralytics进行推理（自动预处理和后处理）
             results = self.models[model_name](
@@ -124,6 +429,8 @@ class LocalModelInference:
                     # 获取边界框（xyxy格式转xywh）
                     xyxy = box.xyxy[0].cpu().numpy()
                     x1, y1, x2, y2 = xyxy
+                    x1, x2 = x1 * scale[0], x2 * scale[0]
+                    y1, y2 = y1 * scale[1], y2 * scale[1]
                     x = (x1 + x2) / 2
                     y = (y1 + y2) / 2
                     w = x2 - x1
@@ -141,22 +448,31 @@ class LocalModelInference:
             
             logger.debug(f"{model_name}检测到{len(detections)}个物体")
             return detections
-            
+        
         except Exception as e:
             logger.error(f"{model_name}推理失败: {e}")
             return []
     
-    def classify_mobilenet(self, image_bytes: bytes, conf_threshold: float = 0.3) -> Dict:
-        """MobileNetV3分类"""
+    def classify_mobilenet(
+        self,
+        image_bytes: bytes,
+        conf_threshold: float = 0.3,
+        image: Optional[Image.Image] = None
+    ) -> Dict:
+        """MobileNetV3分类（image为已解码的图片，为空时从image_bytes降分辨率解码）"""
         try:
-            # 预处理（使用torchvision）
-            image = Image.open(io.BytesIO(image_bytes)).convert('RGB')
-            tensor = self.mobilenet_transform(image)
-            input_tensor = tensor.unsqueeze(0).numpy()  # (1, C, H, W)
+            # 预处理（降分辨率解码保证短边不小于256），结果写入预分配的输入缓冲区
+            if image is None:
+                image, _ = ImageUtils.decode_reduced(image_bytes, min_short_side=self.MOBILENET_RESIZE)
+            self._preprocess_mobilenet(image.convert('RGB'))
             
-            # 推理
-            outputs = self.models["mobilenetv3"].run(['496'], {'x': input_tensor})
-            output = outputs[0][0]
+            # 推理（IO Binding时ORT直接写入预分配的输出缓冲区）
+            session = self.models["mobilenetv3"]
+            if self._mobilenet_binding is not None:
+                session.run_with_iobinding(self._mobilenet_binding)
+                output = self._mobilenet_output[0]
+            else:
+                output = session.run(None, {session.get_inputs()[0].name: self._mobilenet_input})[0][0]
             
             # Softmax
             exp_output = np.exp(output - np.max(output))
@@ -186,7 +502,7 @@ class LocalModelInference:
                 'topPrediction': predictions[0] if predictions else None,
                 'confidence': predictions[0]['probability'] if predictions else 0
             }
-            
+        
         except Exception as e:
             logger.error(f"MobileNetV3推理失败: {e}")
             return {}
@@ -201,13 +517,17 @@ class LocalModelInference:
     # 
     # 服务器端只负责返回原始检测结果，客户端负责业务逻辑映射
     
-    async def classify_image(self, image_bytes: bytes) -> Dict:
+    async def classify_image(self, image_bytes: bytes, probe: Optional[ImageProbe] = None) -> Dict:
         """
         执行模型推理，返回原始检测结果（不做分类映射）
         
         服务器端只负责模型推理，返回原始检测结果
         客户端负责使用这些结果进行分类映射（MapObjectes2Category）
         
+        Args:
+            image_bytes: 图片二进制数据
+            probe: 上传链路中已解析的图片探针（传入时复用其解码结果，不再重新解析）
+        
         Returns:
             原始检测结果
         """
@@ -217,26 +537,77 @@ class LocalModelInference:
                 await self.initialize()
             
             # 执行所有模型推理（严格模式：初始化成功保证模型已加载）
-            logger.info("🔍 执行所有模型推理...")
+            mode = self.execution_mode
+            logger.info(f"🔍 执行模型推理... [模式: {mode}]")
+            start = time.perf_counter()
+            
+            # 只解码一次并在三个模型间共享：降分辨率解码到同时满足YOLO和MobileNetV3的最小尺寸
+            if probe is not None:
+                image, scale = probe.decode(self.YOLO_INPUT_SIZE, self.MOBILENET_RESIZE)
+            else:
+                image, scale = ImageUtils.decode_reduced(
+                    image_bytes,
+                    min_long_side=self.YOLO_INPUT_SIZE,
+                    min_short_side=self.MOBILENET_RESIZE
+                )
+            decode_ms = round((time.perf_counter() - start) * 1000, 2)
+            
+            model_calls = {
+                # ID卡检测（使用Ultralytics）
+                'idCard': (self.detect_with_yolo, (image_bytes, 'idCard'), {'conf_threshold': 0.7, 'image': image, 'scale': scale}),
+                # YOLO8s通用检测（使用Ultralytics）
+                'yolo8s': (self.detect_with_yolo, (image_bytes, 'yolo8s'), {'conf_threshold': 0.25, 'image': image, 'scale': scale}),
+                # MobileNetV3分类
+                'mobilenetv3': (self.classify_mobilenet, (image_bytes,), {'conf_threshold': 0.3, 'image': image}),
+            }
             
-            # ID卡检测（使用Ultralytics）
-            id_card_detections = self.detect_with_yolo(image_bytes, 'idCard', conf_threshold=0.7)
+            outputs = {}
+            early_exit = None
             
-            # YOLO8s通用检测（使用Ultralytics）
-            general_detections = self.detect_with_yolo(image_bytes, 'yolo8s', conf_threshold=0.25)
+            if mode == "graph":
+                # 推理图：按配置顺序逐个执行，满足提前退出规则时跳过剩余模型
+                for name in self._graph_order():
+                    func, args, kwargs = model_calls[name]
+                    outputs[name] = self._run_timed(name, func, *args, **kwargs)
+                    reason = self._check_early_exit(name, outputs[name][0])
+                    if reason:
+                        early_exit = {'model': name, 'reason': reason}
+                        logger.info(f"⏭️ 推理提前结束: {reason}")
+                        break
+            elif mode == "parallel":
+                # 三个模型相互独立，分别在线程池中并行执行
+                loop = asyncio.get_running_loop()
+                results = await asyncio.gather(*[
+                    loop.run_in_executor(
+                        self._executor,
+                        functools.partial(self._run_timed, name, func, *args, **kwargs)
+                    )
+                    for name, (func, args, kwargs) in model_calls.items()
+                ])
+                outputs = dict(zip(model_calls, results))
+            else:
+                for name, (func, args, kwargs) in model_calls.items():
+                    outputs[name] = self._run_timed(name, func, *args, **kwargs)
             
-            # MobileNetV3分类
-            mobilenet_result = self.classify_mobilenet(image_bytes, conf_threshold=0.3)
+            timings = {'decode': decode_ms}
+            timings.update({name: elapsed for name, (_, elapsed) in outputs.items()})
+            timings['total'] = round((time.perf_counter() - start) * 1000, 2)
+            logger.info(f"⏱️ 本地推理耗时 [{mode}]: {timings}")
             
             # 返回原始检测结果（不包含 categoryId 和 imageDimensions，由客户端提供）
+            # 未执行的模型返回空结果，modelsRun 记录实际执行的模型
             return {
                 'success': True,
                 'message': '模型推理完成',
-                'idCardDetections': id_card_detections,
-                'generalDetections': general_detections,
-                'mobileNetV3Detections': mobilenet_result
+                'idCardDetections': outputs['idCard'][0] if 'idCard' in outputs else [],
+                'generalDetections': outputs['yolo8s'][0] if 'yolo8s' in outputs else [],
+                'mobileNetV3Detections': outputs['mobilenetv3'][0] if 'mobilenetv3' in outputs else {},
+                'executionMode': mode,
+                'modelsRun': list(outputs),
+                'earlyExit': early_exit,
+                'timings': timings
             }
-            
+        
         except Exception as e:
             logger.error(f"❌ 模型推理失败: {e}")
             return {
@@ -5,7 +5,8 @@
 
 import base64
 import json
-from typing import Dict
+import time
+from typing import Dict, List, Optional
 from app.config import settings
 from loguru import logger
 import httpx
@@ -26,17 +27,39 @@ class ModelClient:
         "other"               # 其它
     ]
     
+    # compact模式的结构化输出Schema（类别使用枚举约束）
+    CLASSIFICATION_SCHEMA = {
+        "type": "object",
+        "properties": {
+            "category": {"type": "string", "enum": CATEGORIES},
+            "confidence": {"type": "number"},
+            "description": {"type": "string"}
+        },
+        "required": ["category", "confidence", "description"],
+        "additionalProperties": False
+    }
+    
     def __init__(self):
         self.provider = settings.LLM_PROVIDER
         self.api_key = settings.LLM_API_KEY
         self.model = settings.LLM_MODEL
     
-    async def classify_image(self, image_bytes: bytes) -> Dict:
+    async def classify_image(
+        self,
+        image_bytes: bytes,
+        telemetry: Optional[Dict] = None,
+        prompt_profile: Optional[str] = None,
+        model: Optional[str] = None
+    ) -> Dict:
         """
         调用大模型进行图片分类
         
         Args:
             image_bytes: 图片二进制数据
+            telemetry: 调用明细（可选，传入字典时写入提供商、模型、提示词模式、图片大小、
+                请求体大小、上游耗时、输入/输出token数、是否解析失败和失败原因）
+            prompt_profile: 提示词模式（default/compact，默认使用LLM_PROMPT_PROFILE）
+            model: 模型名称（默认使用LLM_MODEL，级联调用时为各级模型）
             
         Returns:
             分类结果字典
@@ -46,22 +69,86 @@ class ModelClient:
                 "description": str
             }
         """
+        if telemetry is None:
+            telemetry = {}
+        model = model or self.model
+        compact = (prompt_profile or settings.LLM_PROMPT_PROFILE) == "compact"
+        telemetry.update({
+            "provider": self.provider,
+            "model": model,
+            "prompt_profile": "compact" if compact else "default",
+            "image_bytes": len(image_bytes),
+            "request_bytes": None,
+            "input_tokens": None,
+            "output_tokens": None,
+            "parse_failed": False,
+            "error": None
+        })
+        start_time = time.time()
         try:
             if self.provider == "aliyun" or self.provider == "qwen":
-                return await self._classify_with_aliyun(image_bytes)
+                return await self._classify_with_aliyun(image_bytes, compact, telemetry, model)
             elif self.provider == "openai":
-                return await self._classify_with_openai(image_bytes)
+                return await self._classify_with_openai(image_bytes, compact, telemetry, model)
             elif self.provider == "claude":
-                return await self._classify_with_claude(image_bytes)
+                return await self._classify_with_claude(image_bytes, compact, telemetry, model)
             else:
                 raise ValueError(f"不支持的大模型提供商: {self.provider}")
                 
         except Exception as e:
             logger.error(f"大模型调用失败: {e}")
+            telemetry["error"] = str(e)
             raise
+        finally:
+            telemetry["latency_ms"] = int((time.time() - start_time) * 1000)
+    
+    def _needs_escalation(self, result: Dict, telemetry: Dict) -> bool:
+        """级联调用时是否升级到下一级模型（调用失败、无法解析为JSON或置信度低于LLM_CASCADE_CONFIDENCE）"""
+        if telemetry.get("error") or telemetry.get("parse_failed"):
+            return True
+        return result.get("confidence", 0) < settings.LLM_CASCADE_CONFIDENCE
     
-    async def _classify_with_aliyun(self, image_bytes: bytes) -> Dict:
-        """使用阿里云通义千问VL进行分类（官方SDK）"""
+    async def classify_with_cascade(
+        self,
+        image_bytes: bytes,
+        calls: Optional[List[Dict]] = None,
+        call_info: Optional[Dict] = None,
+        prompt_profile: Optional[str] = None
+    ) -> Dict:
+        """
+        按级联模型（LLM_CASCADE_MODELS）从快到慢依次调用，结果可信时不再调用下一级
+        
+        未配置级联模型时只调用LLM_MODEL一次；最后一级调用失败时返回前面各级中最后一个调用成功的结果
+        
+        Args:
+            image_bytes: 图片二进制数据
+            calls: 调用明细列表（可选，每级调用追加一项telemetry，包含tier和escalated）
+            call_info: 每项调用明细的公共字段（如调用用途）
+            prompt_profile: 提示词模式
+        
+        Returns:
+            分类结果字典
+        """
+        models = settings.llm_cascade_models
+        fallback = None
+        for tier, model in enumerate(models, start=1):
+            telemetry = dict(call_info or {}, tier=tier, escalated=False)
+            if calls is not None:
+                calls.append(telemetry)
+            result = await self.classify_image(image_bytes, telemetry=telemetry, prompt_profile=prompt_profile, model=model)
+            if not telemetry.get("error"):
+                fallback = result
+            if tier == len(models) or not self._needs_escalation(result, telemetry):
+                break
+            telemetry["escalated"] = True
+            logger.info(f"级联模型升级: {model} ({result['category']}, {result['confidence']:.2f}) → {models[tier]}")
+        
+        if telemetry.get("error") and fallback is not None:
+            return fallback
+        return result
+    
+    async def _classify_with_aliyun(self, image_bytes: bytes, compact: bool, telemetry: Dict, model: str) -> Dict:
+        """使用阿里云通义千问VL进行分类（官方SDK，compact模式使用JSON输出格式）"""
         try:
             import dashscope
             from dashscope import MultiModalConversation
@@ -73,7 +160,8 @@ class ModelClient:
             image_base64 = base64.b64encode(image_bytes).decode('utf-8')
             
             # 构建prompt
-            prompt = self._build_prompt()
+            prompt = self._build_prompt(compact)
+            telemetry["request_bytes"] = len(image_base64) + len(prompt.encode('utf-8'))
             
             # 调用通义千问VL API
             messages = [
@@ -86,14 +174,23 @@ class ModelClient:
                 }
             ]
             
+            # compact模式：JSON输出格式，限制输出长度
+            extra_params = {}
+            if compact:
+                extra_params = {
+                    "response_format": {"type": "json_object"},
+                    "max_tokens": settings.LLM_COMPACT_MAX_TOKENS
+                }
+            
             # 同步调用（dashscope SDK暂不支持异步）
             import asyncio
             loop = asyncio.get_event_loop()
             response = await loop.run_in_executor(
                 None,
                 lambda: MultiModalConversation.call(
-                    model=self.model,
-                    messages=messages
+                    model=model,
+                    messages=messages,
+                    **extra_params
                 )
             )
             
@@ -101,8 +198,9 @@ class ModelClient:
             if response.status_code == 200:
                 # 成功响应
                 if hasattr(response, 'output') and hasattr(response.output, 'choices'):
+                    self._record_usage(telemetry, getattr(response, 'usage', None), "input_tokens", "output_tokens")
                     content = response.output.choices[0].message.content[0]['text']
-                    result = self._parse_response(content)
+                    result = self._parse_response(content, telemetry)
                     logger.info(f"阿里云通义千问分类完成: {result['category']}")
                     return result
                 else:
@@ -115,6 +213,7 @@ class ModelClient:
             
         except ImportError:
             logger.error("dashscope SDK未安装，请运行: pip install dashscope")
+            telemetry["error"] = "dashscope SDK未安装"
             return {
                 "category": "other",
                 "confidence": 0.5,
@@ -122,6 +221,7 @@ class ModelClient:
             }
         except Exception as e:
             logger.error(f"阿里云API调用失败: {e}")
+            telemetry["error"] = str(e)
             # 返回默认结果
             return {
                 "category": "other",
@@ -129,8 +229,8 @@ class ModelClient:
                 "description": f"分类失败: {str(e)}"
             }
     
-    async def _classify_with_openai(self, image_bytes: bytes) -> Dict:
-        """使用OpenAI Vision API进行分类"""
+    async def _classify_with_openai(self, image_bytes: bytes, compact: bool, telemetry: Dict, model: str) -> Dict:
+        """使用OpenAI Vision API进行分类（compact模式使用JSON Schema结构化输出）"""
         try:
             from openai import AsyncOpenAI
             
@@ -140,11 +240,24 @@ class ModelClient:
             image_base64 = base64.b64encode(image_bytes).decode('utf-8')
             
             # 构建prompt
-            prompt = self._build_prompt()
+            prompt = self._build_prompt(compact)
+            telemetry["request_bytes"] = len(image_base64) + len(prompt.encode('utf-8'))
+            
+            # compact模式：严格JSON Schema输出，限制输出长度
+            extra_params = {}
+            if compact:
+                extra_params["response_format"] = {
+                    "type": "json_schema",
+                    "json_schema": {
+                        "name": "classification",
+                        "strict": True,
+                        "schema": self.CLASSIFICATION_SCHEMA
+                    }
+                }
             
             # 调用API
             response = await client.chat.completions.create(
-                model=self.model,
+                model=model,
                 messages=[
                     {
                         "role": "user",
@@ -159,19 +272,22 @@ class ModelClient:
                         ]
                     }
                 ],
-                max_tokens=settings.LLM_MAX_TOKENS,
-                timeout=settings.LLM_TIMEOUT
+                max_tokens=settings.LLM_COMPACT_MAX_TOKENS if compact else settings.LLM_MAX_TOKENS,
+                timeout=settings.LLM_TIMEOUT,
+                **extra_params
             )
             
             # 解析响应
+            self._record_usage(telemetry, response.usage, "prompt_tokens", "completion_tokens")
             content = response.choices[0].message.content
-            result = self._parse_response(content)
+            result = self._parse_response(content, telemetry)
             
             logger.info(f"OpenAI分类完成: {result['category']}")
             return result
             
         except Exception as e:
             logger.error(f"OpenAI API调用失败: {e}")
+            telemetry["error"] = str(e)
             # 返回默认结果
             return {
                 "category": "other",
@@ -179,8 +295,8 @@ class ModelClient:
                 "description": "分类失败，使用默认类别"
             }
     
-    async def _classify_with_claude(self, image_bytes: bytes) -> Dict:
-        """使用Claude Vision API进行分类"""
+    async def _classify_with_claude(self, image_bytes: bytes, compact: bool, telemetry: Dict, model: str) -> Dict:
+        """使用Claude Vision API进行分类（compact模式强制调用分类工具，按工具Schema输出）"""
         try:
             from anthropic import AsyncAnthropic
             
@@ -190,12 +306,25 @@ class ModelClient:
             image_base64 = base64.b64encode(image_bytes).decode('utf-8')
             
             # 构建prompt
-            prompt = self._build_prompt()
+            prompt = self._build_prompt(compact)
+            telemetry["request_bytes"] = len(image_base64) + len(prompt.encode('utf-8'))
+            
+            # compact模式：强制调用分类工具，结果即工具参数
+            extra_params = {}
+            if compact:
+                extra_params = {
+                    "tools": [{
+                        "name": "classify",
+                        "description": "返回图片分类结果",
+                        "input_schema": self.CLASSIFICATION_SCHEMA
+                    }],
+                    "tool_choice": {"type": "tool", "name": "classify"}
+                }
             
             # 调用API
             message = await client.messages.create(
-                model=self.model,
-                max_tokens=settings.LLM_MAX_TOKENS,
+                model=model,
+                max_tokens=settings.LLM_COMPACT_MAX_TOKENS if compact else settings.LLM_MAX_TOKENS,
                 messages=[
                     {
                         "role": "user",
@@ -215,18 +344,27 @@ class ModelClient:
                         ],
                     }
                 ],
-                timeout=settings.LLM_TIMEOUT
+                timeout=settings.LLM_TIMEOUT,
+                **extra_params
             )
             
             # 解析响应
-            content = message.content[0].text
-            result = self._parse_response(content)
+            self._record_usage(telemetry, message.usage, "input_tokens", "output_tokens")
+            if compact:
+                tool_input = next((block.input for block in message.content if block.type == "tool_use"), None)
+                if tool_input is None:
+                    raise Exception("响应中没有分类工具调用")
+                result = self._normalize_result(tool_input)
+            else:
+                content = message.content[0].text
+                result = self._parse_response(content, telemetry)
             
             logger.info(f"Claude分类完成: {result['category']}")
             return result
             
         except Exception as e:
             logger.error(f"Claude API调用失败: {e}")
+            telemetry["error"] = str(e)
             # 返回默认结果
             return {
                 "category": "other",
@@ -234,16 +372,31 @@ class ModelClient:
                 "description": "分类失败，使用默认类别"
             }
     
-    def _build_prompt(self) -> str:
+    def _build_prompt(self, compact: bool = False) -> str:
         """构建分类提示词（从配置读取）"""
+        if compact:
+            return settings.COMPACT_CLASSIFICATION_PROMPT
         return settings.CLASSIFICATION_PROMPT
     
-    def _parse_response(self, content: str) -> Dict:
+    @staticmethod
+    def _record_usage(telemetry: Dict, usage, input_key: str, output_key: str):
+        """记录token用量（各提供商字段名不同，缺失时保持为None）"""
+        if usage is None:
+            return
+        if isinstance(usage, dict):
+            telemetry["input_tokens"] = usage.get(input_key)
+            telemetry["output_tokens"] = usage.get(output_key)
+        else:
+            telemetry["input_tokens"] = getattr(usage, input_key, None)
+            telemetry["output_tokens"] = getattr(usage, output_key, None)
+    
+    def _parse_response(self, content: str, telemetry: Optional[Dict] = None) -> Dict:
         """
         解析大模型响应
         
         Args:
             content: 响应内容
+            telemetry: 调用明细（可选，无法直接解析为JSON时记录parse_failed）
             
         Returns:
             解析后的结果字典
@@ -255,6 +408,8 @@ class ModelClient:
             # 尝试直接解析JSON
             result = json.loads(content)
         except json.JSONDecodeError:
+            if telemetry is not None:
+                telemetry["parse_failed"] = True
             # 尝试从文本中提取JSON
             json_match = re.search(r'\{[^}]+\}', content, re.DOTALL)
             if json_match:
@@ -268,6 +423,10 @@ class ModelClient:
                     "description": "无法解析分类结果"
                 }
         
+        return self._normalize_result(result)
+    
+    def _normalize_result(self, result: Dict) -> Dict:
+        """校验并规整分类结果"""
         # 验证category是否在预定义列表中
         category = result.get("category", "other")
         if category not in self.CATEGORIES:
@@ -0,0 +1,365 @@
+"""
+本地模型版本注册表
+管理多个版本的本地ONNX模型，无需重启服务即可切换模型版本
+
+版本目录结构（LOCAL_MODEL_REGISTRY_DIR，默认 app/models/versions/）：
+    versions/
+    ├── 20240601/                   # 每个子目录为一个版本，文件名与 app/models/ 相同
+    │   ├── id_card_detection.onnx
+    │   ├── yolov8s.onnx
+    │   └── mobilenetv3_rw_Opset17.onnx
+    ├── 20240715/
+    └── registry_state.json         # 当前版本与上一版本（所有进程共享）
+
+切换流程：
+    后台线程加载新版本 -> 预热推理 -> 原子替换当前版本（进行中的请求继续使用旧版本完成）
+    上一版本保留在内存中，回滚时立即切换
+    各worker（或独立模型服务进程）通过 registry_state.json 同步当前版本，各自在后台加载
+"""
+
+import asyncio
+import io
+import json
+import os
+import re
+import time
+from collections import deque
+from datetime import datetime
+from typing import Dict, List, Optional
+from loguru import logger
+
+from app.config import settings
+from app.utils.model_utils import ModelUtils
+
+STATE_FILE = "registry_state.json"
+VERSION_PATTERN = re.compile(r'^[A-Za-z0-9._-]+$')
+
+# 每个版本保留最近N次推理耗时用于统计
+LATENCY_WINDOW = 1000
+
+
+def _percentile(ordered: List[float], pct: float) -> float:
+    """计算百分位数（输入需已排序）"""
+    if not ordered:
+        return 0.0
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+class ModelRegistry:
+    """本地模型版本注册表（接口与LocalModelInference保持一致）"""
+    
+    def __init__(self):
+        self.registry_dir = settings.LOCAL_MODEL_REGISTRY_DIR or os.path.join(ModelUtils.BUILTIN_MODEL_DIR, "versions")
+        self.state_path = os.path.join(self.registry_dir, STATE_FILE)
+        
+        # 当前版本和上一版本（用于回滚）的推理实例
+        self._active = None
+        self._previous = None
+        
+        # 后台加载中的版本
+        self._staging_task: Optional[asyncio.Task] = None
+        self.staging: Optional[Dict] = None
+        
+        # 各版本推理统计
+        self._stats: Dict[str, Dict] = {}
+        
+        # 版本状态文件同步
+        self._last_sync = 0.0
+        self._state_mtime: Optional[float] = None
+    
+    @property
+    def is_initialized(self) -> bool:
+        return self._active is not None and self._active.is_initialized
+    
+    @property
+    def active_version(self) -> Optional[str]:
+        return self._active.version if self._active else None
+    
+    # ===== 版本目录 =====
+    
+    def _model_dir(self, version: str) -> str:
+        """版本对应的模型目录"""
+        if version == ModelUtils.BUILTIN_VERSION:
+            return ModelUtils.BUILTIN_MODEL_DIR
+        return os.path.join(self.registry_dir, version)
+    
+    def _is_complete(self, version: str) -> bool:
+        """版本目录中是否包含所有模型文件（按当前精度变体配置）"""
+        model_dir = self._model_dir(version)
+        if not os.path.isdir(model_dir):
+            return False
+        variants = settings.local_model_variants
+        try:
+            paths = ModelUtils.resolve_model_paths(model_dir, variants)
+        except ValueError:
+            paths = ModelUtils.resolve_model_paths(model_dir, {})
+        return all(os.path.exists(path) for path in paths.values())
+    
+    def list_versions(self) -> List[str]:
+        """列出可用的模型版本（内置版本 + 版本目录下模型文件完整的子目录）"""
+        versions = [ModelUtils.BUILTIN_VERSION]
+        if os.path.isdir(self.registry_dir):
+            versions.extend(
+                name for name in sorted(os.listdir(self.registry_dir))
+                if VERSION_PATTERN.match(name) and self._is_complete(name)
+            )
+        return versions
+    
+    def validate_version(self, version: str):
+        """校验版本名称和模型文件，不可用时抛出ValueError（内置版本在加载时严格校验）"""
+        if version == ModelUtils.BUILTIN_VERSION:
+            return
+        if not VERSION_PATTERN.match(version):
+            raise ValueError(f"无效的版本名称: {version}")
+        if not self._is_complete(version):
+            raise ValueError(f"模型版本不存在或模型文件不完整: {version}")
+    
+    # ===== 版本状态文件（多进程共享） =====
+    
+    def read_state(self) -> Dict:
+        """读取当前版本状态"""
+        try:
+            with open(self.state_path, encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logger.warning(f"读取模型版本状态失败: {e}")
+            return {}
+    
+    def _write_state(self, active: str, previous: Optional[str], operator: str):
+        """原子写入版本状态（先写临时文件再替换）"""
+        os.makedirs(self.registry_dir, exist_ok=True)
+        state = {
+            "active": active,
+            "previous": previous,
+            "updated_by": operator,
+            "updated_at": datetime.now().isoformat(timespec="seconds")
+        }
+        tmp_path = f"{self.state_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.state_path)
+        self._state_mtime = os.path.getmtime(self.state_path)
+    
+    def _maybe_sync(self):
+        """
+        按间隔检查状态文件，其他进程切换了版本时在本进程后台切换
+        
+        只有开始切换后才记录状态文件的修改时间：正在加载其他版本、校验失败时不记录，
+        后台加载失败时清除（_stage），下一个同步间隔重试，避免本进程一直停留在旧版本
+        """
+        now = time.monotonic()
+        if now - self._last_sync < settings.LOCAL_MODEL_REGISTRY_SYNC_INTERVAL:
+            return
+        self._last_sync = now
+        
+        try:
+            mtime = os.path.getmtime(self.state_path)
+        except OSError:
+            return
+        if mtime == self._state_mtime:
+            return
+        
+        target = self.read_state().get("active")
+        if not target or target == self.active_version:
+            self._state_mtime = mtime
+            return
+        if self._is_staging():
+            return
+        try:
+            self.validate_version(target)
+            logger.info(f"🔄 检测到模型版本切换: {self.active_version} -> {target}")
+            self._start_activation(target)
+            self._state_mtime = mtime
+        except Exception as e:
+            logger.error(f"同步模型版本失败 ({target})，下次同步时重试: {e}")
+    
+    # ===== 加载与切换 =====
+    
+    def _create_inference(self, version: str):
+        """创建指定版本的推理实例（内置版本复用全局实例）"""
+        from app.services.local_model_inference import LocalModelInference, local_model_inference
+        if version == ModelUtils.BUILTIN_VERSION:
+            return local_model_inference
+        return LocalModelInference(model_dir=self._model_dir(version), version=version)
+    
+    async def initialize(self):
+        """加载当前版本（版本状态文件中的版本，没有时使用内置版本）"""
+        if self.is_initialized:
+            return
+        
+        version = self.read_state().get("active") or ModelUtils.BUILTIN_VERSION
+        try:
+            self.validate_version(version)
+        except ValueError as e:
+            logger.error(f"{e}，使用内置模型版本")
+            version = ModelUtils.BUILTIN_VERSION
+        
+        inference = self._create_inference(version)
+        await inference.initialize()
+        self._active = inference
+        try:
+            self._state_mtime = os.path.getmtime(self.state_path)
+        except OSError:
+            self._state_mtime = None
+        logger.info(f"✅ 本地模型版本: {version}")
+    
+    def _is_staging(self) -> bool:
+        return self._staging_task is not None and not self._staging_task.done()
+    
+    def _swap(self, inference):
+        """原子替换当前版本，旧版本保留为上一版本（用于回滚）"""
+        old = self._active
+        self._active = inference
+        self._previous = old
+        logger.info(f"🔀 模型版本已切换: {old.version if old else None} -> {inference.version}")
+    
+    def _start_activation(self, version: str) -> str:
+        """
+        切换到指定版本
+        
+        Returns:
+            active: 已是当前版本 / swapped: 从上一版本立即切换 / loading: 后台加载中
+        """
+        if version == self.active_version:
+            return "active"
+        if self._previous is not None and self._previous.version == version:
+            self._swap(self._previous)
+            return "swapped"
+        if self._is_staging():
+            raise RuntimeError(f"模型版本 {self.staging['version']} 正在加载，请稍后再试")
+        
+        self.staging = {"version": version, "status": "loading", "started_at": datetime.now().isoformat(timespec="seconds")}
+        self._staging_task = asyncio.create_task(self._stage(version))
+        return "loading"
+    
+    async def _stage(self, version: str):
+        """后台加载并预热新版本，成功后切换"""
+        start = time.perf_counter()
+        try:
+            inference = self._create_inference(version)
+            # 在独立线程（独立事件循环）中加载和预热，不阻塞在线请求
+            await asyncio.to_thread(asyncio.run, self._load_and_warm(inference))
+            self._swap(inference)
+            logger.info(f"✅ 模型版本 {version} 加载预热完成，耗时 {time.perf_counter() - start:.1f}s")
+            self.staging = None
+        except Exception as e:
+            logger.error(f"❌ 模型版本 {version} 加载失败，保持当前版本 {self.active_version}: {e}")
+            self.staging = {**(self.staging or {}), "version": version, "status": "failed", "error": str(e)}
+            # 状态文件仍指向该版本时，下一个同步间隔重试
+            self._state_mtime = None
+    
+    async def _load_and_warm(self, inference):
+        """加载模型并执行预热推理（首次推理的图优化、内存分配在此完成）"""
+        await inference.initialize()
+        
+        if self.staging:
+            self.staging["status"] = "warming"
+        warmup_image = self._warmup_image()
+        for _ in range(settings.LOCAL_MODEL_WARMUP_RUNS):
+            result = await inference.classify_image(warmup_image)
+            if not result.get('success'):
+                raise RuntimeError(f"预热推理失败: {result.get('message')}")
+    
+    @staticmethod
+    def _warmup_image() -> bytes:
+        """生成预热用的JPEG图片"""
+        from PIL import Image, ImageDraw
+        image = Image.new('RGB', (1280, 960), (200, 200, 200))
+        draw = ImageDraw.Draw(image)
+        draw.rectangle((320, 240, 960, 720), fill=(60, 90, 150))
+        output = io.BytesIO()
+        image.save(output, format='JPEG', quality=90)
+        return output.getvalue()
+    
+    async def request_activation(self, version: str, operator: str) -> Dict:
+        """
+        请求切换模型版本（管理接口调用）
+        
+        写入版本状态文件（其他进程据此同步），并在本进程开始切换
+        开启独立模型服务时由模型服务进程完成切换
+        """
+        self.validate_version(version)
+        in_process = not settings.LOCAL_MODEL_SERVER_ENABLED and self.is_initialized
+        if in_process and self._is_staging():
+            raise RuntimeError(f"模型版本 {self.staging['version']} 正在加载，请稍后再试")
+        
+        state = self.read_state()
+        current = state.get("active") or self.active_version or ModelUtils.BUILTIN_VERSION
+        if version != current:
+            self._write_state(version, current, operator)
+            logger.info(f"📝 模型版本切换请求: {current} -> {version} (by {operator})")
+        
+        # pending: 由模型服务进程或尚未加载模型的进程在同步/初始化时切换
+        status = self._start_activation(version) if in_process else "pending"
+        return {"version": version, "status": status, "state": self.read_state()}
+    
+    async def rollback(self, operator: str) -> Dict:
+        """回滚到上一版本"""
+        previous = self.read_state().get("previous")
+        if not previous:
+            raise ValueError("没有可回滚的模型版本")
+        return await self.request_activation(previous, operator)
+    
+    # ===== 推理与统计 =====
+    
+    def _record(self, version: str, elapsed_ms: float, success: bool):
+        """记录版本推理统计"""
+        stats = self._stats.setdefault(version, {"requests": 0, "failures": 0, "latencies": deque(maxlen=LATENCY_WINDOW)})
+        stats["requests"] += 1
+        if not success:
+            stats["failures"] += 1
+        stats["latencies"].append(elapsed_ms)
+    
+    def get_version_stats(self) -> Dict:
+        """各版本推理统计（最近LATENCY_WINDOW次的延迟分布）"""
+        result = {}
+        for version, stats in self._stats.items():
+            ordered = sorted(stats["latencies"])
+            result[version] = {
+                "requests": stats["requests"],
+                "failures": stats["failures"],
+                "mean_ms": round(sum(ordered) / len(ordered), 2) if ordered else 0.0,
+                "p50_ms": round(_percentile(ordered, 50), 2),
+                "p95_ms": round(_percentile(ordered, 95), 2),
+                "p99_ms": round(_percentile(ordered, 99), 2)
+            }
+        return result
+    
+    async def classify_image(self, image_bytes: bytes, probe=None) -> Dict:
+        """使用当前版本执行推理，返回结果中附带模型版本（probe透传给推理服务）"""
+        if not self.is_initialized:
+            await self.initialize()
+        self._maybe_sync()
+        
+        # 取出当前实例后再推理：切换版本不影响进行中的请求
+        inference = self._active
+        start = time.perf_counter()
+        result = await inference.classify_image(image_bytes, probe=probe)
+        self._record(inference.version, (time.perf_counter() - start) * 1000, result.get('success', False))
+        
+        result['modelVersion'] = inference.version
+        return result
+    
+    async def get_status(self) -> Dict:
+        """获取当前版本模型状态及版本注册表信息"""
+        self._maybe_sync()
+        status = await self._active.get_status() if self._active else {"initialized": False}
+        state = self.read_state()
+        status["registry"] = {
+            "dir": self.registry_dir,
+            "active": self.active_version,
+            "previous": self._previous.version if self._previous else state.get("previous"),
+            "previous_loaded": self._previous is not None,
+            "state": state,
+            "available": self.list_versions(),
+            "staging": self.staging,
+            "stats": self.get_version_stats()
+        }
+        return status
+
+
+# 全局实例
+model_registry = ModelRegistry()
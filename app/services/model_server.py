@@ -0,0 +1,118 @@
+"""
+本地模型服务进程
+在独立进程中加载一份本地ONNX模型，通过Unix Socket为所有gunicorn worker提供推理
+
+启动方式：
+    python -m app.services.model_server
+（开启 LOCAL_MODEL_SERVER_ENABLED 后由 gunicorn_config.py 在主进程启动时自动拉起）
+
+好处：
+- 模型内存不随worker数量增长
+- worker因max_requests重启时无需重新加载模型
+- 模型版本切换（model_registry）只需在本进程中加载一次
+"""
+
+import asyncio
+import os
+import signal
+import sys
+from loguru import logger
+
+from app.config import settings
+from app.services.model_registry import model_registry
+from app.services.model_server_client import (
+    OP_PING,
+    OP_CLASSIFY,
+    OP_STATUS,
+    STATUS_OK,
+    STATUS_ERROR,
+    encode_frame,
+    encode_json,
+    read_frame,
+    max_frame_payload
+)
+
+
+class ModelServer:
+    """本地模型服务"""
+    
+    def __init__(self, socket_path: str):
+        self.socket_path = socket_path
+        self.server = None
+    
+    async def start(self):
+        """加载模型并开始监听（socket文件存在即表示模型已加载完成）"""
+        # 先清理上次异常退出遗留的socket文件，避免模型加载期间被当作已就绪
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        
+        await model_registry.initialize()
+        
+        self.server = await asyncio.start_unix_server(self._handle_connection, path=self.socket_path)
+        os.chmod(self.socket_path, 0o660)
+        logger.info(f"✅ 本地模型服务已启动: {self.socket_path} (pid={os.getpid()})")
+    
+    async def stop(self):
+        """停止监听并清理socket文件"""
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        logger.info("本地模型服务已停止")
+    
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """处理一个连接（支持在同一连接上连续发送多个请求）"""
+        try:
+            while True:
+                try:
+                    op, payload = await read_frame(reader, max_frame_payload())
+                except asyncio.IncompleteReadError:
+                    break
+                
+                try:
+                    data = await self._dispatch(op, payload)
+                    writer.write(encode_frame(STATUS_OK, encode_json(data)))
+                except Exception as e:
+                    logger.error(f"模型服务处理请求失败 (op={op}): {e}")
+                    writer.write(encode_frame(STATUS_ERROR, encode_json({'message': str(e)})))
+                await writer.drain()
+        except Exception as e:
+            logger.warning(f"模型服务连接异常: {e}")
+        finally:
+            writer.close()
+    
+    async def _dispatch(self, op: int, payload: bytes) -> dict:
+        """按操作码分发请求"""
+        if op == OP_CLASSIFY:
+            return await model_registry.classify_image(payload)
+        if op == OP_STATUS:
+            return await model_registry.get_status()
+        if op == OP_PING:
+            return {'initialized': model_registry.is_initialized, 'pid': os.getpid()}
+        raise ValueError(f"未知操作码: {op}")
+
+
+async def main():
+    """模型服务入口"""
+    logger.remove()
+    logger.add(
+        sys.stdout,
+        format="<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | model-server | <level>{message}</level>",
+        level=settings.LOG_LEVEL
+    )
+    
+    server = ModelServer(settings.LOCAL_MODEL_SERVER_SOCKET)
+    await server.start()
+    
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop_event.set)
+    
+    await stop_event.wait()
+    await server.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,141 @@
+"""
+本地模型服务客户端
+通过Unix Socket调用独立的模型服务进程（app.services.model_server）
+
+本模块不导入 torch/ultralytics/onnxruntime，Web worker 只需加载本客户端，
+模型只在模型服务进程中加载一份
+
+通信协议（紧凑二进制帧）：
+    帧头: !4sBBI = 魔数(b'ICMS') + 协议版本 + 操作码/状态码 + 负载长度
+    请求负载: CLASSIFY为图片原始字节，其余操作为空或JSON
+    响应负载: UTF-8紧凑JSON
+"""
+
+import asyncio
+import json
+import struct
+from typing import Dict, Optional, Tuple
+from loguru import logger
+
+from app.config import settings
+
+
+# ===== 协议定义 =====
+PROTOCOL_MAGIC = b'ICMS'
+PROTOCOL_VERSION = 1
+FRAME_HEADER = struct.Struct('!4sBBI')
+
+# 请求操作码
+OP_PING = 1
+OP_CLASSIFY = 2
+OP_STATUS = 3
+
+# 响应状态码
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+
+def encode_frame(code: int, payload: bytes = b'') -> bytes:
+    """编码一帧（帧头+负载）"""
+    return FRAME_HEADER.pack(PROTOCOL_MAGIC, PROTOCOL_VERSION, code, len(payload)) + payload
+
+
+def encode_json(data: Dict) -> bytes:
+    """编码JSON负载（紧凑格式）"""
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+async def read_frame(reader: asyncio.StreamReader, max_payload: int) -> Tuple[int, bytes]:
+    """
+    读取一帧
+    
+    Returns:
+        (操作码/状态码, 负载)
+    """
+    header = await reader.readexactly(FRAME_HEADER.size)
+    magic, version, code, length = FRAME_HEADER.unpack(header)
+    if magic != PROTOCOL_MAGIC or version != PROTOCOL_VERSION:
+        raise ValueError(f"无效的协议帧: magic={magic!r}, version={version}")
+    if length > max_payload:
+        raise ValueError(f"负载过大: {length} > {max_payload}")
+    payload = await reader.readexactly(length) if length else b''
+    return code, payload
+
+
+def max_frame_payload() -> int:
+    """单帧负载上限（图片大小上限 + 1MB余量）"""
+    return settings.max_image_size_bytes + 1024 * 1024
+
+
+class ModelServerClient:
+    """模型服务客户端（接口与LocalModelInference保持一致）"""
+    
+    def __init__(self, socket_path: Optional[str] = None):
+        self.socket_path = socket_path or settings.LOCAL_MODEL_SERVER_SOCKET
+        self.is_initialized = False
+    
+    async def _request(self, op: int, payload: bytes = b'') -> Dict:
+        """发送一次请求并读取响应（每次请求建立一个Unix Socket连接）"""
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_unix_connection(self.socket_path),
+            timeout=settings.LOCAL_MODEL_SERVER_TIMEOUT
+        )
+        try:
+            writer.write(encode_frame(op, payload))
+            await writer.drain()
+            status, body = await asyncio.wait_for(
+                read_frame(reader, max_frame_payload()),
+                timeout=settings.LOCAL_MODEL_SERVER_TIMEOUT
+            )
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
+        
+        data = json.loads(body.decode('utf-8')) if body else {}
+        if status != STATUS_OK:
+            raise RuntimeError(data.get('message', '模型服务返回错误'))
+        return data
+    
+    async def initialize(self):
+        """确认模型服务可用（模型已在服务进程中加载）"""
+        if self.is_initialized:
+            return
+        
+        data = await self._request(OP_PING)
+        if not data.get('initialized'):
+            raise RuntimeError("模型服务尚未完成模型加载")
+        
+        self.is_initialized = True
+        logger.info(f"✅ 已连接本地模型服务: {self.socket_path}")
+    
+    async def classify_image(self, image_bytes: bytes, probe=None) -> Dict:
+        """
+        通过模型服务执行推理，返回格式与LocalModelInference.classify_image一致
+        
+        probe仅为保持接口一致：解码在模型服务进程内完成，无法跨进程共享
+        """
+        try:
+            return await self._request(OP_CLASSIFY, image_bytes)
+        except Exception as e:
+            logger.error(f"❌ 模型服务推理失败: {e}")
+            self.is_initialized = False
+            return {
+                'success': False,
+                'message': f'推理失败: {str(e)}',
+                'idCardDetections': [],
+                'generalDetections': [],
+                'mobileNetV3Detections': {}
+            }
+    
+    async def get_status(self) -> Dict:
+        """获取模型服务中的模型加载状态"""
+        status = await self._request(OP_STATUS)
+        status['model_server'] = self.socket_path
+        return status
+
+
+# 全局客户端实例
+model_server_client = ModelServerClient()
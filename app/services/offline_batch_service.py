@@ -0,0 +1,294 @@
+"""
+离线批量分类服务
+mode=offline的分类任务（相册补分类等不需要即时结果的大批量图片）不走同步大模型调用：
+上传的图片暂存到OFFLINE_BATCH_SPOOL_DIR，由离线批量处理进程（offline_batch_worker）
+攒够一批后提交到大模型批量接口，轮询完成后把结果写入缓存和任务结果
+
+- 同一哈希的图片只提交一次（多个任务中相同的图片共用结果）
+- 不占用交互请求的大模型并发和限流
+"""
+
+import asyncio
+import os
+from typing import Dict, Optional
+from loguru import logger
+
+from app.database import db
+from app.config import settings
+from app.services.batch_providers import get_batch_provider, BATCH_COMPLETED, BATCH_FAILED
+from app.services.cache_service import cache_service
+from app.services.classifier import classifier
+from app.services.model_client import model_client
+from app.utils.id_generator import IDGenerator
+
+
+class OfflineBatchService:
+    """离线批量分类服务类"""
+    
+    def spool_path(self, image_hash: str) -> str:
+        """图片暂存路径"""
+        return os.path.join(settings.OFFLINE_BATCH_SPOOL_DIR, f"{image_hash}.jpg")
+    
+    async def enqueue(self, image_hash: str, image_bytes: bytes):
+        """
+        暂存一张待提交的图片（worker中调用；同一哈希已在等待或已提交时不重复加入）
+        
+        Args:
+            image_hash: 图片哈希
+            image_bytes: 标准化后的图片数据
+        """
+        path = self.spool_path(image_hash)
+        
+        def write():
+            os.makedirs(settings.OFFLINE_BATCH_SPOOL_DIR, exist_ok=True)
+            with open(path + ".tmp", "wb") as f:
+                f.write(image_bytes)
+            os.replace(path + ".tmp", path)
+        
+        # 记录和暂存文件在一个事务中写入：_finish_images正在删除同哈希记录时，INSERT等它提交
+        # （它已删除暂存文件）后再加入并写入暂存文件；提交前其他进程看不到记录，提交时暂存文件已写好
+        async with db.get_cursor() as cursor:
+            await cursor.execute("START TRANSACTION")
+            await cursor.execute(
+                """INSERT IGNORE INTO offline_batch_images (image_hash, image_size, status)
+                   VALUES (%s, %s, 'waiting')""",
+                (image_hash, len(image_bytes))
+            )
+            await asyncio.get_running_loop().run_in_executor(None, write)
+    
+    async def submit_waiting(self) -> Optional[str]:
+        """
+        待提交图片达到OFFLINE_BATCH_MIN_IMAGES，或最早的图片等待超过OFFLINE_BATCH_MAX_WAIT_SECONDS时，
+        提交一个批量任务（不超过OFFLINE_BATCH_MAX_IMAGES张、OFFLINE_BATCH_MAX_MB）
+        
+        Returns:
+            提交的批量任务ID，未提交时为None
+        """
+        async with db.get_cursor() as cursor:
+            await cursor.execute(
+                """SELECT image_hash, image_size, TIMESTAMPDIFF(SECOND, created_at, NOW()) AS waited
+                   FROM offline_batch_images WHERE status = 'waiting'
+                   ORDER BY created_at LIMIT %s""",
+                (settings.OFFLINE_BATCH_MAX_IMAGES,)
+            )
+            rows = await cursor.fetchall()
+        if not rows:
+            return None
+        if len(rows) < settings.OFFLINE_BATCH_MIN_IMAGES and rows[0]['waited'] < settings.OFFLINE_BATCH_MAX_WAIT_SECONDS:
+            return None
+        
+        # Base64编码后约为原大小的4/3
+        max_bytes = settings.OFFLINE_BATCH_MAX_MB * 1024 * 1024 * 3 // 4
+        items = []
+        missing = []
+        total_bytes = 0
+        for row in rows:
+            if items and total_bytes + row['image_size'] > max_bytes:
+                break
+            try:
+                with open(self.spool_path(row['image_hash']), "rb") as f:
+                    items.append((row['image_hash'], f.read()))
+                total_bytes += row['image_size']
+            except FileNotFoundError:
+                missing.append(row['image_hash'])
+        
+        if missing:
+            logger.warning(f"离线批量分类暂存图片丢失: {len(missing)}张")
+            await self._finish_images({image_hash: (None, "暂存图片丢失，请重新上传") for image_hash in missing}, None)
+        if not items:
+            return None
+        
+        provider = get_batch_provider()
+        batch_id = IDGenerator.generate_request_id("batch")
+        try:
+            provider_batch_id = await provider.submit(items)
+        except Exception as e:
+            # 提交失败的图片保持等待状态，下一轮重试
+            logger.error(f"提交批量任务失败: {provider.name}, 图片数: {len(items)}, 错误: {e}")
+            return None
+        
+        image_hashes = [image_hash for image_hash, _ in items]
+        async with db.get_cursor() as cursor:
+            await cursor.execute(
+                """INSERT INTO offline_batches (batch_id, provider, model, provider_batch_id, image_count, status)
+                   VALUES (%s, %s, %s, %s, %s, 'submitted')""",
+                (batch_id, provider.name, provider.model, provider_batch_id, len(items))
+            )
+            placeholders = ",".join(["%s"] * len(image_hashes))
+            await cursor.execute(
+                f"""UPDATE offline_batch_images SET status = 'submitted', batch_id = %s
+                    WHERE status = 'waiting' AND image_hash IN ({placeholders})""",
+                [batch_id] + image_hashes
+            )
+        logger.info(f"离线批量任务已提交: {batch_id} ({provider.name} {provider_batch_id}), 图片数: {len(items)}")
+        return batch_id
+    
+    async def poll_batches(self) -> int:
+        """
+        轮询已提交的批量任务，完成或失败的任务写回结果
+        
+        Returns:
+            本轮结束的批量任务数
+        """
+        async with db.get_cursor() as cursor:
+            await cursor.execute(
+                "SELECT batch_id, provider, model, provider_batch_id FROM offline_batches WHERE status = 'submitted' ORDER BY id"
+            )
+            batches = await cursor.fetchall()
+        
+        finished = 0
+        for batch in batches:
+            try:
+                provider = get_batch_provider(batch['provider'])
+                status, error = await provider.poll(batch['provider_batch_id'])
+                if status == BATCH_COMPLETED:
+                    results = await provider.fetch_results(batch['provider_batch_id'])
+                    await self._complete_batch(batch, results)
+                    finished += 1
+                elif status == BATCH_FAILED:
+                    await self._complete_batch(batch, {}, error)
+                    finished += 1
+            except Exception as e:
+                logger.error(f"轮询批量任务失败: {batch['batch_id']}, 错误: {e}")
+        return finished
+    
+    async def _complete_batch(self, batch: dict, results: Dict[str, dict], batch_error: Optional[str] = None):
+        """解析批量任务结果：有效结果写入缓存，更新任务中对应的图片"""
+        batch_id = batch['batch_id']
+        async with db.get_cursor() as cursor:
+            await cursor.execute(
+                "SELECT image_hash FROM offline_batch_images WHERE batch_id = %s AND status = 'submitted'",
+                (batch_id,)
+            )
+            image_hashes = [row['image_hash'] for row in await cursor.fetchall()]
+        
+        model_used = f"{batch['model']}_batch"
+        outcomes = {}
+        for image_hash in image_hashes:
+            record = results.get(image_hash)
+            if record is None:
+                outcomes[image_hash] = (None, batch_error or "批量任务结果中没有该图片")
+                continue
+            if record.get("error"):
+                outcomes[image_hash] = (None, record["error"])
+                continue
+            result = model_client._parse_response(record["content"])
+            if not classifier._is_valid_classification(result):
+                outcomes[image_hash] = (None, f"分类失败: {result.get('description')}")
+                continue
+            await cache_service.save_result(
+                image_hash=image_hash,
+                category=result['category'],
+                confidence=result['confidence'],
+                description=result.get('description'),
+                model_used=model_used
+            )
+            outcomes[image_hash] = (result, None)
+        
+        await self._finish_images(outcomes, batch_id)
+        
+        success = sum(1 for result, _ in outcomes.values() if result)
+        async with db.get_cursor() as cursor:
+            await cursor.execute(
+                """UPDATE offline_batches
+                   SET status = %s, success_count = %s, fail_count = %s, error = %s, finished_at = NOW()
+                   WHERE batch_id = %s""",
+                ('failed' if batch_error else 'completed', success, len(outcomes) - success,
+                 batch_error[:500] if batch_error else None, batch_id)
+            )
+        logger.info(f"离线批量任务完成: {batch_id}, 成功: {success}, 失败: {len(outcomes) - success}")
+    
+    async def _finish_images(self, outcomes: Dict[str, tuple], batch_id: Optional[str]):
+        """
+        写回图片结果：更新离线任务中处理中的同哈希图片，记录请求日志，删除暂存图片
+        
+        在一个事务中先删除待处理图片记录（只删除该批量任务的记录，batch_id为空时只删除未提交的记录），
+        再更新任务图片和删除暂存文件：删除锁住了这些记录，同时加入的同哈希图片（enqueue的INSERT IGNORE）
+        等待事务提交后重新加入，不会被忽略后又被删除
+        
+        Args:
+            outcomes: {图片哈希: (分类结果, 失败原因)}
+            batch_id: 结果所属的批量任务ID（暂存图片丢失、未提交的图片为None）
+        """
+        if not outcomes:
+            return
+        image_hashes = list(outcomes)
+        placeholders = ",".join(["%s"] * len(image_hashes))
+        async with db.get_cursor() as cursor:
+            await cursor.execute("START TRANSACTION")
+            if batch_id:
+                await cursor.execute(
+                    f"DELETE FROM offline_batch_images WHERE batch_id = %s AND image_hash IN ({placeholders})",
+                    [batch_id] + image_hashes
+                )
+            else:
+                await cursor.execute(
+                    f"DELETE FROM offline_batch_images WHERE status = 'waiting' AND image_hash IN ({placeholders})",
+                    image_hashes
+                )
+            
+            await cursor.execute(
+                f"""SELECT i.image_hash, MIN(j.user_id) AS user_id, MIN(j.ip_address) AS ip_address,
+                           MAX(TIMESTAMPDIFF(MICROSECOND, i.updated_at, NOW(3)) DIV 1000) AS waited_ms,
+                           GROUP_CONCAT(DISTINCT i.job_id) AS job_ids
+                    FROM classify_job_items i JOIN classify_jobs j ON j.job_id = i.job_id
+                    WHERE j.mode = 'offline' AND i.status = 'queued' AND i.image_hash IN ({placeholders})
+                    GROUP BY i.image_hash""",
+                image_hashes
+            )
+            items = {row['image_hash']: row for row in await cursor.fetchall()}
+            
+            await cursor.executemany(
+                """UPDATE classify_job_items i JOIN classify_jobs j ON j.job_id = i.job_id
+                   SET i.status = %s, i.category = %s, i.confidence = %s, i.description = %s,
+                       i.from_cache = 0, i.inference_method = %s, i.error = %s,
+                       i.processing_time_ms = TIMESTAMPDIFF(MICROSECOND, i.updated_at, NOW(3)) DIV 1000
+                   WHERE j.mode = 'offline' AND i.status = 'queued' AND i.image_hash = %s""",
+                [(
+                    'completed' if result else 'failed',
+                    result['category'] if result else None,
+                    result['confidence'] if result else None,
+                    result.get('description') if result else None,
+                    'llm_batch' if result else None,
+                    None if result else (error or "")[:500],
+                    image_hash
+                ) for image_hash, (result, error) in outcomes.items()]
+            )
+            
+            # 提交前删除暂存文件：同时加入的同哈希图片（enqueue）在提交后才写入记录和暂存文件，不会被删除
+            for image_hash in image_hashes:
+                try:
+                    os.remove(self.spool_path(image_hash))
+                except FileNotFoundError:
+                    pass
+        
+        # 每个哈希记录一次请求日志（一次大模型批量请求）
+        from app.services.stats_service import stats_service
+        await stats_service.log_requests([{
+            "request_id": IDGenerator.generate_request_id(),
+            "user_id": items[image_hash]['user_id'] if image_hash in items else None,
+            "ip_address": items[image_hash]['ip_address'] if image_hash in items else None,
+            "image_hash": image_hash,
+            "image_size": 0,
+            "category": result['category'],
+            "confidence": result['confidence'],
+            "from_cache": False,
+            "processing_time_ms": int(items[image_hash]['waited_ms'] or 0) if image_hash in items else 0,
+            "inference_method": "llm_batch"
+        } for image_hash, (result, _) in outcomes.items() if result])
+        
+        # 刷新受影响任务的进度
+        from app.services.classify_job_service import classify_job_service
+        job_ids = {job_id for row in items.values() for job_id in (row['job_ids'] or "").split(",") if job_id}
+        for job_id in job_ids:
+            await classify_job_service.refresh_progress(job_id)
+    
+    async def run_once(self):
+        """轮询已提交的批量任务，再提交新的批量任务（直到没有满足提交条件的图片）"""
+        await self.poll_batches()
+        while await self.submit_waiting():
+            pass
+
+
+# 全局离线批量分类服务实例
+offline_batch_service = OfflineBatchService()
@@ -0,0 +1,53 @@
+"""
+离线批量处理进程
+定时轮询已提交的大模型批量任务并写回结果，待提交图片满足条件时提交新的批量任务
+
+启动方式：
+    python -m app.services.offline_batch_worker
+（开启 OFFLINE_BATCH_ENABLED 后由 gunicorn_config.py 在主进程启动时自动拉起，只运行一个，
+避免多个worker重复提交和轮询）
+"""
+
+import asyncio
+import signal
+import sys
+from loguru import logger
+
+from app.config import settings
+from app.database import db
+from app.services.offline_batch_service import offline_batch_service
+
+
+async def main():
+    """离线批量处理进程入口"""
+    logger.remove()
+    logger.add(
+        sys.stdout,
+        format="<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | offline-batch | <level>{message}</level>",
+        level=settings.LOG_LEVEL
+    )
+    
+    await db.connect()
+    logger.info(f"✅ 离线批量处理进程已启动（提供商: {settings.OFFLINE_BATCH_PROVIDER or settings.LLM_PROVIDER}）")
+    
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop_event.set)
+    
+    while not stop_event.is_set():
+        try:
+            await offline_batch_service.run_once()
+        except Exception as e:
+            logger.error(f"离线批量处理失败: {e}")
+        try:
+            await asyncio.wait_for(stop_event.wait(), settings.OFFLINE_BATCH_POLL_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+    
+    await db.disconnect()
+    logger.info("离线批量处理进程已停止")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,181 @@
+"""
+规则预分类
+缓存未命中后、调用任何模型之前，只根据文件头、EXIF和尺寸判断确定性高的类别（微秒级），
+命中时直接返回结果，不调用大模型和本地模型
+
+内置规则（PRE_CLASSIFIER_RULES按顺序匹配，第一个命中的规则生效）：
+- screenshot_metadata: 元数据（EXIF Software、PNG Software、XMP）标明是截图，且没有相机型号 → screenshot
+- screenshot_resolution: PNG、没有相机EXIF、尺寸正好是手机屏幕分辨率 → screenshot
+
+相机拍摄的照片带有Make/Model标签，所有内置规则都会排除这类图片。
+客户端按上传规格缩放后重新编码的图片已不是原格式和原尺寸、也没有EXIF，规则不会命中，
+只对上传原图（或保留元数据的上传）有效
+
+新规则用 pre_classifier.register_rule 注册，并加入PRE_CLASSIFIER_RULES后生效
+"""
+
+from typing import Callable, Dict, Optional, Set, Tuple
+from loguru import logger
+
+from app.config import settings
+
+# 规则函数：输入图片特征，命中时返回原因描述，否则返回None
+RuleFunc = Callable[[dict], Optional[str]]
+
+
+class PreClassifier:
+    """规则预分类类"""
+    
+    def __init__(self):
+        self._rules: Dict[str, tuple] = {}
+        # 命中统计（每个进程独立统计）
+        self._evaluated = 0
+        self._hits: Dict[str, int] = {}
+        # 手机屏幕分辨率（启动时解析一次，配置修改后才重新解析）
+        self._resolutions_source: Optional[str] = None
+        self._resolutions: Set[Tuple[int, int]] = set()
+        
+        self.register_rule("screenshot_metadata", "screenshot", self._screenshot_metadata)
+        self.register_rule("screenshot_resolution", "screenshot", self._screenshot_resolution)
+        self.screen_resolutions()
+    
+    def register_rule(self, name: str, category: str, func: RuleFunc):
+        """
+        注册规则
+        
+        Args:
+            name: 规则名称（PRE_CLASSIFIER_RULES中使用）
+            category: 命中时返回的类别
+            func: 规则函数（输入features()返回的图片特征，命中时返回原因描述）
+        """
+        if category not in settings.CATEGORIES:
+            raise ValueError(f"无效的类别: {category}")
+        self._rules[name] = (category, func)
+        self._hits.setdefault(name, 0)
+    
+    @staticmethod
+    def features(probe) -> dict:
+        """
+        提取图片特征（文件头和元数据，不解码图片）
+        
+        Args:
+            probe: 图片探针（ImageProbe）
+        """
+        info = probe.info
+        meta = probe.metadata
+        return {
+            "format": info.get("format", ""),
+            "width": info.get("width", 0),
+            "height": info.get("height", 0),
+            "size": probe.size,
+            "exif": meta["exif"],
+            "make": meta["make"],
+            "model": meta["model"],
+            "software": meta["software"],
+            "xmp": meta["xmp"],
+            "camera": bool(meta["make"] or meta["model"])
+        }
+    
+    @staticmethod
+    def _screenshot_metadata(features: dict) -> Optional[str]:
+        """元数据标明是截图（iOS截图的XMP UserComment为Screenshot，部分Android截图写入Software）"""
+        if features["camera"]:
+            return None
+        if "screenshot" in features["software"].lower():
+            return f"Software={features['software']}"
+        if "screenshot" in features["xmp"].lower():
+            return "XMP标记为截图"
+        return None
+    
+    def screen_resolutions(self) -> Set[Tuple[int, int]]:
+        """
+        PRE_CLASSIFIER_SCREEN_RESOLUTIONS解析后的手机屏幕分辨率集合（宽, 高）
+        
+        配置不变时直接返回上次的解析结果；格式不对的项（如1080x、abcx1920）跳过并记录警告
+        """
+        source = settings.PRE_CLASSIFIER_SCREEN_RESOLUTIONS
+        if source != self._resolutions_source:
+            resolutions = set()
+            for item in source.split(";"):
+                item = item.strip().lower()
+                if not item:
+                    continue
+                try:
+                    width, height = (int(value) for value in item.split("x"))
+                except ValueError:
+                    width = height = 0
+                if width <= 0 or height <= 0:
+                    logger.warning(f"PRE_CLASSIFIER_SCREEN_RESOLUTIONS中的分辨率无效，已跳过: {item}")
+                    continue
+                resolutions.add((width, height))
+            self._resolutions_source = source
+            self._resolutions = resolutions
+        return self._resolutions
+    
+    def _screenshot_resolution(self, features: dict) -> Optional[str]:
+        """PNG、没有相机EXIF，尺寸正好是手机屏幕分辨率（横竖屏均可）"""
+        if features["format"] != "png" or features["camera"]:
+            return None
+        size = (features["width"], features["height"])
+        resolutions = self.screen_resolutions()
+        if size in resolutions or size[::-1] in resolutions:
+            return f"PNG屏幕分辨率{size[0]}x{size[1]}"
+        return None
+    
+    def classify(self, probe, count: bool = True) -> Optional[dict]:
+        """
+        按PRE_CLASSIFIER_RULES依次匹配规则
+        
+        Args:
+            probe: 图片探针（ImageProbe）
+            count: 是否计入命中统计
+        
+        Returns:
+            命中时返回分类结果（category、confidence、description、rule），否则返回None
+        """
+        try:
+            features = self.features(probe)
+        except Exception as e:
+            logger.warning(f"提取图片特征失败，跳过规则预分类: {e}")
+            return None
+        
+        if count:
+            self._evaluated += 1
+        for name in settings.pre_classifier_rules:
+            if name not in self._rules:
+                continue
+            category, func = self._rules[name]
+            try:
+                reason = func(features)
+            except Exception as e:
+                logger.warning(f"规则预分类规则执行失败，跳过: {name}, 错误: {e}")
+                continue
+            if reason:
+                if count:
+                    self._hits[name] += 1
+                return {
+                    "category": category,
+                    "confidence": settings.PRE_CLASSIFIER_CONFIDENCE,
+                    "description": f"规则预分类: {reason}",
+                    "rule": name
+                }
+        return None
+    
+    def snapshot(self) -> dict:
+        """各规则的命中次数和命中率（当前进程）"""
+        enabled = settings.pre_classifier_rules
+        return {
+            "evaluated": self._evaluated,
+            "hits": sum(self._hits.values()),
+            "rules": [{
+                "name": name,
+                "category": category,
+                "enabled": name in enabled,
+                "hits": self._hits[name],
+                "hit_rate": round(self._hits[name] / self._evaluated, 4) if self._evaluated else 0.0
+            } for name, (category, _) in self._rules.items()]
+        }
+
+
+# 全局规则预分类实例
+pre_classifier = PreClassifier()
@@ -3,7 +3,7 @@
 负责记录请求日志和查询统计数据
 """
 
-from typing import Optional
+from typing import Optional, List
 from app.database import db
 from loguru import logger
 from app.config import settings
@@ -22,7 +22,8 @@ class StatsService:
         total_images: int = 0,
         cached_count: int = 0,
         llm_count: int = 0,
-        local_count: int = 0
+        local_count: int = 0,
+        rule_count: int = 0
     ) -> bool:
         """
         统一的请求日志记录函数
@@ -37,6 +38,7 @@ class StatsService:
             cached_count: 缓存命中数
             llm_count: 大模型处理数
             local_count: 本地处理数
+            rule_count: 规则预分类命中数（未调用任何模型）
             
         Returns:
             是否记录成功
@@ -45,6 +47,8 @@ class StatsService:
             return True
         
         try:
+            # 有规则命中时才写rule_count（兼容未执行add_rule_count.sql的表结构）
+            with_rule = bool(rule_count) and await db.has_column('unified_request_log', 'rule_count')
             async with db.get_cursor() as cursor:
                 sql = """
                 INSERT INTO unified_request_log (
@@ -57,13 +61,23 @@ class StatsService:
                 total_images = int(total_images) if total_images is not None else 0
                 llm_count = int(llm_count) if llm_count is not None else 0
                 local_count = int(local_count) if local_count is not None else 0
+                rule_count = int(rule_count) if rule_count is not None else 0
                 
-                logger.info(f"记录统一请求日志 [{request_id}]: type={request_type}, total={total_images}, cached={cached_count}, llm={llm_count}, local={local_count}")
+                logger.info(f"记录统一请求日志 [{request_id}]: type={request_type}, total={total_images}, cached={cached_count}, llm={llm_count}, local={local_count}, rule={rule_count}")
                 
-                await cursor.execute(sql, (
+                params = (
                     request_id, request_type, ip_address, client_id, openid,
                     total_images, cached_count, llm_count, local_count
-                ))
+                )
+                if with_rule:
+                    sql = """
+                    INSERT INTO unified_request_log (
+                        request_id, request_type, ip_address, client_id, openid,
+                        total_images, cached_count, llm_count, local_count, rule_count, created_at
+                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, NOW())
+                    """
+                    params += (rule_count,)
+                await cursor.execute(sql, params)
                 logger.debug(f"统一请求日志已记录: {request_id} [{request_type}]")
                 return True
                 
@@ -82,7 +96,8 @@ class StatsService:
         confidence: float,
         from_cache: bool,
         processing_time_ms: int,
-        inference_method: str = "llm"
+        inference_method: str = "llm",
+        progressive: Optional[dict] = None
     ) -> bool:
         """
         记录请求日志
@@ -97,7 +112,8 @@ class StatsService:
             confidence: 置信度
             from_cache: 是否来自缓存
             processing_time_ms: 处理耗时
-            inference_method: 推理方式(llm/local/llm_fallback/local_fallback)
+            inference_method: 推理方式(llm/local/llm_fallback/local_fallback/local_mapped/rule/dedup)
+            progressive: 渐进式分类信息（refined、low_res_category、low_res_confidence），未使用时为None
             
         Returns:
             是否记录成功
@@ -115,10 +131,26 @@ class StatsService:
                     created_at
                 ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, NOW())
                 """
-                await cursor.execute(sql, (
+                params = (
                     request_id, user_id, ip_address, image_hash, image_size,
                     category, confidence, 1 if from_cache else 0, processing_time_ms, inference_method
-                ))
+                )
+                if progressive:
+                    # 渐进式分类额外记录首轮结果（未使用渐进式分类时不写这些列，兼容未执行迁移的表结构）
+                    sql = """
+                    INSERT INTO request_log (
+                        request_id, user_id, ip_address, image_hash, image_size,
+                        category, confidence, from_cache, processing_time_ms, inference_method,
+                        llm_refined, low_res_category, low_res_confidence,
+                        created_at
+                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, NOW())
+                    """
+                    params += (
+                        1 if progressive['refined'] else 0,
+                        progressive['low_res_category'],
+                        progressive['low_res_confidence']
+                    )
+                await cursor.execute(sql, params)
                 logger.debug(f"请求日志已记录: {request_id}")
                 return True
                 
@@ -126,6 +158,80 @@ class StatsService:
             logger.error(f"记录请求日志失败: {e}")
             return False
     
+    async def log_requests(self, rows: List[dict]) -> bool:
+        """
+        批量记录请求日志（一次executemany）
+        
+        Args:
+            rows: 日志列表，每项字段同log_request的参数
+        
+        Returns:
+            是否记录成功
+        """
+        if not settings.ENABLE_REQUEST_LOG or not rows:
+            return True
+        
+        try:
+            async with db.get_cursor() as cursor:
+                sql = """
+                INSERT INTO request_log (
+                    request_id, user_id, ip_address, image_hash, image_size,
+                    category, confidence, from_cache, processing_time_ms, inference_method,
+                    created_at
+                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, NOW())
+                """
+                await cursor.executemany(sql, [(
+                    row['request_id'], row['user_id'], row['ip_address'], row['image_hash'], row['image_size'],
+                    row['category'], row['confidence'], 1 if row['from_cache'] else 0,
+                    row['processing_time_ms'], row.get('inference_method', 'llm')
+                ) for row in rows])
+                logger.debug(f"批量请求日志已记录: {len(rows)}条")
+                return True
+        
+        except Exception as e:
+            logger.error(f"批量记录请求日志失败: {e}")
+            return False
+    
+    async def log_llm_calls(self, request_id: str, calls: List[dict]) -> bool:
+        """
+        记录一次请求中的大模型调用明细（一次executemany）
+        
+        Args:
+            request_id: 请求ID（对应request_log）
+            calls: 调用明细列表（ModelClient.classify_image写入的telemetry，加上purpose、queue_ms
+                和级联调用的tier、escalated），按调用顺序排列
+        
+        Returns:
+            是否记录成功
+        """
+        if not settings.ENABLE_LLM_CALL_LOG or not calls:
+            return True
+        
+        try:
+            async with db.get_cursor() as cursor:
+                sql = """
+                INSERT INTO llm_call_log (
+                    request_id, attempt, purpose, provider, model, tier, escalated, prompt_profile,
+                    image_bytes, request_bytes, queue_ms, latency_ms,
+                    input_tokens, output_tokens, success, parse_failed, error,
+                    created_at
+                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, NOW())
+                """
+                await cursor.executemany(sql, [(
+                    request_id, attempt, call.get('purpose'), call.get('provider'), call.get('model'),
+                    call.get('tier') or 1, 1 if call.get('escalated') else 0, call.get('prompt_profile'), call.get('image_bytes'), call.get('request_bytes'),
+                    call.get('queue_ms'), call.get('latency_ms'),
+                    call.get('input_tokens'), call.get('output_tokens'),
+                    0 if call.get('error') else 1, 1 if call.get('parse_failed') else 0,
+                    str(call['error'])[:500] if call.get('error') else None
+                ) for attempt, call in enumerate(calls, start=1)])
+                logger.debug(f"大模型调用明细已记录: {request_id}, {len(calls)}次")
+                return True
+        
+        except Exception as e:
+            logger.error(f"记录大模型调用明细失败: {e}")
+            return False
+    
     async def get_today_stats(self) -> dict:
         """
         获取今日统计（使用统一日志表）
@@ -140,6 +246,8 @@ class StatsService:
             今日统计数据
         """
         try:
+            # 规则命中数（未执行add_rule_count.sql时为0）
+            rule_count = "rule_count" if await db.has_column('unified_request_log', 'rule_count') else "0"
             async with db.get_cursor() as cursor:
                 # 使用统一日志表，一个查询搞定所有统计
                 # 独立用户统计逻辑：
@@ -147,7 +255,7 @@ class StatsService:
                 # 2. 通过 wechat_qrcode_bindings 表将 client_id 映射到 openid
                 # 3. 如果有 openid 就用 openid，没有就保留 client_id
                 # 4. 最后对这个集合去重统计
-                await cursor.execute("""
+                await cursor.execute(f"""
                     SELECT 
                         -- 独立IP个数
                         COUNT(DISTINCT ip_address) as unique_ips,
@@ -169,6 +277,7 @@ class StatsService:
                         END) as classify_cached,
                         SUM(CASE WHEN request_type IN ('single_classify', 'batch_classify') THEN COALESCE(llm_count, 0) ELSE 0 END) as classify_llm,
                         SUM(CASE WHEN request_type IN ('single_classify', 'batch_classify') THEN COALESCE(local_count, 0) ELSE 0 END) as classify_local,
+                        SUM(CASE WHEN request_type IN ('single_classify', 'batch_classify') THEN COALESCE({rule_count}, 0) ELSE 0 END) as classify_rule,
                         
                         -- 图像编辑统计
                         SUM(CASE WHEN request_type = 'image_edit' THEN total_images ELSE 0 END) as edit_total,
@@ -187,14 +296,15 @@ class StatsService:
                 result = await cursor.fetchone()
                 
                 # 调试：查询各类型的详细统计
-                await cursor.execute("""
+                await cursor.execute(f"""
                     SELECT 
                         request_type,
                         COUNT(*) as request_count,
                         SUM(total_images) as total_images,
                         SUM(COALESCE(cached_count, 0)) as cached_count,
                         SUM(COALESCE(llm_count, 0)) as llm_count,
-                        SUM(COALESCE(local_count, 0)) as local_count
+                        SUM(COALESCE(local_count, 0)) as local_count,
+                        SUM(COALESCE({rule_count}, 0)) as rule_count
                     FROM unified_request_log
                     WHERE created_date = CURDATE()
                       AND request_type IN ('single_classify', 'batch_classify', 'single_cache', 'batch_cache')
@@ -221,7 +331,8 @@ class StatsService:
                             'total': to_int(result.get('classify_total')),
                             'cached': to_int(result.get('classify_cached')),
                             'llm_inference': to_int(result.get('classify_llm')),
-                            'local_inference': to_int(result.get('classify_local'))
+                            'local_inference': to_int(result.get('classify_local')),
+                            'rule': to_int(result.get('classify_rule'))
                         },
                         'image_edit': {
                             'total': to_int(result.get('edit_total')),
@@ -241,7 +352,8 @@ class StatsService:
                         'total': 0,
                         'cached': 0,
                         'llm_inference': 0,
-                        'local_inference': 0
+                        'local_inference': 0,
+                        'rule': 0
                     },
                     'image_edit': {
                         'total': 0,
@@ -412,6 +524,9 @@ class StatsService:
                     SUM(CASE WHEN inference_method = 'llm_fallback' THEN 1 ELSE 0 END) as llm_fallback,
                     SUM(CASE WHEN inference_method = 'local_fallback' THEN 1 ELSE 0 END) as local_fallback_success,
                     SUM(CASE WHEN inference_method = 'local_test' THEN 1 ELSE 0 END) as local_test,
+                    SUM(CASE WHEN inference_method = 'local_mapped' THEN 1 ELSE 0 END) as local_mapped,
+                    SUM(CASE WHEN inference_method = 'rule' THEN 1 ELSE 0 END) as rule,
+                    SUM(CASE WHEN inference_method = 'dedup' THEN 1 ELSE 0 END) as dedup,
                     SUM(CASE WHEN inference_method IN ('llm_fallback', 'local_fallback') THEN 1 ELSE 0 END) as total_fallback
                 FROM request_log
                 WHERE created_date = CURDATE()
@@ -430,9 +545,12 @@ class StatsService:
                         'llm_fallback': result['llm_fallback'] or 0,
                         'local_fallback_success': result['local_fallback_success'] or 0,
                         'local_test': result['local_test'] or 0,
+                        'local_mapped': result['local_mapped'] or 0,  # 本地优先直接使用映射结果（未调用大模型）的次数
+                        'rule': result['rule'] or 0,  # 规则预分类命中（未调用任何模型）的次数
+                        'dedup': result['dedup'] or 0,  # 批量分类中复用同批次重复图片结果的次数（计入from_cache）
                         'total_fallback': result['total_fallback'] or 0,
                         'llm_fail_count': result['local_fallback_success'] or 0,  # 大模型失败次数 = 降级到本地推理的次数
-                        'local_total': (result['local_direct'] or 0) + (result['local_fallback_success'] or 0) + (result['local_test'] or 0)  # 本地推理总次数（包含测试）
+                        'local_total': (result['local_direct'] or 0) + (result['local_fallback_success'] or 0) + (result['local_test'] or 0) + (result['local_mapped'] or 0)  # 本地推理总次数（包含测试）
                     }
                 
                 return {}
@@ -613,6 +731,8 @@ class StatsService:
             统计数据（每日统计）
         """
         try:
+            # 规则命中数（未执行add_rule_count.sql时为0）
+            rule_count = "rule_count" if await db.has_column('unified_request_log', 'rule_count') else "0"
             async with db.get_cursor() as cursor:
                 # 类型转换函数
                 def to_int(value):
@@ -624,8 +744,8 @@ class StatsService:
                         return 0
                 
                 # 每日统计（从 unified_request_log 表，筛选 batch_classify 类型）
-                # 统计指标：请求总数、独立用户数、独立IP数、照片数、缓存数、大模型推理数、本地推理数
-                await cursor.execute("""
+                # 统计指标：请求总数、独立用户数、独立IP数、照片数、缓存数、大模型推理数、本地推理数、规则命中数
+                await cursor.execute(f"""
                     SELECT 
                         created_date,
                         -- 请求总数（批量分类请求次数）
@@ -644,7 +764,9 @@ class StatsService:
                         -- 大模型推理数
                         SUM(llm_count) as llm,
                         -- 本地推理数
-                        SUM(local_count) as local
+                        SUM(local_count) as local,
+                        -- 规则预分类命中数（未调用任何模型）
+                        SUM({rule_count}) as rule
                     FROM unified_request_log log
                     LEFT JOIN (
                         -- 获取每个 client_id 对应的 openid（如果有）
@@ -671,7 +793,8 @@ class StatsService:
                         "images": to_int(row.get('images')),
                         "cached": to_int(row.get('cached')),
                         "llm": to_int(row.get('llm')),
-                        "local": to_int(row.get('local'))
+                        "local": to_int(row.get('local')),
+                        "rule": to_int(row.get('rule'))
                     })
                 
                 logger.debug(f"批量分类统计结果: daily_count={len(daily_stats)}")
@@ -685,6 +808,258 @@ class StatsService:
                 "daily": []
             }
     
+    async def get_progressive_stats(self, days: int = 7) -> dict:
+        """
+        获取渐进式分类统计（低分辨率首轮结果是否足够，用于调整LLM_PROGRESSIVE_CONFIDENCE）
+        
+        Args:
+            days: 查询最近几天的数据
+        
+        Returns:
+            每日统计和按首轮置信度分段的统计（changed为重新分类后类别发生变化的次数）
+        """
+        try:
+            async with db.get_cursor() as cursor:
+                # 类型转换函数
+                def to_int(value):
+                    if value is None:
+                        return 0
+                    try:
+                        return int(float(value))
+                    except (ValueError, TypeError):
+                        return 0
+                
+                # 每日统计：渐进式分类次数、重新分类次数、类别变化次数、平均耗时
+                await cursor.execute("""
+                    SELECT 
+                        created_date,
+                        COUNT(*) as total,
+                        SUM(llm_refined = 1) as refined,
+                        SUM(llm_refined = 1 AND low_res_category <> category) as changed,
+                        AVG(CASE WHEN llm_refined = 0 THEN processing_time_ms END) as avg_time_low_res,
+                        AVG(CASE WHEN llm_refined = 1 THEN processing_time_ms END) as avg_time_refined
+                    FROM request_log
+                    WHERE llm_refined IS NOT NULL
+                      AND created_date >= DATE_SUB(CURDATE(), INTERVAL %s DAY)
+                    GROUP BY created_date
+                    ORDER BY created_date DESC
+                """, (days,))
+                daily = await cursor.fetchall()
+                
+                # 按首轮置信度分段（0.1一段）：每段重新分类后类别变化的比例决定阈值是否合适
+                await cursor.execute("""
+                    SELECT 
+                        FLOOR(low_res_confidence * 10) / 10 as bucket,
+                        COUNT(*) as total,
+                        SUM(llm_refined = 1) as refined,
+                        SUM(llm_refined = 1 AND low_res_category <> category) as changed
+                    FROM request_log
+                    WHERE llm_refined IS NOT NULL
+                      AND created_date >= DATE_SUB(CURDATE(), INTERVAL %s DAY)
+                    GROUP BY bucket
+                    ORDER BY bucket
+                """, (days,))
+                buckets = await cursor.fetchall()
+                
+                daily_stats = []
+                for row in daily:
+                    total = to_int(row.get('total'))
+                    refined = to_int(row.get('refined'))
+                    daily_stats.append({
+                        "date": str(row['created_date']),
+                        "total": total,
+                        "refined": refined,
+                        "changed": to_int(row.get('changed')),
+                        "refine_rate": round(refined * 100 / total, 2) if total else 0,
+                        "avg_time_low_res_ms": to_int(row.get('avg_time_low_res')),
+                        "avg_time_refined_ms": to_int(row.get('avg_time_refined'))
+                    })
+                
+                bucket_stats = [{
+                    "confidence": float(row['bucket']) if row['bucket'] is not None else None,
+                    "total": to_int(row.get('total')),
+                    "refined": to_int(row.get('refined')),
+                    "changed": to_int(row.get('changed'))
+                } for row in buckets]
+                
+                return {
+                    "threshold": settings.LLM_PROGRESSIVE_CONFIDENCE,
+                    "daily": daily_stats,
+                    "confidence_buckets": bucket_stats
+                }
+        except Exception as e:
+            logger.error(f"获取渐进式分类统计失败: {e}", exc_info=True)
+            return {
+                "threshold": settings.LLM_PROGRESSIVE_CONFIDENCE,
+                "daily": [],
+                "confidence_buckets": []
+            }
+    
+    def _estimate_llm_cost(self, calls: int, input_tokens: int, output_tokens: int) -> float:
+        """估算大模型调用成本（配置了token单价时按token计算，否则按次数计算）"""
+        input_price = settings.LLM_COST_PER_1K_INPUT_TOKENS
+        output_price = settings.LLM_COST_PER_1K_OUTPUT_TOKENS
+        if input_price or output_price:
+            return round(input_tokens / 1000 * input_price + output_tokens / 1000 * output_price, 4)
+        return round(calls * settings.COST_PER_API_CALL, 4)
+    
+    async def get_llm_call_stats(self, days: int = 7) -> dict:
+        """
+        获取大模型调用统计（延迟、token用量和成本，用于定位拖慢延迟和推高成本的提供商和图片大小）
+        
+        Args:
+            days: 查询最近几天的数据
+        
+        Returns:
+            每日统计、按提供商/模型/提示词模式/调用用途的统计、按级联层级的统计和按图片大小分段的统计
+        """
+        pricing = "per_token" if (settings.LLM_COST_PER_1K_INPUT_TOKENS or settings.LLM_COST_PER_1K_OUTPUT_TOKENS) else "per_call"
+        try:
+            async with db.get_cursor() as cursor:
+                # 类型转换函数
+                def to_int(value):
+                    if value is None:
+                        return 0
+                    try:
+                        return int(float(value))
+                    except (ValueError, TypeError):
+                        return 0
+                
+                await cursor.execute("""
+                    SELECT 
+                        created_date,
+                        COUNT(*) as calls,
+                        SUM(success = 0) as failed,
+                        AVG(latency_ms) as avg_latency,
+                        MAX(latency_ms) as max_latency,
+                        AVG(queue_ms) as avg_queue,
+                        SUM(input_tokens) as input_tokens,
+                        SUM(output_tokens) as output_tokens
+                    FROM llm_call_log
+                    WHERE created_date >= DATE_SUB(CURDATE(), INTERVAL %s DAY)
+                    GROUP BY created_date
+                    ORDER BY created_date DESC
+                """, (days,))
+                daily = await cursor.fetchall()
+                
+                await cursor.execute("""
+                    SELECT 
+                        provider, model, prompt_profile, purpose,
+                        COUNT(*) as calls,
+                        SUM(success = 0) as failed,
+                        SUM(parse_failed = 1) as parse_failed,
+                        AVG(latency_ms) as avg_latency,
+                        MAX(latency_ms) as max_latency,
+                        AVG(queue_ms) as avg_queue,
+                        AVG(request_bytes) as avg_request_bytes,
+                        SUM(input_tokens) as input_tokens,
+                        SUM(output_tokens) as output_tokens
+                    FROM llm_call_log
+                    WHERE created_date >= DATE_SUB(CURDATE(), INTERVAL %s DAY)
+                    GROUP BY provider, model, prompt_profile, purpose
+                    ORDER BY calls DESC
+                """, (days,))
+                by_model = await cursor.fetchall()
+                
+                # 按级联层级：各级延迟和升级到下一级的比例（大部分请求应在第一级完成）
+                await cursor.execute("""
+                    SELECT 
+                        tier, model,
+                        COUNT(*) as calls,
+                        SUM(success = 0) as failed,
+                        SUM(escalated = 1) as escalated,
+                        AVG(latency_ms) as avg_latency,
+                        MAX(latency_ms) as max_latency,
+                        AVG(queue_ms) as avg_queue,
+                        SUM(input_tokens) as input_tokens,
+                        SUM(output_tokens) as output_tokens
+                    FROM llm_call_log
+                    WHERE created_date >= DATE_SUB(CURDATE(), INTERVAL %s DAY)
+                    GROUP BY tier, model
+                    ORDER BY tier, calls DESC
+                """, (days,))
+                by_tier = await cursor.fetchall()
+                
+                # 按发送给大模型的图片大小分段：各段的平均延迟和输入token数
+                await cursor.execute("""
+                    SELECT 
+                        CASE 
+                            WHEN image_bytes < 100 * 1024 THEN '<100KB'
+                            WHEN image_bytes < 300 * 1024 THEN '100-300KB'
+                            WHEN image_bytes < 1024 * 1024 THEN '300KB-1MB'
+                            WHEN image_bytes < 3 * 1024 * 1024 THEN '1-3MB'
+                            ELSE '>=3MB'
+                        END as size_range,
+                        MIN(image_bytes) as min_bytes,
+                        COUNT(*) as calls,
+                        AVG(latency_ms) as avg_latency,
+                        AVG(input_tokens) as avg_input_tokens
+                    FROM llm_call_log
+                    WHERE created_date >= DATE_SUB(CURDATE(), INTERVAL %s DAY)
+                    GROUP BY size_range
+                    ORDER BY min_bytes
+                """, (days,))
+                by_size = await cursor.fetchall()
+                
+                def summarize(row: dict) -> dict:
+                    calls = to_int(row.get('calls'))
+                    input_tokens = to_int(row.get('input_tokens'))
+                    output_tokens = to_int(row.get('output_tokens'))
+                    return {
+                        "calls": calls,
+                        "failed": to_int(row.get('failed')),
+                        "avg_latency_ms": to_int(row.get('avg_latency')),
+                        "max_latency_ms": to_int(row.get('max_latency')),
+                        "avg_queue_ms": to_int(row.get('avg_queue')),
+                        "input_tokens": input_tokens,
+                        "output_tokens": output_tokens,
+                        "estimated_cost": self._estimate_llm_cost(calls, input_tokens, output_tokens)
+                    }
+                
+                daily_stats = [{"date": str(row['created_date']), **summarize(row)} for row in daily]
+                
+                model_stats = [{
+                    "provider": row['provider'],
+                    "model": row['model'],
+                    "prompt_profile": row['prompt_profile'],
+                    "purpose": row['purpose'],
+                    **summarize(row),
+                    "parse_failed": to_int(row.get('parse_failed')),
+                    "avg_request_kb": round(to_int(row.get('avg_request_bytes')) / 1024, 1)
+                } for row in by_model]
+                
+                tier_stats = [{
+                    "tier": to_int(row['tier']),
+                    "model": row['model'],
+                    **summarize(row),
+                    "escalated": to_int(row.get('escalated')),
+                    "escalation_rate": round(to_int(row.get('escalated')) / to_int(row['calls']), 4) if to_int(row['calls']) else 0.0
+                } for row in by_tier]
+                
+                size_stats = [{
+                    "size_range": row['size_range'],
+                    "calls": to_int(row.get('calls')),
+                    "avg_latency_ms": to_int(row.get('avg_latency')),
+                    "avg_input_tokens": to_int(row.get('avg_input_tokens'))
+                } for row in by_size]
+                
+                return {
+                    "pricing": pricing,
+                    "daily": daily_stats,
+                    "by_model": model_stats,
+                    "by_tier": tier_stats,
+                    "by_image_size": size_stats
+                }
+        except Exception as e:
+            logger.error(f"获取大模型调用统计失败: {e}", exc_info=True)
+            return {
+                "pricing": pricing,
+                "daily": [],
+                "by_model": [],
+                "by_tier": [],
+                "by_image_size": []
+            }
+    
     async def get_image_edit_stats(self, days: int = 7) -> dict:
         """
         获取图片编辑统计（从统一日志表统计，简化版）
@@ -4,6 +4,9 @@
 """
 
 import hashlib
+import re
+
+SHA256_PATTERN = re.compile(r"[0-9a-fA-F]{64}")
 
 
 class HashUtils:
@@ -39,6 +42,16 @@ class HashUtils:
             for byte_block in iter(lambda: f.read(4096), b""):
                 sha256_hash.update(byte_block)
         return sha256_hash.hexdigest()
+    
+    @staticmethod
+    def is_sha256(value: str) -> bool:
+        """
+        是否为SHA-256哈希字符串（64个十六进制字符，不区分大小写）
+        
+        Args:
+            value: 待检查的字符串
+        """
+        return isinstance(value, str) and SHA256_PATTERN.fullmatch(value) is not None
 
 
 # 全局函数别名，方便导入使用
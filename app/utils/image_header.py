@@ -0,0 +1,267 @@
+"""
+图片头解析工具
+直接从文件头读取格式、宽高和颜色模式（JPEG SOF、PNG IHDR、WebP VP8/VP8L/VP8X、GIF逻辑屏幕描述符、
+MPO的APP2 MPF段），不经过Pillow，用于上传校验时快速拒绝无效、超大的图片；
+以及相机/软件元数据（JPEG APP1 Exif/XMP段、PNG eXIf/tEXt/iTXt块），用于规则预分类
+"""
+
+import struct
+from typing import Optional
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# JPEG帧头标记（SOF0~SOF15，不含DHT/JPG/DAC）
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+# MPF中的图片数量标签（NumberOfImages）
+MPF_NUMBER_OF_IMAGES = 0xB001
+
+# EXIF IFD0中的相机/软件标签（ASCII）
+EXIF_TAGS = {0x010F: "make", 0x0110: "model", 0x0131: "software"}
+EXIF_HEADER = b"Exif\x00\x00"
+XMP_HEADER = b"http://ns.adobe.com/xap/1.0/\x00"
+# 元数据只需要前面的块，XMP只保留开头部分
+XMP_MAX_BYTES = 4096
+
+JPEG_MODES = {1: "L", 3: "RGB", 4: "CMYK"}
+PNG_MODES = {0: "L", 2: "RGB", 3: "P", 4: "LA", 6: "RGBA"}
+
+
+class ImageHeader:
+    """图片头解析类"""
+    
+    @staticmethod
+    def parse(data: bytes) -> Optional[dict]:
+        """
+        解析图片头
+        
+        Args:
+            data: 图片二进制数据
+        
+        Returns:
+            {"format", "width", "height", "mode"}，格式与Pillow一致（小写）；
+            无法识别或头信息损坏时返回None。
+            BMP/TIFF等不在允许列表中的格式只识别格式，宽高为0
+        """
+        try:
+            if data[:2] == b"\xff\xd8":
+                return ImageHeader._parse_jpeg(data)
+            if data[:8] == PNG_SIGNATURE:
+                return ImageHeader._parse_png(data)
+            if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+                return ImageHeader._parse_webp(data)
+            if data[:6] in (b"GIF87a", b"GIF89a"):
+                return ImageHeader._parse_gif(data)
+            if data[:2] == b"BM":
+                return {"format": "bmp", "width": 0, "height": 0, "mode": ""}
+            if data[:4] in (b"II*\x00", b"MM\x00*"):
+                return {"format": "tiff", "width": 0, "height": 0, "mode": ""}
+        except (struct.error, IndexError):
+            return None
+        return None
+    
+    @staticmethod
+    def _result(fmt: str, width: int, height: int, mode: str) -> Optional[dict]:
+        """宽高为0视为损坏"""
+        if width <= 0 or height <= 0:
+            return None
+        return {"format": fmt, "width": width, "height": height, "mode": mode}
+    
+    @staticmethod
+    def _parse_jpeg(data: bytes) -> Optional[dict]:
+        """逐段扫描JPEG标记，读取第一个SOF帧头；帧头之前出现MPF段且包含多张图片时为MPO"""
+        pos = 2
+        is_mpo = False
+        while pos + 4 <= len(data):
+            if data[pos] != 0xFF:
+                return None
+            marker = data[pos + 1]
+            if marker == 0xFF:
+                # 填充字节
+                pos += 1
+                continue
+            if marker == 0x01 or 0xD0 <= marker <= 0xD7:
+                # 无长度字段的标记
+                pos += 2
+                continue
+            if marker in (0xD9, 0xDA):
+                # 帧头之前遇到EOI/SOS
+                return None
+            
+            (length,) = struct.unpack(">H", data[pos + 2:pos + 4])
+            if length < 2:
+                return None
+            segment = data[pos + 4:pos + 2 + length]
+            
+            if marker == 0xE2 and segment[:4] == b"MPF\x00":
+                is_mpo = ImageHeader._mpf_image_count(segment[4:]) > 1
+            elif marker in JPEG_SOF_MARKERS:
+                _, height, width, components = struct.unpack(">BHHB", segment[:6])
+                return ImageHeader._result(
+                    "mpo" if is_mpo else "jpeg", width, height, JPEG_MODES.get(components, "")
+                )
+            pos += 2 + length
+        return None
+    
+    @staticmethod
+    def _mpf_image_count(mpf: bytes) -> int:
+        """读取MPF（TIFF结构）中的图片数量"""
+        if mpf[:2] == b"II":
+            order = "<"
+        elif mpf[:2] == b"MM":
+            order = ">"
+        else:
+            return 0
+        (ifd_offset,) = struct.unpack(order + "I", mpf[4:8])
+        (count,) = struct.unpack(order + "H", mpf[ifd_offset:ifd_offset + 2])
+        for i in range(count):
+            entry = ifd_offset + 2 + i * 12
+            tag, _, _, value = struct.unpack(order + "HHII", mpf[entry:entry + 12])
+            if tag == MPF_NUMBER_OF_IMAGES:
+                return value
+        return 0
+    
+    @staticmethod
+    def _parse_png(data: bytes) -> Optional[dict]:
+        """读取IHDR块（紧跟文件签名）"""
+        if data[12:16] != b"IHDR":
+            return None
+        width, height, bit_depth, color_type = struct.unpack(">IIBB", data[16:26])
+        mode = PNG_MODES.get(color_type, "")
+        if color_type == 0 and bit_depth == 1:
+            mode = "1"
+        elif color_type == 0 and bit_depth == 16:
+            mode = "I;16"
+        return ImageHeader._result("png", width, height, mode)
+    
+    @staticmethod
+    def _parse_webp(data: bytes) -> Optional[dict]:
+        """根据第一个块的类型读取有损（VP8）、无损（VP8L）或扩展（VP8X）格式的尺寸"""
+        chunk = data[12:16]
+        payload = data[20:30]
+        if len(payload) < 10:
+            return None
+        if chunk == b"VP8 ":
+            # 关键帧：3字节帧标记 + 起始码 9d 01 2a + 14位宽高
+            if payload[3:6] != b"\x9d\x01\x2a":
+                return None
+            width, height = struct.unpack("<HH", payload[6:10])
+            return ImageHeader._result("webp", width & 0x3FFF, height & 0x3FFF, "RGB")
+        if chunk == b"VP8L":
+            if payload[0] != 0x2F:
+                return None
+            (bits,) = struct.unpack("<I", payload[1:5])
+            width = (bits & 0x3FFF) + 1
+            height = ((bits >> 14) & 0x3FFF) + 1
+            has_alpha = bits >> 28 & 1
+            return ImageHeader._result("webp", width, height, "RGBA" if has_alpha else "RGB")
+        if chunk == b"VP8X":
+            has_alpha = payload[0] & 0x10
+            width = int.from_bytes(payload[4:7], "little") + 1
+            height = int.from_bytes(payload[7:10], "little") + 1
+            return ImageHeader._result("webp", width, height, "RGBA" if has_alpha else "RGB")
+        return None
+    
+    @staticmethod
+    def _parse_gif(data: bytes) -> Optional[dict]:
+        """读取逻辑屏幕描述符中的画布尺寸"""
+        width, height = struct.unpack("<HH", data[6:10])
+        return ImageHeader._result("gif", width, height, "P")
+    
+    @staticmethod
+    def metadata(data: bytes) -> dict:
+        """
+        读取相机和软件元数据（只扫描文件头部的段/块，不解码图片）
+        
+        Args:
+            data: 图片二进制数据
+        
+        Returns:
+            {"exif", "make", "model", "software", "xmp"}：exif表示是否有EXIF，xmp为XMP文本开头部分；
+            缺失或无法解析时为空
+        """
+        meta = {"exif": False, "make": "", "model": "", "software": "", "xmp": ""}
+        try:
+            if data[:2] == b"\xff\xd8":
+                ImageHeader._jpeg_metadata(data, meta)
+            elif data[:8] == PNG_SIGNATURE:
+                ImageHeader._png_metadata(data, meta)
+        except (struct.error, IndexError):
+            pass
+        return meta
+    
+    @staticmethod
+    def _jpeg_metadata(data: bytes, meta: dict):
+        """扫描JPEG帧头之前的APP1段（Exif、XMP）"""
+        pos = 2
+        while pos + 4 <= len(data):
+            if data[pos] != 0xFF:
+                return
+            marker = data[pos + 1]
+            if marker == 0xFF:
+                pos += 1
+                continue
+            if marker == 0x01 or 0xD0 <= marker <= 0xD7:
+                pos += 2
+                continue
+            if marker in (0xD9, 0xDA) or marker in JPEG_SOF_MARKERS:
+                return
+            
+            (length,) = struct.unpack(">H", data[pos + 2:pos + 4])
+            if length < 2:
+                return
+            segment = data[pos + 4:pos + 2 + length]
+            if marker == 0xE1 and segment.startswith(EXIF_HEADER):
+                ImageHeader._exif_tags(segment[len(EXIF_HEADER):], meta)
+            elif marker == 0xE1 and segment.startswith(XMP_HEADER):
+                meta["xmp"] = segment[len(XMP_HEADER):len(XMP_HEADER) + XMP_MAX_BYTES].decode("utf-8", "ignore")
+            pos += 2 + length
+    
+    @staticmethod
+    def _png_metadata(data: bytes, meta: dict):
+        """扫描PNG图像数据（IDAT）之前的eXIf、tEXt、iTXt块"""
+        pos = 8
+        while pos + 8 <= len(data):
+            length, chunk = struct.unpack(">I4s", data[pos:pos + 8])
+            if chunk in (b"IDAT", b"IEND"):
+                return
+            body = data[pos + 8:pos + 8 + length]
+            if chunk == b"eXIf":
+                ImageHeader._exif_tags(body, meta)
+            elif chunk in (b"tEXt", b"iTXt"):
+                keyword, _, text = body.partition(b"\x00")
+                if chunk == b"iTXt":
+                    # 压缩标志、压缩方法、语言标签、翻译后的关键字
+                    if text[:1] != b"\x00":
+                        pos += 12 + length
+                        continue
+                    text = text[2:].split(b"\x00", 2)[-1]
+                if keyword == b"XML:com.adobe.xmp":
+                    meta["xmp"] = text[:XMP_MAX_BYTES].decode("utf-8", "ignore")
+                elif keyword == b"Software":
+                    meta["software"] = text.decode("latin-1").strip()
+            pos += 12 + length
+    
+    @staticmethod
+    def _exif_tags(tiff: bytes, meta: dict):
+        """读取EXIF（TIFF结构）IFD0中的Make、Model、Software"""
+        if tiff[:2] == b"II":
+            order = "<"
+        elif tiff[:2] == b"MM":
+            order = ">"
+        else:
+            return
+        meta["exif"] = True
+        (ifd_offset,) = struct.unpack(order + "I", tiff[4:8])
+        (count,) = struct.unpack(order + "H", tiff[ifd_offset:ifd_offset + 2])
+        for i in range(count):
+            entry = ifd_offset + 2 + i * 12
+            tag, field_type, length = struct.unpack(order + "HHI", tiff[entry:entry + 8])
+            if tag not in EXIF_TAGS or field_type != 2:
+                continue
+            if length <= 4:
+                value = tiff[entry + 8:entry + 8 + length]
+            else:
+                (offset,) = struct.unpack(order + "I", tiff[entry + 8:entry + 12])
+                value = tiff[offset:offset + length]
+            meta[EXIF_TAGS[tag]] = value.split(b"\x00", 1)[0].decode("utf-8", "ignore").strip()
@@ -0,0 +1,177 @@
+"""
+图片探针
+每次上传只解析一次图片：头信息（直接读取文件头）、解码结果和标准化字节在上传链路
+（接口校验 → 分类服务 → 本地推理）中共享，避免各环节重复Image.open
+"""
+
+from PIL import Image
+import io
+from typing import Optional, Tuple
+from loguru import logger
+from app.config import settings
+from app.utils.image_utils import ImageUtils
+from app.utils.image_header import ImageHeader
+
+
+class ImageProbe:
+    """单次上传的图片探针"""
+    
+    def __init__(self, image_bytes: bytes):
+        """
+        Args:
+            image_bytes: 上传的原始图片数据
+        """
+        self.raw = image_bytes
+        self.size = len(image_bytes)
+        
+        # 头信息（首次访问时从文件头解析，frames需Pillow打开后才有）
+        self.format: str = ""
+        self.width: int = 0
+        self.height: int = 0
+        self.mode: str = ""
+        self.frames: int = 0
+        self.error: Optional[str] = None
+        
+        self._parsed = False
+        self._image: Optional[Image.Image] = None
+        self._decoded: Optional[Tuple[Image.Image, Tuple[float, float]]] = None
+        self._normalized: Optional[bytes] = None
+        self._metadata: Optional[dict] = None
+    
+    def _parse(self) -> bool:
+        """解析图片头（只读取文件头，不经过Pillow）"""
+        if not self._parsed:
+            self._parsed = True
+            header = ImageHeader.parse(self.raw)
+            if header is None:
+                self.error = "无法识别的图片格式或文件头已损坏"
+            else:
+                self.format = header["format"]
+                self.width = header["width"]
+                self.height = header["height"]
+                self.mode = header["mode"]
+        return self.error is None
+    
+    def _open(self) -> Image.Image:
+        """用Pillow打开图片（解码前才打开，且只打开一次）"""
+        if self._image is None:
+            self._image = Image.open(io.BytesIO(self.raw))
+            self.frames = getattr(self._image, "n_frames", 1)
+            self.mode = self.mode or self._image.mode
+        return self._image
+    
+    def validate(self) -> Tuple[bool, str]:
+        """
+        验证图片大小、格式和像素数（只读取文件头，无效图片不会进入Pillow）
+        
+        Returns:
+            (是否有效, 错误信息)
+        """
+        # 检查大小
+        if self.size > settings.max_image_size_bytes:
+            max_mb = settings.MAX_IMAGE_SIZE_MB
+            actual_mb = self.size / 1024 / 1024
+            return False, f"图片过大：{actual_mb:.2f}MB，最大允许{max_mb}MB"
+        
+        # 检查格式
+        if not self._parse():
+            return False, f"无效的图片文件：{self.error}"
+        
+        # MPO格式特殊处理：允许MPO格式，但需要转换为JPEG
+        if self.format != "mpo" and self.format not in settings.allowed_formats_list:
+            allowed = ", ".join(settings.allowed_formats_list)
+            return False, f"不支持的图片格式：{self.format.upper()}，支持的格式：{allowed}"
+        
+        # 检查像素数（防止解压炸弹）
+        pixels = self.width * self.height
+        if pixels > settings.MAX_IMAGE_PIXELS:
+            return False, f"图片像素过多：{self.width}x{self.height}，最大允许{settings.MAX_IMAGE_PIXELS}像素"
+        
+        return True, ""
+    
+    @property
+    def info(self) -> dict:
+        """图片信息（同ImageUtils.get_image_info，只读取文件头）"""
+        if not self._parse():
+            return {}
+        return {
+            "format": self.format,
+            "size": self.size,
+            "width": self.width,
+            "height": self.height,
+            "mode": self.mode
+        }
+    
+    @property
+    def metadata(self) -> dict:
+        """相机和软件元数据（EXIF的Make/Model/Software和XMP，只扫描文件头部，见ImageHeader.metadata）"""
+        if self._metadata is None:
+            self._metadata = ImageHeader.metadata(self.raw)
+        return self._metadata
+    
+    @property
+    def normalized_bytes(self) -> bytes:
+        """
+        标准化后的图片数据（MPO提取第一张转为JPEG，其他格式返回原数据）
+        """
+        if self._normalized is None:
+            self._normalized = self.raw
+            if self._parse() and self.format == "mpo":
+                try:
+                    # 完整解码第一帧（已完整解码时复用，降分辨率的解码结果不会用于标准化）
+                    img, _ = self.decode()
+                    if img.mode != 'RGB':
+                        img = img.convert('RGB')
+                    output = io.BytesIO()
+                    img.save(output, format='JPEG', quality=95, optimize=True)
+                    self._normalized = output.getvalue()
+                except Exception as e:
+                    logger.error(f"MPO格式转换失败: {e}")
+        return self._normalized
+    
+    def rendition(self, max_long_side: int, quality: int) -> Optional[bytes]:
+        """
+        低分辨率JPEG副本（长边缩放到max_long_side，复用降分辨率解码结果）
+        
+        Returns:
+            JPEG数据；原图长边不超过max_long_side或无法解析时返回None（直接使用上传的图片）
+        """
+        if not self._parse() or max(self.width, self.height) <= max_long_side:
+            return None
+        img, _ = self.decode(min_long_side=max_long_side)
+        if max(img.size) > max_long_side:
+            ratio = max_long_side / max(img.size)
+            new_size = (max(1, round(img.width * ratio)), max(1, round(img.height * ratio)))
+            img = img.resize(new_size, Image.LANCZOS)
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        output = io.BytesIO()
+        img.save(output, format='JPEG', quality=quality)
+        return output.getvalue()
+    
+    def decode(self, min_long_side: int = 0, min_short_side: int = 0) -> Tuple[Image.Image, Tuple[float, float]]:
+        """
+        解码图片（结果缓存，参数含义同ImageUtils.decode_reduced）
+        
+        首次解码时才用Pillow打开图片；已缓存的解码结果尺寸不满足
+        新的下限时才从原始数据重新解码。不指定下限表示完整解码，
+        不会复用降分辨率的解码结果
+        
+        Returns:
+            (解码后的图片, (原图宽/解码宽, 原图高/解码高))
+        """
+        if self._decoded is not None:
+            img, scale = self._decoded
+            # 完整解码或尺寸满足下限时直接复用
+            full = not min_long_side and not min_short_side
+            if scale == (1.0, 1.0) or (
+                not full and max(img.size) >= min_long_side and min(img.size) >= min_short_side
+            ):
+                return self._decoded
+            self._image = Image.open(io.BytesIO(self.raw))
+        else:
+            self._open()
+        
+        img, self._image = self._image, None
+        self._decoded = ImageUtils.load_reduced(img, min_long_side, min_short_side)
+        return self._decoded
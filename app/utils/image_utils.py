@@ -5,6 +5,7 @@
 
 from PIL import Image
 import io
+import math
 from typing import Tuple, Optional
 from app.config import settings
 
@@ -23,29 +24,9 @@ class ImageUtils:
         Returns:
             (是否有效, 错误信息)
         """
-        # 检查大小
-        if len(image_bytes) > settings.max_image_size_bytes:
-            max_mb = settings.MAX_IMAGE_SIZE_MB
-            actual_mb = len(image_bytes) / 1024 / 1024
-            return False, f"图片过大：{actual_mb:.2f}MB，最大允许{max_mb}MB"
-        
-        # 检查格式
-        try:
-            img = Image.open(io.BytesIO(image_bytes))
-            format_lower = img.format.lower() if img.format else ""
-            
-            # MPO格式特殊处理：允许MPO格式，但需要转换为JPEG
-            if format_lower == "mpo":
-                return True, ""
-            
-            if format_lower not in settings.allowed_formats_list:
-                allowed = ", ".join(settings.allowed_formats_list)
-                return False, f"不支持的图片格式：{img.format}，支持的格式：{allowed}"
-            
-            return True, ""
-            
-        except Exception as e:
-            return False, f"无效的图片文件：{str(e)}"
+        # 延迟导入（image_probe依赖本模块）
+        from app.utils.image_probe import ImageProbe
+        return ImageProbe(image_bytes).validate()
     
     @staticmethod
     def convert_mpo_to_jpeg(image_bytes: bytes) -> Optional[bytes]:
@@ -123,17 +104,69 @@ class ImageUtils:
         Returns:
             图片信息字典
         """
-        try:
-            img = Image.open(io.BytesIO(image_bytes))
-            return {
-                "format": img.format.lower() if img.format else "unknown",
-                "size": len(image_bytes),
-                "width": img.width,
-                "height": img.height,
-                "mode": img.mode
-            }
-        except Exception:
-            return {}
+        from app.utils.image_probe import ImageProbe
+        return ImageProbe(image_bytes).info
+    
+    @staticmethod
+    def decode_reduced(
+        image_bytes: bytes,
+        min_long_side: int = 0,
+        min_short_side: int = 0
+    ) -> Tuple[Image.Image, Tuple[float, float]]:
+        """
+        按目标尺寸降分辨率解码图片
+        
+        JPEG/MPO使用draft()让解码器在DCT域直接输出1/2、1/4、1/8尺寸，
+        不再完整解码原图；其他格式解码后用reduce()做整数倍缩小。
+        解码结果保证长边不小于min_long_side、短边不小于min_short_side，
+        后续仍需按模型要求做精确缩放
+        
+        Args:
+            image_bytes: 图片二进制数据
+            min_long_side: 解码结果长边下限（0表示不限制）
+            min_short_side: 解码结果短边下限（0表示不限制）
+        
+        Returns:
+            (解码后的图片, (原图宽/解码宽, 原图高/解码高))
+        """
+        return ImageUtils.load_reduced(Image.open(io.BytesIO(image_bytes)), min_long_side, min_short_side)
+    
+    @staticmethod
+    def load_reduced(
+        img: Image.Image,
+        min_long_side: int = 0,
+        min_short_side: int = 0
+    ) -> Tuple[Image.Image, Tuple[float, float]]:
+        """
+        对已打开（尚未解码）的图片按目标尺寸降分辨率解码，参数和返回值同decode_reduced
+        """
+        width, height = img.size
+        
+        # 满足长边、短边下限所需的最小缩放比例
+        ratio = 0.0
+        if min_long_side:
+            ratio = max(ratio, min_long_side / max(width, height))
+        if min_short_side:
+            ratio = max(ratio, min_short_side / min(width, height))
+        
+        if not settings.IMAGE_DRAFT_DECODE or ratio == 0.0 or ratio >= 0.5:
+            img.load()
+            return img, (1.0, 1.0)
+        
+        requested = (math.ceil(width * ratio), math.ceil(height * ratio))
+        if img.format in ("JPEG", "MPO"):
+            # draft返回的尺寸不小于requested
+            img.draft('RGB', requested)
+            img.load()
+        else:
+            img.load()
+            factor = min(width // requested[0], height // requested[1])
+            if factor >= 2:
+                if img.mode not in ("L", "RGB", "RGBA"):
+                    img = img.convert('RGBA' if 'transparency' in img.info or img.mode in ("LA", "PA") else 'RGB')
+                img = img.reduce(factor)
+        
+        return img, (width / img.width, height / img.height)
     
     @staticmethod
     def compress_image(image_bytes: bytes, max_size_kb: int = 500) -> bytes:
@@ -153,7 +186,8 @@ class ImageUtils:
             return image_bytes  # 已经够小，不需要压缩
         
         try:
-            img = Image.open(io.BytesIO(image_bytes))
+            # 降分辨率解码到长边不小于1024，再精确缩放
+            img, _ = ImageUtils.decode_reduced(image_bytes, min_long_side=1024)
             
             # 调整尺寸（如果需要）
             if max(img.size) > 1024:
@@ -0,0 +1,74 @@
+"""
+本地模型文件工具
+管理ONNX模型文件名及其量化变体（FP32/INT8动态量化/INT8静态量化）
+"""
+
+import os
+from typing import Dict
+
+
+class ModelUtils:
+    """模型文件工具类"""
+    
+    # 模型名称 -> FP32原始模型文件名
+    MODEL_FILES = {
+        "idCard": "id_card_detection.onnx",
+        "yolo8s": "yolov8s.onnx",
+        "mobilenetv3": "mobilenetv3_rw_Opset17.onnx"
+    }
+    
+    # 支持的精度变体
+    VARIANT_FP32 = "fp32"
+    VARIANT_INT8_DYNAMIC = "int8_dynamic"
+    VARIANT_INT8_STATIC = "int8_static"
+    VARIANTS = [VARIANT_FP32, VARIANT_INT8_DYNAMIC, VARIANT_INT8_STATIC]
+    
+    # 内置模型目录（app/models/）及其版本名称，未使用模型版本目录时加载该目录下的模型
+    BUILTIN_MODEL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "models")
+    BUILTIN_VERSION = "builtin"
+    
+    @staticmethod
+    def variant_filename(model_name: str, variant: str = VARIANT_FP32) -> str:
+        """
+        获取模型指定变体的文件名
+        
+        Args:
+            model_name: 模型名称 ('idCard' / 'yolo8s' / 'mobilenetv3')
+            variant: 精度变体
+        
+        Returns:
+            文件名，如：yolov8s.onnx、yolov8s.int8_dynamic.onnx
+        """
+        if model_name not in ModelUtils.MODEL_FILES:
+            raise ValueError(f"未知模型: {model_name}")
+        if variant not in ModelUtils.VARIANTS:
+            raise ValueError(f"不支持的模型精度: {variant}，支持: {', '.join(ModelUtils.VARIANTS)}")
+        
+        filename = ModelUtils.MODEL_FILES[model_name]
+        if variant == ModelUtils.VARIANT_FP32:
+            return filename
+        
+        stem, ext = os.path.splitext(filename)
+        return f"{stem}.{variant}{ext}"
+    
+    @staticmethod
+    def variant_path(model_dir: str, model_name: str, variant: str = VARIANT_FP32) -> str:
+        """获取模型指定变体的完整路径"""
+        return os.path.join(model_dir, ModelUtils.variant_filename(model_name, variant))
+    
+    @staticmethod
+    def resolve_model_paths(model_dir: str, variants: Dict[str, str]) -> Dict[str, str]:
+        """
+        按变体配置解析所有模型路径
+        
+        Args:
+            model_dir: 模型目录
+            variants: 模型名称 -> 精度变体（未配置的模型使用FP32）
+        
+        Returns:
+            模型名称 -> 模型文件路径
+        """
+        return {
+            name: ModelUtils.variant_path(model_dir, name, variants.get(name, ModelUtils.VARIANT_FP32))
+            for name in ModelUtils.MODEL_FILES
+        }
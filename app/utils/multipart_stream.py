@@ -0,0 +1,134 @@
+"""
+流式multipart解析工具
+边接收请求体边解析，每个部分接收完立即产出（不等待整个请求体），
+文件部分边接收边计算SHA-256，超过大小上限后丢弃数据只计数
+"""
+
+import hashlib
+from collections import deque
+from typing import AsyncIterator, Dict, Optional
+
+from multipart.exceptions import MultipartParseError
+from multipart.multipart import MultipartParser, parse_options_header
+
+
+class MultipartPart:
+    """multipart中的一个部分（表单字段或文件）"""
+    
+    def __init__(self, name: str, filename: Optional[str]):
+        self.name = name
+        self.filename = filename
+        self.size = 0
+        self.too_large = False
+        self._chunks = []
+        self._sha256 = hashlib.sha256()
+    
+    @property
+    def is_file(self) -> bool:
+        return self.filename is not None
+    
+    @property
+    def data(self) -> bytes:
+        return b"".join(self._chunks)
+    
+    @property
+    def text(self) -> str:
+        return self.data.decode("utf-8", "replace")
+    
+    @property
+    def sha256(self) -> str:
+        return self._sha256.hexdigest()
+
+
+class MultipartStream:
+    """流式multipart/form-data解析器"""
+    
+    def __init__(self, content_type: str, max_file_size: int):
+        """
+        Args:
+            content_type: 请求的Content-Type（包含boundary）
+            max_file_size: 单个部分大小上限（字节），超过后标记too_large并丢弃数据
+        
+        Raises:
+            ValueError: 不是multipart/form-data请求或缺少boundary
+        """
+        media_type, options = parse_options_header(content_type)
+        if media_type != b"multipart/form-data" or b"boundary" not in options:
+            raise ValueError("请求必须为multipart/form-data格式")
+        self.boundary = options[b"boundary"]
+        self.max_file_size = max_file_size
+    
+    async def parts(self, stream: AsyncIterator[bytes]) -> AsyncIterator[MultipartPart]:
+        """
+        逐个产出接收完成的部分
+        
+        Args:
+            stream: 请求体字节流（request.stream()）
+        
+        Raises:
+            ValueError: 请求体格式错误
+        """
+        ready = deque()
+        headers: Dict[bytes, bytes] = {}
+        state = {"field": b"", "value": b"", "part": None}
+        
+        def on_part_begin():
+            headers.clear()
+        
+        def on_header_field(data, start, end):
+            state["field"] += data[start:end]
+        
+        def on_header_value(data, start, end):
+            state["value"] += data[start:end]
+        
+        def on_header_end():
+            headers[state["field"].lower()] = state["value"]
+            state["field"] = b""
+            state["value"] = b""
+        
+        def on_headers_finished():
+            _, options = parse_options_header(headers.get(b"content-disposition", b""))
+            name = options.get(b"name", b"").decode("utf-8", "replace")
+            filename = options.get(b"filename")
+            state["part"] = MultipartPart(name, filename.decode("utf-8", "replace") if filename is not None else None)
+        
+        def on_part_data(data, start, end):
+            part = state["part"]
+            part.size += end - start
+            if part.too_large:
+                return
+            if part.size > self.max_file_size:
+                # 超过上限：丢弃已接收的数据，继续计数直到该部分结束
+                part.too_large = True
+                part._chunks.clear()
+                return
+            chunk = data[start:end]
+            part._chunks.append(chunk)
+            if part.is_file:
+                part._sha256.update(chunk)
+        
+        def on_part_end():
+            ready.append(state["part"])
+            state["part"] = None
+        
+        parser = MultipartParser(self.boundary, {
+            "on_part_begin": on_part_begin,
+            "on_part_data": on_part_data,
+            "on_part_end": on_part_end,
+            "on_header_field": on_header_field,
+            "on_header_value": on_header_value,
+            "on_header_end": on_header_end,
+            "on_headers_finished": on_headers_finished,
+        })
+        
+        async for chunk in stream:
+            if chunk:
+                try:
+                    parser.write(chunk)
+                except MultipartParseError as e:
+                    raise ValueError(f"请求体格式错误: {e}")
+            while ready:
+                yield ready.popleft()
+        parser.finalize()
+        while ready:
+            yield ready.popleft()
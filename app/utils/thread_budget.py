@@ -0,0 +1,141 @@
+"""
+本地推理线程预算
+按CPU核数和推理进程数（gunicorn worker数）分配每个进程的ORT线程数，
+避免多个worker各自按核数创建线程导致计算线程数远超核数
+"""
+
+import os
+from typing import Dict, List, Optional
+
+from app.config import settings
+
+# gunicorn_config.py 导出的worker数量和每个worker的槽位（用于绑核）
+WORKERS_ENV = "LOCAL_INFERENCE_WORKERS"
+WORKER_SLOT_ENV = "LOCAL_INFERENCE_WORKER_SLOT"
+
+
+class ThreadBudget:
+    """线程预算工具类"""
+    
+    @staticmethod
+    def available_cores() -> List[int]:
+        """当前进程可用的CPU核编号（容器/taskset限制后的实际可用核）"""
+        if hasattr(os, "sched_getaffinity"):
+            return sorted(os.sched_getaffinity(0))
+        return list(range(os.cpu_count() or 1))
+    
+    @staticmethod
+    def inference_processes() -> int:
+        """
+        执行本地推理的进程数
+        
+        开启独立模型服务时只有模型服务进程执行推理；
+        否则为worker数（配置值 > gunicorn导出的环境变量 > 1）
+        """
+        if settings.LOCAL_MODEL_SERVER_ENABLED:
+            return 1
+        if settings.LOCAL_INFERENCE_WORKERS > 0:
+            return settings.LOCAL_INFERENCE_WORKERS
+        try:
+            return max(1, int(os.getenv(WORKERS_ENV, "1")))
+        except ValueError:
+            return 1
+    
+    @staticmethod
+    def worker_slot() -> Optional[int]:
+        """当前worker的槽位（由gunicorn_config.py在fork时分配）"""
+        value = os.getenv(WORKER_SLOT_ENV)
+        return int(value) if value and value.isdigit() else None
+    
+    @staticmethod
+    def affinity_cores(slot: int, processes: int, cores: List[int]) -> List[int]:
+        """
+        计算指定槽位绑定的CPU核（按进程数均分可用核，进程数多于核数时多个进程共享一个核）
+        """
+        if processes >= len(cores):
+            return [cores[slot % len(cores)]]
+        per_process = len(cores) // processes
+        start = (slot % processes) * per_process
+        # 最后一个进程分到剩余的核
+        end = len(cores) if slot % processes == processes - 1 else start + per_process
+        return cores[start:end]
+    
+    @staticmethod
+    def plan(concurrent_sessions: int = 1) -> Dict:
+        """
+        计算当前进程的线程分配
+        
+        Args:
+            concurrent_sessions: 进程内同时执行的ORT会话数（并行模式为3）
+        
+        Returns:
+            线程分配（intra_op_threads为0表示使用ORT默认值）
+        """
+        cores = ThreadBudget.available_cores()
+        processes = ThreadBudget.inference_processes()
+        slot = ThreadBudget.worker_slot()
+        pinned = settings.LOCAL_INFERENCE_CPU_AFFINITY and slot is not None and not settings.LOCAL_MODEL_SERVER_ENABLED
+        
+        if pinned:
+            # 已绑核：可用核即为本进程独占的核，线程数与之相同
+            budget = os.cpu_count() or len(cores)
+            per_process = len(cores)
+        else:
+            budget = settings.LOCAL_INFERENCE_THREAD_BUDGET or len(cores)
+            per_process = max(1, budget // processes)
+        
+        result = {
+            "enabled": settings.LOCAL_INFERENCE_THREAD_BUDGET_ENABLED,
+            "cores": os.cpu_count() if pinned else len(cores),
+            "processes": processes,
+            "budget": budget,
+            "threads_per_process": per_process,
+            "concurrent_sessions": concurrent_sessions,
+            "intra_op_threads": 0,
+            "inter_op_threads": 0,
+            "worker_slot": slot,
+            "affinity": cores if pinned else None
+        }
+        
+        if settings.LOCAL_INFERENCE_INTRA_OP_THREADS > 0:
+            # 显式配置优先
+            result["intra_op_threads"] = settings.LOCAL_INFERENCE_INTRA_OP_THREADS
+            result["inter_op_threads"] = 1
+        elif settings.LOCAL_INFERENCE_THREAD_BUDGET_ENABLED:
+            result["intra_op_threads"] = max(1, per_process // concurrent_sessions)
+            result["inter_op_threads"] = 1
+        elif concurrent_sessions > 1:
+            # 未启用线程预算时保持原有行为：并行模式按核数均分
+            result["intra_op_threads"] = max(1, len(cores) // concurrent_sessions)
+            result["inter_op_threads"] = 1
+        return result
+    
+    @staticmethod
+    def pin_worker(slot: int) -> Optional[List[int]]:
+        """
+        将当前进程绑定到槽位对应的CPU核（gunicorn post_fork中调用）
+        
+        Returns:
+            绑定的CPU核，未绑定时返回None
+        """
+        os.environ[WORKER_SLOT_ENV] = str(slot)
+        if not settings.LOCAL_INFERENCE_CPU_AFFINITY or settings.LOCAL_MODEL_SERVER_ENABLED:
+            return None
+        if not hasattr(os, "sched_setaffinity"):
+            return None
+        cores = ThreadBudget.affinity_cores(slot, ThreadBudget.inference_processes(), ThreadBudget.available_cores())
+        os.sched_setaffinity(0, cores)
+        return cores
+    
+    @staticmethod
+    def describe(plan: Dict) -> str:
+        """线程分配的单行描述（用于启动日志）"""
+        if not plan["intra_op_threads"]:
+            threads = "ORT默认"
+        else:
+            threads = f"intra-op {plan['intra_op_threads']} x {plan['concurrent_sessions']}会话, inter-op {plan['inter_op_threads']}"
+        affinity = f", 绑核 {plan['affinity']}" if plan["affinity"] else ""
+        return (
+            f"CPU核 {plan['cores']}, 推理进程 {plan['processes']}, "
+            f"线程预算 {plan['budget']}（每进程 {plan['threads_per_process']}）, {threads}{affinity}"
+        )
@@ -0,0 +1,106 @@
+"""
+上传读取工具
+分块读取上传的图片，边读边计算SHA-256，超过大小上限立即中止
+"""
+
+import hashlib
+from typing import Tuple
+from fastapi import UploadFile
+from app.config import settings
+
+# 单图上传接口（请求体超过大小上限时在中间件中直接拒绝，不再接收整个请求体）
+SINGLE_IMAGE_UPLOAD_PATHS = {
+    "/api/v1/classify",
+    "/api/v1/local-classify",
+    "/api/v1/local-classify/detailed",
+}
+
+
+class UploadUtils:
+    """上传读取工具类"""
+    
+    # 每次读取的块大小
+    CHUNK_SIZE = 64 * 1024
+    
+    # multipart请求体中除图片外的开销（边界、表单字段）
+    MULTIPART_OVERHEAD = 64 * 1024
+    
+    @staticmethod
+    def size_error(size: int) -> str:
+        """图片过大的错误信息（与ImageProbe.validate一致）"""
+        return f"图片过大：{size / 1024 / 1024:.2f}MB，最大允许{settings.MAX_IMAGE_SIZE_MB}MB"
+    
+    @staticmethod
+    def request_too_large(path: str, content_length: str) -> bool:
+        """
+        单图上传请求的Content-Length是否已超过大小上限
+        
+        Args:
+            path: 请求路径
+            content_length: Content-Length请求头（可能为空）
+        """
+        if path not in SINGLE_IMAGE_UPLOAD_PATHS or not content_length or not content_length.isdigit():
+            return False
+        return int(content_length) > settings.max_image_size_bytes + UploadUtils.MULTIPART_OVERHEAD
+    
+    @staticmethod
+    def upload_profile() -> dict:
+        """
+        当前推理方式下建议客户端上传的图片规格
+        
+        客户端先用原图计算SHA-256（缓存键），再按规格缩放后上传：
+        长边缩放到max_long_side，但短边不小于min_short_side，原图更小时不放大
+        """
+        if settings.USE_LOCAL_INFERENCE:
+            # 本地推理只需要满足模型输入尺寸
+            return {
+                "inference_mode": "local",
+                "max_long_side": settings.UPLOAD_PROFILE_LOCAL_LONG_SIDE,
+                "min_short_side": settings.UPLOAD_PROFILE_LOCAL_SHORT_SIDE,
+                "format": "jpeg",
+                "quality": settings.UPLOAD_PROFILE_LOCAL_QUALITY,
+                "max_size_mb": settings.MAX_IMAGE_SIZE_MB
+            }
+        return {
+            "inference_mode": "llm",
+            "max_long_side": settings.UPLOAD_PROFILE_LLM_LONG_SIDE,
+            "min_short_side": 0,
+            "format": "jpeg",
+            "quality": settings.UPLOAD_PROFILE_LLM_QUALITY,
+            "max_size_mb": settings.MAX_IMAGE_SIZE_MB
+        }
+    
+    @staticmethod
+    async def read_image(upload: UploadFile) -> Tuple[bytes, str]:
+        """
+        分块读取上传的图片并计算SHA-256
+        
+        Args:
+            upload: 上传的文件
+        
+        Returns:
+            (图片数据, SHA-256哈希)
+        
+        Raises:
+            ValueError: 图片超过MAX_IMAGE_SIZE_MB
+        """
+        max_bytes = settings.max_image_size_bytes
+        
+        # 已知文件大小时直接判断，不读取内容
+        if upload.size is not None and upload.size > max_bytes:
+            raise ValueError(UploadUtils.size_error(upload.size))
+        
+        sha256 = hashlib.sha256()
+        chunks = []
+        total = 0
+        while True:
+            chunk = await upload.read(UploadUtils.CHUNK_SIZE)
+            if not chunk:
+                break
+            total += len(chunk)
+            if total > max_bytes:
+                raise ValueError(UploadUtils.size_error(total))
+            sha256.update(chunk)
+            chunks.append(chunk)
+        
+        return b"".join(chunks), sha256.hexdigest()
@@ -5,6 +5,10 @@ Gunicorn配置文件
 
 import multiprocessing
 import os
+import subprocess
+import sys
+import threading
+import time
 
 # 服务器配置
 bind = "0.0.0.0:8000"
@@ -44,6 +48,127 @@ raw_env = [
     "ENV=production",
 ]
 
+# 独立模型服务（所有worker共享一份本地模型，通过Unix Socket调用）
+try:
+    from app.config import settings as app_settings
+    model_server_enabled = app_settings.LOCAL_MODEL_SERVER_ENABLED
+    model_server_socket = app_settings.LOCAL_MODEL_SERVER_SOCKET
+    offline_batch_enabled = app_settings.OFFLINE_BATCH_ENABLED
+except Exception:
+    model_server_enabled = os.getenv("LOCAL_MODEL_SERVER_ENABLED", "false").lower() == "true"
+    model_server_socket = os.getenv("LOCAL_MODEL_SERVER_SOCKET", "/tmp/image-classifier-models.sock")
+    offline_batch_enabled = os.getenv("OFFLINE_BATCH_ENABLED", "false").lower() == "true"
+
+model_server_process = None
+offline_batch_process = None
+# 主进程退出时置位，停止监控模型服务
+model_server_stopping = threading.Event()
+# 模型服务异常退出后的重启间隔（秒，连续快速退出时翻倍，最多MODEL_SERVER_RESTART_MAX_DELAY）
+MODEL_SERVER_RESTART_DELAY = 2
+MODEL_SERVER_RESTART_MAX_DELAY = 60
+
+# 本地推理线程预算：导出worker数，供各worker按 CPU核数/worker数 分配ORT线程
+os.environ["LOCAL_INFERENCE_WORKERS"] = str(workers)
+try:
+    from app.utils.thread_budget import ThreadBudget
+    thread_plan = ThreadBudget.plan()
+except Exception:
+    ThreadBudget = None
+    thread_plan = None
+
+
+def on_starting(server):
+    """主进程启动时拉起离线批量处理进程和模型服务，等待模型服务socket就绪后再启动worker"""
+    global model_server_process, offline_batch_process
+    if offline_batch_enabled:
+        offline_batch_process = subprocess.Popen([sys.executable, "-m", "app.services.offline_batch_worker"])
+        server.log.info(f"离线批量处理进程已启动 (pid={offline_batch_process.pid})")
+    
+    if not model_server_enabled:
+        return
+    
+    start_model_server(server)
+    
+    deadline = time.time() + 300
+    while time.time() < deadline:
+        if os.path.exists(model_server_socket):
+            server.log.info(f"本地模型服务就绪: {model_server_socket}")
+            break
+        if model_server_process.poll() is not None:
+            server.log.error(f"本地模型服务启动失败 (exit={model_server_process.returncode})")
+            break
+        time.sleep(0.5)
+    else:
+        server.log.error("等待本地模型服务就绪超时")
+    
+    threading.Thread(target=supervise_model_server, args=(server,), name="model-server-supervisor", daemon=True).start()
+
+
+def start_model_server(server):
+    """拉起模型服务进程（先删除遗留的socket文件：socket文件存在即表示模型服务就绪）"""
+    global model_server_process
+    if os.path.exists(model_server_socket):
+        os.remove(model_server_socket)
+    model_server_process = subprocess.Popen([sys.executable, "-m", "app.services.model_server"])
+    server.log.info(f"本地模型服务已启动 (pid={model_server_process.pid})，等待模型加载...")
+
+
+def supervise_model_server(server):
+    """监控模型服务进程，异常退出时重启（重启并加载完成前，worker的本地推理请求会失败）"""
+    delay = MODEL_SERVER_RESTART_DELAY
+    started_at = time.time()
+    while not model_server_stopping.wait(MODEL_SERVER_RESTART_DELAY):
+        if model_server_process.poll() is None:
+            continue
+        # 启动后很快又退出（如模型文件损坏）时重启间隔翻倍，正常运行一段时间后才退出时恢复初始间隔
+        if time.time() - started_at < MODEL_SERVER_RESTART_MAX_DELAY:
+            delay = min(delay * 2, MODEL_SERVER_RESTART_MAX_DELAY)
+        else:
+            delay = MODEL_SERVER_RESTART_DELAY
+        server.log.error(f"本地模型服务异常退出 (exit={model_server_process.returncode})，{delay}秒后重启")
+        if model_server_stopping.wait(delay):
+            return
+        start_model_server(server)
+        started_at = time.time()
+
+
+def pre_fork(server, worker):
+    """为新worker分配槽位（取最小的空闲槽位，worker重启后复用原槽位）"""
+    used = {getattr(w, "slot", None) for w in server.WORKERS.values()}
+    worker.slot = next(slot for slot in range(len(used) + 1) if slot not in used)
+
+
+def post_fork(server, worker):
+    """worker启动后记录槽位，开启绑核时绑定到槽位对应的CPU核"""
+    if ThreadBudget is None:
+        return
+    try:
+        cores = ThreadBudget.pin_worker(worker.slot)
+        if cores is not None:
+            server.log.info(f"worker {worker.pid} (slot {worker.slot}) 绑定CPU核: {cores}")
+    except Exception as e:
+        server.log.warning(f"worker绑核失败: {e}")
+
+
+def on_exit(server):
+    """主进程退出时停止模型服务和离线批量处理进程"""
+    if offline_batch_process and offline_batch_process.poll() is None:
+        offline_batch_process.terminate()
+        try:
+            offline_batch_process.wait(timeout=graceful_timeout)
+        except subprocess.TimeoutExpired:
+            offline_batch_process.kill()
+        server.log.info("离线批量处理进程已停止")
+    
+    model_server_stopping.set()
+    if model_server_process and model_server_process.poll() is None:
+        model_server_process.terminate()
+        try:
+            model_server_process.wait(timeout=graceful_timeout)
+        except subprocess.TimeoutExpired:
+            model_server_process.kill()
+        server.log.info("本地模型服务已停止")
+
 print(f"""
 ========================================
 Gunicorn配置
@@ -53,6 +178,9 @@ Workers: {workers}
 Worker Class: {worker_class}
 Timeout: {timeout}s
 Log Level: {loglevel}
+Model Server: {model_server_socket if model_server_enabled else "disabled"}
+Offline Batch: {"enabled" if offline_batch_enabled else "disabled"}
+Inference Threads: {ThreadBudget.describe(thread_plan) if thread_plan else "unknown"}
 ========================================
 """)
 
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+本地ONNX模型INT8量化工具
+
+从 app/models/ 下的FP32原始模型生成INT8量化变体：
+- int8_dynamic: 动态量化（仅量化权重，无需校准数据）
+- int8_static:  静态量化（权重+激活，使用校准图片目录统计激活范围）
+
+生成的文件与原模型放在同一目录，命名为 <原文件名>.<变体>.onnx，
+例如 yolov8s.int8_dynamic.onnx，通过 LOCAL_MODEL_VARIANTS 配置按模型启用。
+
+用法（在项目根目录执行）：
+    python tools/工具/quantize_models.py --mode dynamic
+    python tools/工具/quantize_models.py --mode static --calib-dir /data/calib_images
+    python tools/工具/quantize_models.py --mode both --models yolo8s,mobilenetv3 --calib-dir /data/calib_images
+"""
+
+import argparse
+import os
+import sys
+from typing import List, Optional
+
+import numpy as np
+import onnx
+from PIL import Image
+from onnxruntime import InferenceSession
+from onnxruntime.quantization import (
+    CalibrationDataReader,
+    QuantFormat,
+    QuantType,
+    quantize_dynamic,
+    quantize_static,
+)
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from app.utils.model_utils import ModelUtils
+
+DEFAULT_MODEL_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "app", "models"))
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".bmp")
+
+
+def list_calibration_images(calib_dir: str, limit: int) -> List[str]:
+    """列出校准目录中的图片（按文件名排序，最多limit张）"""
+    files = [
+        os.path.join(calib_dir, name)
+        for name in sorted(os.listdir(calib_dir))
+        if name.lower().endswith(IMAGE_EXTENSIONS)
+    ]
+    return files[:limit]
+
+
+def get_input_size(model_path: str, default: int) -> int:
+    """从模型输入形状读取输入边长（动态维度时使用默认值）"""
+    session = InferenceSession(model_path, providers=['CPUExecutionProvider'])
+    shape = session.get_inputs()[0].shape
+    return shape[-1] if isinstance(shape[-1], int) else default
+
+
+def preprocess_yolo(image: Image.Image, size: int) -> np.ndarray:
+    """YOLO预处理：等比缩放 + 灰边填充（letterbox）到 size x size，归一化到[0,1]"""
+    image = image.convert('RGB')
+    ratio = size / max(image.size)
+    new_size = (max(1, round(image.width * ratio)), max(1, round(image.height * ratio)))
+    resized = image.resize(new_size, Image.BILINEAR)
+    canvas = Image.new('RGB', (size, size), (114, 114, 114))
+    canvas.paste(resized, ((size - new_size[0]) // 2, (size - new_size[1]) // 2))
+    array = np.asarray(canvas, dtype=np.float32) / 255.0
+    return array.transpose(2, 0, 1)[np.newaxis, ...]
+
+
+def preprocess_mobilenet(image: Image.Image) -> np.ndarray:
+    """MobileNetV3预处理：短边缩放到256，中心裁剪224，归一化到[0,1]（与推理服务一致）"""
+    image = image.convert('RGB')
+    ratio = 256 / min(image.size)
+    image = image.resize((max(256, round(image.width * ratio)), max(256, round(image.height * ratio))), Image.BILINEAR)
+    left = (image.width - 224) // 2
+    top = (image.height - 224) // 2
+    image = image.crop((left, top, left + 224, top + 224))
+    array = np.asarray(image, dtype=np.float32) / 255.0
+    return array.transpose(2, 0, 1)[np.newaxis, ...]
+
+
+class ImageFolderDataReader(CalibrationDataReader):
+    """从图片目录读取校准数据"""
+    
+    def __init__(self, model_name: str, model_path: str, image_paths: List[str]):
+        session = InferenceSession(model_path, providers=['CPUExecutionProvider'])
+        self.input_name = session.get_inputs()[0].name
+        self.model_name = model_name
+        self.input_size = get_input_size(model_path, 640)
+        self.image_paths = image_paths
+        self._iterator = iter(self.image_paths)
+    
+    def get_next(self) -> Optional[dict]:
+        for path in self._iterator:
+            try:
+                image = Image.open(path)
+            except Exception as e:
+                print(f"⚠️ 跳过无法读取的校准图片 {path}: {e}")
+                continue
+            if self.model_name == "mobilenetv3":
+                tensor = preprocess_mobilenet(image)
+            else:
+                tensor = preprocess_yolo(image, self.input_size)
+            return {self.input_name: tensor}
+        return None
+    
+    def rewind(self):
+        self._iterator = iter(self.image_paths)
+
+
+def copy_metadata(source_path: str, target_path: str):
+    """
+    复制模型元数据（metadata_props）
+    
+    Ultralytics依赖ONNX元数据中的names/stride/imgsz，量化后需保留
+    """
+    source = onnx.load(source_path, load_external_data=False)
+    target = onnx.load(target_path)
+    existing = {prop.key for prop in target.metadata_props}
+    for prop in source.metadata_props:
+        if prop.key not in existing:
+            target.metadata_props.add(key=prop.key, value=prop.value)
+    onnx.save(target, target_path)
+
+
+def quantize_model_dynamic(model_name: str, model_dir: str):
+    """生成动态量化模型"""
+    source = ModelUtils.variant_path(model_dir, model_name)
+    target = ModelUtils.variant_path(model_dir, model_name, ModelUtils.VARIANT_INT8_DYNAMIC)
+    print(f"🔧 {model_name}: 动态量化 -> {os.path.basename(target)}")
+    quantize_dynamic(source, target, weight_type=QuantType.QUInt8)
+    copy_metadata(source, target)
+    print(f"✅ 完成: {os.path.getsize(source) / 1024 / 1024:.1f}MB -> {os.path.getsize(target) / 1024 / 1024:.1f}MB")
+
+
+def quantize_model_static(model_name: str, model_dir: str, image_paths: List[str], per_channel: bool):
+    """生成静态量化模型（QDQ格式）"""
+    source = ModelUtils.variant_path(model_dir, model_name)
+    target = ModelUtils.variant_path(model_dir, model_name, ModelUtils.VARIANT_INT8_STATIC)
+    print(f"🔧 {model_name}: 静态量化（{len(image_paths)}张校准图片） -> {os.path.basename(target)}")
+    reader = ImageFolderDataReader(model_name, source, image_paths)
+    quantize_static(
+        source,
+        target,
+        reader,
+        quant_format=QuantFormat.QDQ,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        per_channel=per_channel
+    )
+    copy_metadata(source, target)
+    print(f"✅ 完成: {os.path.getsize(source) / 1024 / 1024:.1f}MB -> {os.path.getsize(target) / 1024 / 1024:.1f}MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地ONNX模型INT8量化工具")
+    parser.add_argument("--models", default=",".join(ModelUtils.MODEL_FILES),
+                        help="要量化的模型，逗号分隔（默认全部）")
+    parser.add_argument("--mode", choices=["dynamic", "static", "both"], default="dynamic", help="量化方式")
+    parser.add_argument("--model-dir", default=DEFAULT_MODEL_DIR, help="模型目录")
+    parser.add_argument("--calib-dir", help="校准图片目录（静态量化必填）")
+    parser.add_argument("--calib-count", type=int, default=200, help="最多使用的校准图片数")
+    parser.add_argument("--no-per-channel", action="store_true", help="静态量化不使用逐通道权重量化")
+    args = parser.parse_args()
+    
+    models = [name.strip() for name in args.models.split(",") if name.strip()]
+    unknown = [name for name in models if name not in ModelUtils.MODEL_FILES]
+    if unknown:
+        parser.error(f"未知模型: {', '.join(unknown)}")
+    
+    image_paths = []
+    if args.mode in ("static", "both"):
+        if not args.calib_dir or not os.path.isdir(args.calib_dir):
+            parser.error("静态量化需要通过 --calib-dir 指定校准图片目录")
+        image_paths = list_calibration_images(args.calib_dir, args.calib_count)
+        if not image_paths:
+            parser.error(f"校准目录中没有图片: {args.calib_dir}")
+    
+    for model_name in models:
+        source = ModelUtils.variant_path(args.model_dir, model_name)
+        if not os.path.exists(source):
+            print(f"❌ 模型文件不存在: {source}")
+            sys.exit(1)
+        
+        if args.mode in ("dynamic", "both"):
+            quantize_model_dynamic(model_name, args.model_dir)
+        if args.mode in ("static", "both"):
+            quantize_model_static(model_name, args.model_dir, image_paths, not args.no_per_channel)
+    
+    print("\n💡 使用 tools/测试/benchmark_quantized_models.py 对比量化前后的延迟和精度，")
+    print("   确认精度可接受后通过 LOCAL_MODEL_VARIANTS 配置启用，例如：")
+    print("   LOCAL_MODEL_VARIANTS=yolo8s=int8_dynamic;mobilenetv3=int8_static")
+
+
+if __name__ == "__main__":
+    main()
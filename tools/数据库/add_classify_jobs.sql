@@ -0,0 +1,77 @@
+-- ====================================
+-- 异步批量分类任务表
+-- 用途：大批量图片（数百张）分类任务的进度和每张图片的结果
+-- ====================================
+
+USE image_classifier;
+
+CREATE TABLE IF NOT EXISTS `classify_jobs` (
+  `id` BIGINT UNSIGNED NOT NULL AUTO_INCREMENT,
+  
+  -- 任务标识
+  `job_id` VARCHAR(64) NOT NULL COMMENT '任务唯一ID',
+  `user_id` VARCHAR(64) DEFAULT NULL COMMENT '用户ID',
+  `ip_address` VARCHAR(45) DEFAULT NULL COMMENT 'IP地址',
+  
+  -- 任务进度
+  `total_images` INT UNSIGNED NOT NULL DEFAULT 0 COMMENT '总图片数',
+  `pending_images` INT UNSIGNED NOT NULL DEFAULT 0 COMMENT '待上传数',
+  `completed_images` INT UNSIGNED NOT NULL DEFAULT 0 COMMENT '已完成数（成功+失败）',
+  `success_count` INT UNSIGNED NOT NULL DEFAULT 0 COMMENT '成功数',
+  `fail_count` INT UNSIGNED NOT NULL DEFAULT 0 COMMENT '失败数',
+  `cached_count` INT UNSIGNED NOT NULL DEFAULT 0 COMMENT '缓存命中数',
+  `llm_count` INT UNSIGNED NOT NULL DEFAULT 0 COMMENT '大模型处理数',
+  `local_count` INT UNSIGNED NOT NULL DEFAULT 0 COMMENT '本地模型处理数',
+  
+  -- 任务状态
+  `status` VARCHAR(20) DEFAULT 'pending' COMMENT '状态（pending待上传/processing处理中/completed已完成）',
+  
+  -- 时间戳
+  `created_at` TIMESTAMP DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
+  `updated_at` TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+  `finished_at` TIMESTAMP NULL DEFAULT NULL COMMENT '首次全部完成时间',
+  
+  PRIMARY KEY (`id`),
+  UNIQUE KEY `uk_job_id` (`job_id`),
+  KEY `idx_user_id` (`user_id`),
+  KEY `idx_status` (`status`),
+  KEY `idx_created_at` (`created_at`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+COMMENT='异步批量分类任务表';
+
+CREATE TABLE IF NOT EXISTS `classify_job_items` (
+  `id` BIGINT UNSIGNED NOT NULL AUTO_INCREMENT,
+  
+  -- 图片标识
+  `job_id` VARCHAR(64) NOT NULL COMMENT '任务ID',
+  `item_index` INT UNSIGNED NOT NULL COMMENT '图片在任务中的序号（从0开始）',
+  `image_hash` VARCHAR(64) NOT NULL COMMENT '图片SHA-256哈希值',
+  `filename` VARCHAR(255) DEFAULT NULL COMMENT '文件名',
+  
+  -- 处理状态
+  `status` VARCHAR(20) DEFAULT 'pending' COMMENT '状态（pending待上传/queued处理中/completed成功/failed失败）',
+  
+  -- 分类结果
+  `category` VARCHAR(50) DEFAULT NULL COMMENT '分类类别',
+  `confidence` DECIMAL(5,4) DEFAULT NULL COMMENT '置信度',
+  `description` TEXT DEFAULT NULL COMMENT '图片描述',
+  `local_inference_result` JSON DEFAULT NULL COMMENT '本地推理原始结果（使用本地推理时）',
+  `from_cache` TINYINT(1) NOT NULL DEFAULT 0 COMMENT '是否来自缓存',
+  `inference_method` VARCHAR(20) DEFAULT NULL COMMENT '推理方式（cache/llm/local等）',
+  `error` VARCHAR(500) DEFAULT NULL COMMENT '失败原因',
+  `processing_time_ms` INT UNSIGNED DEFAULT NULL COMMENT '处理耗时(毫秒)',
+  
+  -- 时间戳
+  `created_at` TIMESTAMP DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
+  `updated_at` TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+  
+  PRIMARY KEY (`id`),
+  UNIQUE KEY `uk_job_item` (`job_id`, `item_index`),
+  KEY `idx_job_hash` (`job_id`, `image_hash`),
+  KEY `idx_job_status` (`job_id`, `status`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+COMMENT='异步批量分类任务图片表';
+
+-- ====================================
+-- 初始化完成
+-- ====================================
@@ -0,0 +1,50 @@
+-- ====================================
+-- 大模型调用明细表
+-- 用途：每次调用大模型的上游耗时、等待时间、token用量和请求大小（一次请求可能有多次调用）
+-- 用于定位拖慢延迟、推高成本的提供商/模型和图片大小
+-- ====================================
+
+USE image_classifier;
+
+CREATE TABLE IF NOT EXISTS `llm_call_log` (
+  `id` BIGINT UNSIGNED NOT NULL AUTO_INCREMENT,
+  
+  -- 调用标识
+  `request_id` VARCHAR(64) NOT NULL COMMENT '请求ID（对应request_log）',
+  `attempt` TINYINT UNSIGNED NOT NULL DEFAULT 1 COMMENT '本次请求中的第几次调用',
+  `purpose` VARCHAR(20) DEFAULT NULL COMMENT '调用用途（primary直接请求/low_res低分辨率首轮/refine重新请求）',
+  `provider` VARCHAR(20) DEFAULT NULL COMMENT '大模型提供商',
+  `model` VARCHAR(100) DEFAULT NULL COMMENT '模型名称',
+  `prompt_profile` VARCHAR(20) DEFAULT NULL COMMENT '提示词模式（default/compact）',
+  
+  -- 请求大小
+  `image_bytes` INT UNSIGNED DEFAULT NULL COMMENT '发送的图片大小(字节)',
+  `request_bytes` INT UNSIGNED DEFAULT NULL COMMENT '请求体大小(字节，Base64图片+提示词)',
+  
+  -- 耗时
+  `queue_ms` INT UNSIGNED DEFAULT NULL COMMENT '调用前等待时间(毫秒，请求开始到发起调用)',
+  `latency_ms` INT UNSIGNED DEFAULT NULL COMMENT '上游耗时(毫秒)',
+  
+  -- token用量（提供商未返回时为NULL）
+  `input_tokens` INT UNSIGNED DEFAULT NULL COMMENT '输入token数',
+  `output_tokens` INT UNSIGNED DEFAULT NULL COMMENT '输出token数',
+  
+  -- 结果
+  `success` TINYINT(1) NOT NULL DEFAULT 1 COMMENT '是否调用成功',
+  `parse_failed` TINYINT(1) NOT NULL DEFAULT 0 COMMENT '响应是否无法直接解析为JSON',
+  `error` VARCHAR(500) DEFAULT NULL COMMENT '失败原因',
+  
+  -- 时间戳
+  `created_at` TIMESTAMP DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
+  `created_date` DATE GENERATED ALWAYS AS (DATE(`created_at`)) STORED COMMENT '日期',
+  
+  PRIMARY KEY (`id`),
+  KEY `idx_request_id` (`request_id`),
+  KEY `idx_created_date` (`created_date`),
+  KEY `idx_created_date_model` (`created_date`, `provider`, `model`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+COMMENT='大模型调用明细表';
+
+-- ====================================
+-- 初始化完成
+-- ====================================
@@ -0,0 +1,15 @@
+-- ====================================
+-- 大模型级联调用字段
+-- 用途：记录每次调用所在的级联层级和是否升级到下一级模型，统计各级延迟和升级比例（调整LLM_CASCADE_CONFIDENCE）
+-- 依赖：add_llm_call_log.sql
+-- ====================================
+
+USE image_classifier;
+
+-- 未配置级联模型时tier为1、escalated为0
+ALTER TABLE llm_call_log
+ADD COLUMN `tier` TINYINT UNSIGNED NOT NULL DEFAULT 1 COMMENT '级联层级（LLM_CASCADE_MODELS中的第几个模型）' AFTER `model`,
+ADD COLUMN `escalated` TINYINT(1) NOT NULL DEFAULT 0 COMMENT '是否升级到下一级模型' AFTER `tier`;
+
+-- 查看表结构
+DESC llm_call_log;
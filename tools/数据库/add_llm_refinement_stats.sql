@@ -0,0 +1,14 @@
+-- 添加渐进式分类字段到request_log表
+-- 用于统计低分辨率首轮结果是否足够、需要重新分类的比例（调整LLM_PROGRESSIVE_CONFIDENCE）
+
+-- 添加渐进式分类字段（未启用渐进式分类的请求为NULL）
+ALTER TABLE request_log 
+ADD COLUMN llm_refined TINYINT(1) DEFAULT NULL COMMENT '渐进式分类是否用上传的图片重新请求: 0否/1是',
+ADD COLUMN low_res_category VARCHAR(50) DEFAULT NULL COMMENT '低分辨率首轮分类类别',
+ADD COLUMN low_res_confidence DECIMAL(5,4) DEFAULT NULL COMMENT '低分辨率首轮置信度';
+
+-- 添加索引以提高查询性能
+CREATE INDEX idx_created_date_refined ON request_log(created_date, llm_refined);
+
+-- 查看表结构
+DESC request_log;
@@ -0,0 +1,64 @@
+-- ====================================
+-- 离线批量分类
+-- 用途：mode=offline的分类任务通过大模型批量接口处理（相册补分类等不急用的大批量图片）
+-- 依赖：add_classify_jobs.sql
+-- ====================================
+
+USE image_classifier;
+
+-- 任务处理方式
+ALTER TABLE classify_jobs
+ADD COLUMN `mode` VARCHAR(20) NOT NULL DEFAULT 'interactive' COMMENT '处理方式（interactive即时处理/offline批量接口离线处理）' AFTER `status`;
+
+CREATE TABLE IF NOT EXISTS `offline_batches` (
+  `id` BIGINT UNSIGNED NOT NULL AUTO_INCREMENT,
+  
+  -- 批量任务标识
+  `batch_id` VARCHAR(64) NOT NULL COMMENT '批量任务ID',
+  `provider` VARCHAR(20) NOT NULL COMMENT '批量接口提供商（openai/aliyun/stub）',
+  `model` VARCHAR(100) DEFAULT NULL COMMENT '模型名称',
+  `provider_batch_id` VARCHAR(128) NOT NULL COMMENT '提供商的批量任务ID',
+  
+  -- 结果统计
+  `image_count` INT UNSIGNED NOT NULL DEFAULT 0 COMMENT '图片数',
+  `success_count` INT UNSIGNED NOT NULL DEFAULT 0 COMMENT '成功数',
+  `fail_count` INT UNSIGNED NOT NULL DEFAULT 0 COMMENT '失败数',
+  
+  -- 状态
+  `status` VARCHAR(20) NOT NULL DEFAULT 'submitted' COMMENT '状态（submitted已提交/completed已完成/failed失败）',
+  `error` VARCHAR(500) DEFAULT NULL COMMENT '失败原因',
+  
+  -- 时间戳
+  `created_at` TIMESTAMP DEFAULT CURRENT_TIMESTAMP COMMENT '提交时间',
+  `finished_at` TIMESTAMP NULL DEFAULT NULL COMMENT '完成时间',
+  
+  PRIMARY KEY (`id`),
+  UNIQUE KEY `uk_batch_id` (`batch_id`),
+  KEY `idx_status` (`status`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+COMMENT='离线批量分类批量任务表';
+
+CREATE TABLE IF NOT EXISTS `offline_batch_images` (
+  `id` BIGINT UNSIGNED NOT NULL AUTO_INCREMENT,
+  
+  -- 图片（同一哈希只提交一次，写回结果后删除）
+  `image_hash` VARCHAR(64) NOT NULL COMMENT '图片SHA-256哈希值',
+  `image_size` INT UNSIGNED NOT NULL DEFAULT 0 COMMENT '暂存图片大小(字节)',
+  
+  -- 状态
+  `status` VARCHAR(20) NOT NULL DEFAULT 'waiting' COMMENT '状态（waiting待提交/submitted已提交）',
+  `batch_id` VARCHAR(64) DEFAULT NULL COMMENT '所属批量任务ID',
+  
+  -- 时间戳
+  `created_at` TIMESTAMP DEFAULT CURRENT_TIMESTAMP COMMENT '加入时间',
+  
+  PRIMARY KEY (`id`),
+  UNIQUE KEY `uk_image_hash` (`image_hash`),
+  KEY `idx_status_created` (`status`, `created_at`),
+  KEY `idx_batch_id` (`batch_id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+COMMENT='离线批量分类待处理图片表';
+
+-- ====================================
+-- 初始化完成
+-- ====================================
@@ -0,0 +1,18 @@
+-- ====================================
+-- 规则预分类命中数字段
+-- 用途：规则预分类命中不调用任何模型，单独计数，不再计入本地处理数（local_count）
+-- 依赖：create_unified_request_log.sql、add_classify_jobs.sql
+-- 说明：未执行时不记录规则命中数（统计中为0）；执行后需重启服务生效
+-- ====================================
+
+USE image_classifier;
+
+ALTER TABLE unified_request_log
+ADD COLUMN `rule_count` INT UNSIGNED DEFAULT 0 COMMENT '规则预分类命中数' AFTER `local_count`;
+
+ALTER TABLE classify_jobs
+ADD COLUMN `rule_count` INT UNSIGNED NOT NULL DEFAULT 0 COMMENT '规则预分类命中数' AFTER `local_count`;
+
+-- 查看表结构
+DESC unified_request_log;
+DESC classify_jobs;
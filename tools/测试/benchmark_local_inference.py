@@ -0,0 +1,461 @@
+#!/usr/bin/env python3
+"""
+本地模型推理基准测试
+
+对 LocalModelInference 做端到端性能测试，输出：
+- 冷启动耗时（模型加载 + 首次推理）
+- 各阶段（解码/各模型）及端到端延迟的 P50/P95/P99
+- 不同并发数下的吞吐量（张/秒）
+- 峰值内存（RSS）
+- 多进程吞吐量（--processes，模拟多个gunicorn worker同时推理，用于评估线程预算/绑核配置）
+
+图片来源：
+- --images 指定图片目录（真实样本）
+- --synthetic 生成多种尺寸、格式（JPEG/PNG/WebP/MPO）的合成图片
+
+结果可保存为JSON（--output），并可与之前的结果对比（--compare），
+用于评估并行模式、量化模型、降分辨率解码等配置的效果。
+
+用法（在项目根目录执行）：
+    python tools/测试/benchmark_local_inference.py --synthetic
+    python tools/测试/benchmark_local_inference.py --images /data/test_images --concurrency 1,2,4,8 --output base.json
+    LOCAL_INFERENCE_PARALLEL=true python tools/测试/benchmark_local_inference.py --images /data/test_images --compare base.json
+    
+    # 线程预算对比：先以ORT默认线程数运行，再启用线程预算对比多进程吞吐量
+    LOCAL_INFERENCE_THREAD_BUDGET_ENABLED=false python tools/测试/benchmark_local_inference.py --synthetic --processes 8 --output default.json
+    python tools/测试/benchmark_local_inference.py --synthetic --processes 8 --compare default.json
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import statistics
+import sys
+import time
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from app.config import settings
+from app.services.local_model_inference import LocalModelInference
+from app.utils.thread_budget import ThreadBudget, WORKERS_ENV
+from benchmark_quantized_models import IMAGE_EXTENSIONS, get_rss_mb, percentile
+from loguru import logger
+
+DEFAULT_SIZES = "640x480,1920x1080,4032x3024,8000x6000"
+DEFAULT_FORMATS = "jpeg,png,webp,mpo"
+DEFAULT_CONCURRENCY = "1,2,4"
+
+
+def get_peak_rss_mb() -> float:
+    """获取进程峰值常驻内存（MB）"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux下单位为KB，macOS下为字节
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def make_synthetic_image(width: int, height: int, seed: int) -> Image.Image:
+    """生成带渐变和噪声的合成图片（纯色图片压缩后过小，不能代表真实照片的解码开销）"""
+    rng = np.random.default_rng(seed)
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, np.newaxis]
+    base = np.stack([
+        np.broadcast_to(x, (height, width)),
+        np.broadcast_to(y, (height, width)),
+        (np.broadcast_to(x, (height, width)) + y) / 2
+    ], axis=-1)
+    noise = rng.normal(0, 24, size=(height, width, 3)).astype(np.float32)
+    return Image.fromarray(np.clip(base + noise, 0, 255).astype(np.uint8), 'RGB')
+
+
+def encode_image(image: Image.Image, fmt: str) -> bytes:
+    """按指定格式编码图片（MPO为两帧，模拟双摄手机照片）"""
+    output = io.BytesIO()
+    if fmt == "mpo":
+        image.save(output, format="MPO", quality=90, save_all=True, append_images=[image.transpose(Image.FLIP_LEFT_RIGHT)])
+    elif fmt == "jpeg":
+        image.save(output, format="JPEG", quality=90)
+    elif fmt == "webp":
+        image.save(output, format="WEBP", quality=90)
+    else:
+        image.save(output, format=fmt.upper())
+    return output.getvalue()
+
+
+def build_synthetic_corpus(sizes: List[Tuple[int, int]], formats: List[str]) -> List[Tuple[str, bytes]]:
+    """生成合成图片集"""
+    corpus = []
+    for i, (width, height) in enumerate(sizes):
+        image = make_synthetic_image(width, height, seed=i)
+        for fmt in formats:
+            corpus.append((f"synthetic_{width}x{height}.{fmt}", encode_image(image, fmt)))
+    return corpus
+
+
+def load_corpus(images_dir: str, limit: int) -> List[Tuple[str, bytes]]:
+    """读取图片目录"""
+    paths = sorted(
+        os.path.join(images_dir, name) for name in os.listdir(images_dir)
+        if name.lower().endswith(IMAGE_EXTENSIONS)
+    )[:limit]
+    corpus = []
+    for path in paths:
+        with open(path, "rb") as f:
+            corpus.append((os.path.basename(path), f.read()))
+    return corpus
+
+
+def parse_sizes(value: str) -> List[Tuple[int, int]]:
+    """解析尺寸列表，如 640x480,1920x1080"""
+    sizes = []
+    for item in value.split(","):
+        width, height = item.lower().strip().split("x")
+        sizes.append((int(width), int(height)))
+    return sizes
+
+
+def summarize(values: List[float]) -> Dict:
+    """延迟统计（毫秒）"""
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean_ms": round(statistics.mean(values), 2),
+        "p50_ms": round(percentile(values, 50), 2),
+        "p95_ms": round(percentile(values, 95), 2),
+        "p99_ms": round(percentile(values, 99), 2),
+        "max_ms": round(max(values), 2)
+    }
+
+
+async def measure_cold_start(sample: bytes) -> Tuple[LocalModelInference, Dict]:
+    """测量冷启动：模型加载耗时 + 首次推理耗时"""
+    rss_before = get_rss_mb()
+    inference = LocalModelInference()
+    
+    start = time.perf_counter()
+    await inference.initialize()
+    load_ms = (time.perf_counter() - start) * 1000
+    
+    start = time.perf_counter()
+    await inference.classify_image(sample)
+    first_ms = (time.perf_counter() - start) * 1000
+    
+    return inference, {
+        "load_ms": round(load_ms, 2),
+        "first_inference_ms": round(first_ms, 2),
+        "total_ms": round(load_ms + first_ms, 2),
+        "load_rss_mb": round(get_rss_mb() - rss_before, 1)
+    }
+
+
+async def run_latency(inference: LocalModelInference, corpus: List[Tuple[str, bytes]], rounds: int) -> Dict:
+    """串行逐张推理，统计各阶段和端到端延迟"""
+    stages: Dict[str, List[float]] = {}
+    end_to_end = []
+    failures = 0
+    
+    for _ in range(rounds):
+        for _, image_bytes in corpus:
+            start = time.perf_counter()
+            result = await inference.classify_image(image_bytes)
+            end_to_end.append((time.perf_counter() - start) * 1000)
+            if not result.get('success'):
+                failures += 1
+                continue
+            for stage, elapsed in result.get('timings', {}).items():
+                stages.setdefault(stage, []).append(elapsed)
+    
+    return {
+        "end_to_end": summarize(end_to_end),
+        "stages": {stage: summarize(values) for stage, values in stages.items()},
+        "failures": failures
+    }
+
+
+async def run_throughput(inference: LocalModelInference, corpus: List[Tuple[str, bytes]], concurrency: int, total: int) -> Dict:
+    """以指定并发数推理total张图片，统计吞吐量"""
+    queue: asyncio.Queue = asyncio.Queue()
+    for i in range(total):
+        queue.put_nowait(corpus[i % len(corpus)][1])
+    latencies = []
+    
+    async def worker():
+        while True:
+            try:
+                image_bytes = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            start = time.perf_counter()
+            await inference.classify_image(image_bytes)
+            latencies.append((time.perf_counter() - start) * 1000)
+    
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - start
+    
+    return {
+        "concurrency": concurrency,
+        "images": total,
+        "elapsed_sec": round(elapsed, 3),
+        "images_per_sec": round(total / elapsed, 2) if elapsed else 0.0,
+        "latency": summarize(latencies)
+    }
+
+
+def process_worker(slot: int, images: List[bytes], total: int, ready, start, results):
+    """多进程吞吐量测试的子进程（模拟一个gunicorn worker）"""
+    ThreadBudget.pin_worker(slot)
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+    
+    async def run():
+        inference = LocalModelInference()
+        await inference.initialize()
+        await inference.classify_image(images[0])
+        ready.put(slot)
+        start.wait()
+        
+        latencies = []
+        for i in range(total):
+            begin = time.perf_counter()
+            await inference.classify_image(images[i % len(images)])
+            latencies.append((time.perf_counter() - begin) * 1000)
+        results.put({"slot": slot, "latencies": latencies, "thread_plan": inference.thread_plan})
+    
+    asyncio.run(run())
+
+
+def run_multiprocess(corpus: List[Tuple[str, bytes]], processes: int, per_process: int) -> Dict:
+    """多个进程同时推理，统计总吞吐量（所有进程加载完成后同时开始）"""
+    os.environ[WORKERS_ENV] = str(processes)
+    ctx = multiprocessing.get_context("spawn")
+    ready, results, start = ctx.Queue(), ctx.Queue(), ctx.Event()
+    images = [data for _, data in corpus]
+    workers = [
+        ctx.Process(target=process_worker, args=(slot, images, per_process, ready, start, results))
+        for slot in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+    for _ in workers:
+        ready.get(timeout=600)
+    
+    begin = time.perf_counter()
+    start.set()
+    outputs = [results.get() for _ in workers]
+    elapsed = time.perf_counter() - begin
+    for worker in workers:
+        worker.join()
+    
+    latencies = [value for output in outputs for value in output["latencies"]]
+    return {
+        "processes": processes,
+        "images": len(latencies),
+        "elapsed_sec": round(elapsed, 3),
+        "images_per_sec": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "latency": summarize(latencies),
+        "thread_plan": outputs[0]["thread_plan"] if outputs else None
+    }
+
+
+def environment_info() -> Dict:
+    """记录测试环境和关键配置，便于对比不同运行"""
+    import onnxruntime as ort
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "host": platform.node(),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "onnxruntime": ort.__version__,
+        "cpu_count": os.cpu_count(),
+        "settings": {
+            "LOCAL_INFERENCE_PARALLEL": settings.LOCAL_INFERENCE_PARALLEL,
+            "LOCAL_INFERENCE_INTRA_OP_THREADS": settings.LOCAL_INFERENCE_INTRA_OP_THREADS,
+            "LOCAL_INFERENCE_THREAD_BUDGET_ENABLED": settings.LOCAL_INFERENCE_THREAD_BUDGET_ENABLED,
+            "LOCAL_INFERENCE_THREAD_BUDGET": settings.LOCAL_INFERENCE_THREAD_BUDGET,
+            "LOCAL_INFERENCE_CPU_AFFINITY": settings.LOCAL_INFERENCE_CPU_AFFINITY,
+            "LOCAL_INFERENCE_GRAPH_ENABLED": settings.LOCAL_INFERENCE_GRAPH_ENABLED,
+            "LOCAL_INFERENCE_IO_BINDING": settings.LOCAL_INFERENCE_IO_BINDING,
+            "LOCAL_INFERENCE_CPU_MEM_ARENA": settings.LOCAL_INFERENCE_CPU_MEM_ARENA,
+            "LOCAL_INFERENCE_MEM_PATTERN": settings.LOCAL_INFERENCE_MEM_PATTERN,
+            "LOCAL_MODEL_VARIANTS": settings.LOCAL_MODEL_VARIANTS,
+            "IMAGE_DRAFT_DECODE": settings.IMAGE_DRAFT_DECODE
+        }
+    }
+
+
+def print_report(report: Dict):
+    """打印结果表格"""
+    cold = report["cold_start"]
+    print("\n" + "=" * 80)
+    print(f"🧊 冷启动: 加载 {cold['load_ms']}ms + 首次推理 {cold['first_inference_ms']}ms "
+          f"= {cold['total_ms']}ms（模型内存 {cold['load_rss_mb']}MB）")
+    
+    print("\n" + "=" * 80)
+    print(f"{'阶段':<16}{'次数':>8}{'平均(ms)':>12}{'P50(ms)':>12}{'P95(ms)':>12}{'P99(ms)':>12}")
+    print("=" * 80)
+    rows = dict(report["latency"]["stages"])
+    rows["端到端"] = report["latency"]["end_to_end"]
+    for stage, stats in rows.items():
+        if not stats.get("count"):
+            continue
+        print(f"{stage:<16}{stats['count']:>8}{stats['mean_ms']:>12}{stats['p50_ms']:>12}"
+              f"{stats['p95_ms']:>12}{stats['p99_ms']:>12}")
+    
+    print("\n" + "=" * 80)
+    print(f"{'并发数':<10}{'图片数':>10}{'耗时(s)':>12}{'张/秒':>12}{'P95(ms)':>12}")
+    print("=" * 80)
+    for item in report["throughput"]:
+        print(f"{item['concurrency']:<10}{item['images']:>10}{item['elapsed_sec']:>12}"
+              f"{item['images_per_sec']:>12}{item['latency'].get('p95_ms', 0):>12}")
+    
+    multi = report.get("multiprocess")
+    if multi:
+        print(f"\n🧵 多进程吞吐量: {multi['processes']}进程 x {multi['images'] // multi['processes']}张, "
+              f"{multi['images_per_sec']}张/秒, P95 {multi['latency'].get('p95_ms', 0)}ms")
+        if multi.get("thread_plan"):
+            print(f"   线程分配: {ThreadBudget.describe(multi['thread_plan'])}")
+    
+    print(f"\n📈 峰值内存: {report['peak_rss_mb']}MB（结束时 {report['final_rss_mb']}MB）")
+
+
+def print_comparison(report: Dict, baseline: Dict):
+    """与基准结果对比（负数表示更快）"""
+    def delta(current: float, base: float) -> str:
+        if not base:
+            return "-"
+        return f"{(current - base) / base * 100:+.1f}%"
+    
+    print("\n" + "=" * 80)
+    print(f"🔁 对比基准（{baseline.get('environment', {}).get('timestamp', '未知时间')}）")
+    print("=" * 80)
+    
+    base_stages = dict(baseline["latency"]["stages"])
+    base_stages["端到端"] = baseline["latency"]["end_to_end"]
+    stages = dict(report["latency"]["stages"])
+    stages["端到端"] = report["latency"]["end_to_end"]
+    for stage, stats in stages.items():
+        base = base_stages.get(stage)
+        if not base or not stats.get("count") or not base.get("count"):
+            continue
+        print(f"{stage:<16} P50 {stats['p50_ms']}ms ({delta(stats['p50_ms'], base['p50_ms'])})  "
+              f"P95 {stats['p95_ms']}ms ({delta(stats['p95_ms'], base['p95_ms'])})")
+    
+    base_throughput = {item["concurrency"]: item for item in baseline.get("throughput", [])}
+    for item in report["throughput"]:
+        base = base_throughput.get(item["concurrency"])
+        if base:
+            print(f"并发{item['concurrency']:<12} {item['images_per_sec']}张/秒 "
+                  f"({delta(item['images_per_sec'], base['images_per_sec'])})")
+    
+    multi, base_multi = report.get("multiprocess"), baseline.get("multiprocess")
+    if multi and base_multi and multi["processes"] == base_multi["processes"]:
+        print(f"{multi['processes']}进程{'':<10} {multi['images_per_sec']}张/秒 "
+              f"({delta(multi['images_per_sec'], base_multi['images_per_sec'])})  "
+              f"P95 {multi['latency'].get('p95_ms', 0)}ms "
+              f"({delta(multi['latency'].get('p95_ms', 0), base_multi['latency'].get('p95_ms', 0))})")
+    
+    cold, base_cold = report["cold_start"], baseline.get("cold_start", {})
+    print(f"冷启动          {cold['total_ms']}ms ({delta(cold['total_ms'], base_cold.get('total_ms', 0))})")
+    print(f"峰值内存        {report['peak_rss_mb']}MB ({delta(report['peak_rss_mb'], baseline.get('peak_rss_mb', 0))})")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="本地模型推理基准测试")
+    parser.add_argument("--images", help="测试图片目录")
+    parser.add_argument("--synthetic", action="store_true", help="使用合成图片")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="合成图片尺寸，逗号分隔（宽x高）")
+    parser.add_argument("--formats", default=DEFAULT_FORMATS, help="合成图片格式，逗号分隔（jpeg/png/webp/mpo）")
+    parser.add_argument("--limit", type=int, default=200, help="最多使用的图片数（图片目录）")
+    parser.add_argument("--warmup", type=int, default=3, help="预热推理次数（不计入统计）")
+    parser.add_argument("--rounds", type=int, default=3, help="延迟测试轮数（每轮遍历全部图片）")
+    parser.add_argument("--concurrency", default=DEFAULT_CONCURRENCY, help="吞吐量测试的并发数，逗号分隔")
+    parser.add_argument("--throughput-images", type=int, default=0,
+                        help="每个并发等级推理的图片数（默认为图片集大小的2倍）")
+    parser.add_argument("--processes", type=int, default=0,
+                        help="多进程吞吐量测试的进程数（模拟gunicorn worker数，0表示不测试）")
+    parser.add_argument("--process-images", type=int, default=0,
+                        help="多进程测试中每个进程推理的图片数（默认为图片集大小）")
+    parser.add_argument("--output", help="结果JSON输出路径")
+    parser.add_argument("--compare", help="对比的基准结果JSON路径")
+    args = parser.parse_args()
+    
+    if not args.images and not args.synthetic:
+        parser.error("需要指定 --images 或 --synthetic")
+    
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+    
+    corpus = []
+    if args.images:
+        corpus.extend(load_corpus(args.images, args.limit))
+    if args.synthetic:
+        formats = [fmt.strip().lower() for fmt in args.formats.split(",") if fmt.strip()]
+        corpus.extend(build_synthetic_corpus(parse_sizes(args.sizes), formats))
+    if not corpus:
+        print("❌ 没有可用的测试图片")
+        sys.exit(1)
+    total_mb = sum(len(data) for _, data in corpus) / 1024 / 1024
+    print(f"📸 测试图片: {len(corpus)} 张，共 {total_mb:.1f}MB")
+    
+    print("\n🧊 测量冷启动...")
+    inference, cold_start = await measure_cold_start(corpus[0][1])
+    
+    for i in range(args.warmup):
+        await inference.classify_image(corpus[i % len(corpus)][1])
+    
+    print(f"⏱️ 延迟测试（{args.rounds}轮）...")
+    latency = await run_latency(inference, corpus, args.rounds)
+    
+    throughput = []
+    total = args.throughput_images or len(corpus) * 2
+    for concurrency in [int(c) for c in args.concurrency.split(",") if c.strip()]:
+        print(f"🚀 吞吐量测试（并发{concurrency}）...")
+        throughput.append(await run_throughput(inference, corpus, concurrency, total))
+    
+    multiprocess = None
+    if args.processes > 0:
+        print(f"🧵 多进程吞吐量测试（{args.processes}进程）...")
+        multiprocess = run_multiprocess(corpus, args.processes, args.process_images or len(corpus))
+    
+    report = {
+        "environment": environment_info(),
+        "corpus": {
+            "images": len(corpus),
+            "total_mb": round(total_mb, 2),
+            "files": [name for name, _ in corpus]
+        },
+        "execution_mode": inference.execution_mode,
+        "cold_start": cold_start,
+        "latency": latency,
+        "throughput": throughput,
+        "multiprocess": multiprocess,
+        "thread_plan": inference.thread_plan,
+        "peak_rss_mb": round(get_peak_rss_mb(), 1),
+        "final_rss_mb": round(get_rss_mb(), 1)
+    }
+    
+    print_report(report)
+    
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print_comparison(report, json.load(f))
+    
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 结果已保存: {args.output}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
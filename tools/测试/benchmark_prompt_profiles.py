@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+大模型提示词模式基准测试
+
+用同一批图片分别以 default（CLASSIFICATION_PROMPT文本返回JSON）和
+compact（精简提示词+提供商原生结构化输出）模式调用当前配置的大模型，输出：
+- 各模式上游延迟的 P50/P95
+- 平均输入/输出token数
+- 无法直接解析为JSON的次数（default模式会退回正则提取）
+- 两种模式的类别一致率
+
+图片按客户端上传规格预处理（长边UPLOAD_PROFILE_LLM_LONG_SIDE，--long-side 0 表示使用原图）。
+两种模式按图片交替调用，减少服务端负载波动对对比的影响。
+会产生真实API调用费用，建议先用 --limit 控制图片数。
+
+用法（在项目根目录执行，需配置LLM_PROVIDER/LLM_API_KEY/LLM_MODEL）：
+    python tools/测试/benchmark_prompt_profiles.py --images /data/test_images --limit 50 --output prompt.json
+    LLM_MODEL=qwen-vl-plus python tools/测试/benchmark_prompt_profiles.py --images /data/test_images --compare prompt.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from app.config import settings
+from app.services.model_client import ModelClient
+from app.utils.image_probe import ImageProbe
+from benchmark_quantized_models import IMAGE_EXTENSIONS, percentile
+from loguru import logger
+
+PROFILES = ("default", "compact")
+
+
+def load_corpus(images_dir: str, limit: int, long_side: int, quality: int) -> List[Tuple[str, bytes]]:
+    """读取图片目录，按客户端上传规格缩放"""
+    paths = sorted(
+        os.path.join(images_dir, name) for name in os.listdir(images_dir)
+        if name.lower().endswith(IMAGE_EXTENSIONS)
+    )[:limit]
+    corpus = []
+    for path in paths:
+        with open(path, "rb") as f:
+            data = f.read()
+        probe = ImageProbe(data)
+        if long_side > 0:
+            data = probe.rendition(long_side, quality) or probe.normalized_bytes
+        else:
+            data = probe.normalized_bytes
+        corpus.append((os.path.basename(path), data))
+    return corpus
+
+
+def summarize(calls: List[Dict]) -> Dict:
+    """单个模式的统计"""
+    latencies = [call["latency_ms"] for call in calls]
+    input_tokens = [call["input_tokens"] for call in calls if call.get("input_tokens") is not None]
+    output_tokens = [call["output_tokens"] for call in calls if call.get("output_tokens") is not None]
+    return {
+        "count": len(calls),
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "mean_ms": round(statistics.mean(latencies), 2) if latencies else 0.0,
+        "avg_input_tokens": round(statistics.mean(input_tokens), 1) if input_tokens else None,
+        "avg_output_tokens": round(statistics.mean(output_tokens), 1) if output_tokens else None,
+        "parse_failed": sum(1 for call in calls if call.get("parse_failed")),
+        "errors": sum(1 for call in calls if call.get("error"))
+    }
+
+
+async def run_benchmark(client: ModelClient, corpus: List[Tuple[str, bytes]], rounds: int) -> Dict:
+    """逐张图片交替调用两种模式"""
+    calls: Dict[str, List[Dict]] = {profile: [] for profile in PROFILES}
+    categories: Dict[str, Dict[str, str]] = {profile: {} for profile in PROFILES}
+    
+    for round_index in range(rounds):
+        for index, (name, image_bytes) in enumerate(corpus):
+            # 每张图片交替先后顺序，避免某一模式总是先调用
+            order = PROFILES if (index + round_index) % 2 == 0 else tuple(reversed(PROFILES))
+            for profile in order:
+                telemetry = {}
+                try:
+                    result = await client.classify_image(image_bytes, telemetry=telemetry, prompt_profile=profile)
+                    # 提供商调用失败时返回默认结果，失败原因记录在telemetry中
+                    if not telemetry.get("error"):
+                        categories[profile][name] = result["category"]
+                except Exception as e:
+                    telemetry["error"] = str(e)
+                calls[profile].append(telemetry)
+            print(f"  [{round_index + 1}/{rounds}] {index + 1}/{len(corpus)} {name}: "
+                  + ", ".join(f"{p}={categories[p].get(name, '-')}" for p in PROFILES))
+    
+    shared = [name for name in categories["default"] if name in categories["compact"]]
+    agreed = sum(1 for name in shared if categories["default"][name] == categories["compact"][name])
+    
+    return {
+        "profiles": {profile: summarize(calls[profile]) for profile in PROFILES},
+        "agreement": {
+            "images": len(shared),
+            "agreed": agreed,
+            "rate": round(agreed / len(shared), 4) if shared else None
+        },
+        "categories": categories
+    }
+
+
+def print_report(report: Dict):
+    """打印结果表格"""
+    print("\n" + "=" * 90)
+    print(f"{'模式':<10}{'次数':>8}{'P50(ms)':>12}{'P95(ms)':>12}{'输入token':>12}{'输出token':>12}{'解析失败':>10}{'错误':>8}")
+    print("=" * 90)
+    for profile, stats in report["profiles"].items():
+        print(f"{profile:<10}{stats['count']:>8}{stats['p50_ms']:>12}{stats['p95_ms']:>12}"
+              f"{str(stats['avg_input_tokens']):>12}{str(stats['avg_output_tokens']):>12}"
+              f"{stats['parse_failed']:>10}{stats['errors']:>8}")
+    
+    agreement = report["agreement"]
+    if agreement["rate"] is not None:
+        print(f"\n🎯 类别一致率: {agreement['agreed']}/{agreement['images']} ({agreement['rate'] * 100:.1f}%)")
+
+
+def print_comparison(report: Dict, baseline: Dict):
+    """与基准结果对比（负数表示更快/更少）"""
+    def delta(current, base) -> str:
+        if not base or current is None:
+            return "-"
+        return f"{(current - base) / base * 100:+.1f}%"
+    
+    print("\n" + "=" * 90)
+    print(f"🔁 对比基准（{baseline.get('environment', {}).get('timestamp', '未知时间')}）")
+    print("=" * 90)
+    for profile, stats in report["profiles"].items():
+        base = baseline.get("profiles", {}).get(profile)
+        if not base:
+            continue
+        print(f"{profile:<10} P50 {stats['p50_ms']}ms ({delta(stats['p50_ms'], base['p50_ms'])})  "
+              f"P95 {stats['p95_ms']}ms ({delta(stats['p95_ms'], base['p95_ms'])})  "
+              f"输入token ({delta(stats['avg_input_tokens'], base.get('avg_input_tokens'))})  "
+              f"输出token ({delta(stats['avg_output_tokens'], base.get('avg_output_tokens'))})")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="大模型提示词模式基准测试")
+    parser.add_argument("--images", required=True, help="测试图片目录")
+    parser.add_argument("--limit", type=int, default=20, help="最多使用的图片数")
+    parser.add_argument("--rounds", type=int, default=1, help="测试轮数（每轮遍历全部图片）")
+    parser.add_argument("--long-side", type=int, default=settings.UPLOAD_PROFILE_LLM_LONG_SIDE,
+                        help="图片长边缩放到的像素数（0表示使用原图）")
+    parser.add_argument("--quality", type=int, default=settings.UPLOAD_PROFILE_LLM_QUALITY, help="缩放后的JPEG质量")
+    parser.add_argument("--output", help="结果JSON输出路径")
+    parser.add_argument("--compare", help="对比的基准结果JSON路径")
+    args = parser.parse_args()
+    
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+    
+    if not settings.LLM_API_KEY:
+        print("❌ 未配置LLM_API_KEY")
+        sys.exit(1)
+    
+    corpus = load_corpus(args.images, args.limit, args.long_side, args.quality)
+    if not corpus:
+        print(f"❌ 目录中没有图片: {args.images}")
+        sys.exit(1)
+    total_kb = sum(len(data) for _, data in corpus) / 1024
+    print(f"📸 测试图片: {len(corpus)} 张，共 {total_kb:.0f}KB（{settings.LLM_PROVIDER} / {settings.LLM_MODEL}）")
+    
+    print(f"⏱️ 调用大模型（{args.rounds}轮 x {len(PROFILES)}种模式）...")
+    result = await run_benchmark(ModelClient(), corpus, args.rounds)
+    
+    report = {
+        "environment": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "provider": settings.LLM_PROVIDER,
+            "model": settings.LLM_MODEL,
+            "long_side": args.long_side,
+            "quality": args.quality,
+            "LLM_MAX_TOKENS": settings.LLM_MAX_TOKENS,
+            "LLM_COMPACT_MAX_TOKENS": settings.LLM_COMPACT_MAX_TOKENS
+        },
+        "corpus": {
+            "images": len(corpus),
+            "total_kb": round(total_kb, 1),
+            "files": [name for name, _ in corpus]
+        },
+        **result
+    }
+    
+    print_report(report)
+    
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print_comparison(report, json.load(f))
+    
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 结果已保存: {args.output}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+量化模型对比基准测试
+
+在同一批图片上分别运行FP32与INT8（动态/静态量化）模型，对比：
+- 延迟（各模型平均值/P95）与吞吐量（张/秒）
+- 模型加载后的内存增量（RSS）
+- 与FP32结果的一致性：
+  * YOLO类模型：按类别+IoU匹配检测框，计算相对FP32的精确率/召回率/F1
+  * MobileNetV3：Top-1一致率、Top-5重合度
+
+只有一致性满足要求的模型才建议通过 LOCAL_MODEL_VARIANTS 切换到INT8。
+
+用法（在项目根目录执行）：
+    python tools/测试/benchmark_quantized_models.py --images /data/test_images
+    python tools/测试/benchmark_quantized_models.py --images /data/test_images --variants fp32,int8_dynamic --output result.json
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import os
+import statistics
+import sys
+from typing import Dict, List
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from app.config import settings
+from app.services.local_model_inference import LocalModelInference
+from app.utils.model_utils import ModelUtils
+from loguru import logger
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".gif", ".bmp", ".mpo")
+IOU_THRESHOLD = 0.5
+DEFAULT_MODEL_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "app", "models"))
+
+
+def get_rss_mb() -> float:
+    """获取当前进程常驻内存（MB）"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """计算百分位数（最近秩法）"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def bbox_iou(a: List[float], b: List[float]) -> float:
+    """计算两个xywh(中心点)格式检测框的IoU"""
+    ax1, ay1, ax2, ay2 = a[0] - a[2] / 2, a[1] - a[3] / 2, a[0] + a[2] / 2, a[1] + a[3] / 2
+    bx1, by1, bx2, by2 = b[0] - b[2] / 2, b[1] - b[3] / 2, b[0] + b[2] / 2, b[1] + b[3] / 2
+    inter_w = max(0.0, min(ax2, bx2) - max(ax1, bx1))
+    inter_h = max(0.0, min(ay2, by2) - max(ay1, by1))
+    inter = inter_w * inter_h
+    union = a[2] * a[3] + b[2] * b[3] - inter
+    return inter / union if union > 0 else 0.0
+
+
+def match_detections(reference: List[Dict], candidate: List[Dict]) -> int:
+    """按类别+IoU贪心匹配，返回匹配成功的检测框数量"""
+    matched = 0
+    used = set()
+    for ref in sorted(reference, key=lambda d: d['confidence'], reverse=True):
+        for i, cand in enumerate(candidate):
+            if i in used or cand['classId'] != ref['classId']:
+                continue
+            if bbox_iou(ref['bbox'], cand['bbox']) >= IOU_THRESHOLD:
+                used.add(i)
+                matched += 1
+                break
+    return matched
+
+
+def detection_agreement(reference: List[List[Dict]], candidate: List[List[Dict]]) -> Dict:
+    """计算候选变体相对FP32的检测一致性"""
+    matched = sum(match_detections(r, c) for r, c in zip(reference, candidate))
+    ref_total = sum(len(r) for r in reference)
+    cand_total = sum(len(c) for c in candidate)
+    precision = matched / cand_total if cand_total else 1.0
+    recall = matched / ref_total if ref_total else 1.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {"precision": round(precision, 4), "recall": round(recall, 4), "f1": round(f1, 4)}
+
+
+def classification_agreement(reference: List[Dict], candidate: List[Dict]) -> Dict:
+    """计算MobileNetV3分类结果相对FP32的一致性"""
+    top1_same = 0
+    top5_overlap = []
+    for ref, cand in zip(reference, candidate):
+        ref_preds = [p['index'] for p in (ref or {}).get('predictions', [])]
+        cand_preds = [p['index'] for p in (cand or {}).get('predictions', [])]
+        if ref_preds and cand_preds and ref_preds[0] == cand_preds[0]:
+            top1_same += 1
+        if ref_preds:
+            top5_overlap.append(len(set(ref_preds) & set(cand_preds)) / len(ref_preds))
+    count = len(reference) or 1
+    return {
+        "top1_agreement": round(top1_same / count, 4),
+        "top5_overlap": round(statistics.mean(top5_overlap), 4) if top5_overlap else 0.0
+    }
+
+
+async def run_variant(variant: str, images: List[bytes]) -> Dict:
+    """使用指定变体运行所有图片，返回耗时和原始输出"""
+    model_dir = DEFAULT_MODEL_DIR
+    # 仅对存在量化文件的模型启用该变体，其余保持FP32
+    enabled = [
+        name for name in ModelUtils.MODEL_FILES
+        if os.path.exists(ModelUtils.variant_path(model_dir, name, variant))
+    ]
+    settings.LOCAL_MODEL_VARIANTS = ";".join(f"{name}={variant}" for name in enabled)
+    
+    gc.collect()
+    rss_before = get_rss_mb()
+    inference = LocalModelInference()
+    await inference.initialize()
+    rss_after = get_rss_mb()
+    
+    timings = {name: [] for name in ModelUtils.MODEL_FILES}
+    outputs = {"idCard": [], "yolo8s": [], "mobilenetv3": []}
+    failures = 0
+    for image_bytes in images:
+        result = await inference.classify_image(image_bytes)
+        if not result.get('success', True):
+            failures += 1
+        # 条件推理图提前退出时跳过的模型、推理失败的图片没有耗时，不计入统计
+        for name in timings:
+            elapsed = result.get('timings', {}).get(name)
+            if elapsed is not None:
+                timings[name].append(elapsed)
+        # 按图片顺序对齐各变体的输出，缺失的输出视为没有检测结果
+        outputs["idCard"].append(result.get('idCardDetections') or [])
+        outputs["yolo8s"].append(result.get('generalDetections') or [])
+        outputs["mobilenetv3"].append(result.get('mobileNetV3Detections'))
+    
+    del inference
+    gc.collect()
+    
+    return {
+        "enabled_models": enabled,
+        "load_rss_mb": round(rss_after - rss_before, 1),
+        "failures": failures,
+        "timings": timings,
+        "outputs": outputs
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="量化模型对比基准测试")
+    parser.add_argument("--images", required=True, help="测试图片目录")
+    parser.add_argument("--variants", default=",".join(ModelUtils.VARIANTS), help="对比的变体，逗号分隔（需包含fp32）")
+    parser.add_argument("--limit", type=int, default=200, help="最多使用的图片数")
+    parser.add_argument("--output", help="结果JSON输出路径")
+    args = parser.parse_args()
+    
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+    
+    variants = [v.strip() for v in args.variants.split(",") if v.strip()]
+    if ModelUtils.VARIANT_FP32 not in variants:
+        variants.insert(0, ModelUtils.VARIANT_FP32)
+    
+    paths = sorted(
+        os.path.join(args.images, name) for name in os.listdir(args.images)
+        if name.lower().endswith(IMAGE_EXTENSIONS)
+    )[:args.limit]
+    if not paths:
+        print(f"❌ 目录中没有图片: {args.images}")
+        sys.exit(1)
+    images = []
+    for path in paths:
+        with open(path, "rb") as f:
+            images.append(f.read())
+    print(f"📸 测试图片: {len(images)} 张")
+    
+    runs = {}
+    for variant in variants:
+        print(f"\n🚀 运行变体: {variant}")
+        runs[variant] = await run_variant(variant, images)
+    
+    baseline = runs[ModelUtils.VARIANT_FP32]
+    report = {"images": len(images), "variants": {}}
+    for variant, run in runs.items():
+        models = {}
+        for name in ModelUtils.MODEL_FILES:
+            values = run['timings'][name]
+            mean_ms = statistics.mean(values) if values else 0.0
+            entry = {
+                "variant": variant if name in run['enabled_models'] else ModelUtils.VARIANT_FP32,
+                "runs": len(values),
+                "mean_ms": round(mean_ms, 2),
+                "p95_ms": round(percentile(values, 95), 2),
+                "throughput_per_sec": round(1000 / mean_ms, 2) if mean_ms else 0.0
+            }
+            if variant != ModelUtils.VARIANT_FP32:
+                if name == "mobilenetv3":
+                    entry["agreement"] = classification_agreement(baseline['outputs'][name], run['outputs'][name])
+                else:
+                    entry["agreement"] = detection_agreement(baseline['outputs'][name], run['outputs'][name])
+            models[name] = entry
+        report["variants"][variant] = {"load_rss_mb": run['load_rss_mb'], "failures": run['failures'], "models": models}
+        if run['failures']:
+            print(f"⚠️ {variant}: {run['failures']} 张图片推理失败")
+    
+    print("\n" + "=" * 96)
+    print(f"{'变体':<14}{'模型':<14}{'平均(ms)':>10}{'P95(ms)':>10}{'张/秒':>10}{'内存(MB)':>10}  一致性")
+    print("=" * 96)
+    for variant, data in report["variants"].items():
+        for name, entry in data["models"].items():
+            agreement = entry.get("agreement", "基准")
+            print(f"{entry['variant']:<14}{name:<14}{entry['mean_ms']:>10}{entry['p95_ms']:>10}"
+                  f"{entry['throughput_per_sec']:>10}{data['load_rss_mb']:>10}  {agreement}")
+    
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 结果已保存: {args.output}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+本地优先分类校准
+
+用已标注的图片（每个类别一个子目录，目录名为类别，如 pets/、idcard/）运行本地推理和服务端分类映射，
+按映射到的类别统计原始得分与准确率，输出：
+- 各类别映射准确率
+- 达到目标准确率（--precision）所需的最低原始得分，及对应的校准系数
+  （系数 = LOCAL_FIRST_CONFIDENCE / 最低得分，校准后得分达到阈值的图片即满足目标准确率）
+- 当前配置和建议配置下不调用大模型的图片比例及其准确率
+
+用法（在项目根目录执行）：
+    python tools/测试/calibrate_local_mapping.py --images /data/labeled_images --precision 0.95
+    python tools/测试/calibrate_local_mapping.py --images /data/labeled_images --limit 200 --output calibration.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from app.config import settings
+from app.services.category_mapper import category_mapper
+from app.services.local_model_inference import LocalModelInference
+from app.utils.image_probe import ImageProbe
+from benchmark_quantized_models import IMAGE_EXTENSIONS
+from loguru import logger
+
+
+def load_labeled(images_dir: str, limit: int) -> List[Tuple[str, str]]:
+    """读取标注图片（子目录名为类别，不是已知类别的目录忽略）"""
+    samples = []
+    for label in sorted(os.listdir(images_dir)):
+        label_dir = os.path.join(images_dir, label)
+        if label not in settings.CATEGORIES or not os.path.isdir(label_dir):
+            continue
+        names = sorted(name for name in os.listdir(label_dir) if name.lower().endswith(IMAGE_EXTENSIONS))[:limit]
+        samples.extend((label, os.path.join(label_dir, name)) for name in names)
+    return samples
+
+
+def min_score_for_precision(records: List[Tuple[float, bool]], precision: float) -> Optional[float]:
+    """
+    原始得分不低于返回值的映射结果整体准确率达到precision，且覆盖的图片最多
+    
+    Returns:
+        最低原始得分，任何阈值都达不到时为None
+    """
+    best = None
+    correct = 0
+    for index, (score, ok) in enumerate(sorted(records, key=lambda r: -r[0])):
+        correct += ok
+        if score > 0 and correct / (index + 1) >= precision:
+            best = score
+    return best
+
+
+async def run(samples: List[Tuple[str, str]]) -> List[Dict]:
+    """逐张本地推理并映射"""
+    inference = LocalModelInference()
+    await inference.initialize()
+    
+    rows = []
+    for index, (label, path) in enumerate(samples):
+        with open(path, "rb") as f:
+            probe = ImageProbe(f.read())
+        result = await inference.classify_image(probe.normalized_bytes, probe=probe)
+        if not result['success']:
+            print(f"  ⚠️ 推理失败: {path}")
+            continue
+        category, score, _ = category_mapper.map(result)
+        rows.append({"file": os.path.relpath(path), "label": label, "category": category, "score": round(score, 4)})
+        if (index + 1) % 50 == 0:
+            print(f"  {index + 1}/{len(samples)}")
+    return rows
+
+
+def acceptance(rows: List[Dict], calibration: Dict[str, float]) -> Dict:
+    """按校准系数计算不调用大模型的图片数及其准确率"""
+    accepted = [
+        row for row in rows
+        if min(1.0, row["score"] * calibration.get(row["category"], 0.0)) >= settings.LOCAL_FIRST_CONFIDENCE
+    ]
+    correct = sum(1 for row in accepted if row["category"] == row["label"])
+    return {
+        "accepted": len(accepted),
+        "rate": round(len(accepted) / len(rows), 4) if rows else 0.0,
+        "precision": round(correct / len(accepted), 4) if accepted else None
+    }
+
+
+def build_report(rows: List[Dict], precision: float) -> Dict:
+    """各类别统计和建议的校准系数"""
+    categories = {}
+    suggested = {}
+    for category in settings.CATEGORIES:
+        records = [(row["score"], row["category"] == row["label"]) for row in rows if row["category"] == category]
+        if not records:
+            continue
+        min_score = min_score_for_precision(records, precision)
+        if min_score is not None:
+            suggested[category] = round(settings.LOCAL_FIRST_CONFIDENCE / min_score, 2)
+        categories[category] = {
+            "mapped": len(records),
+            "accuracy": round(sum(ok for _, ok in records) / len(records), 4),
+            "min_score": min_score,
+            "suggested_scale": suggested.get(category)
+        }
+    return {
+        "categories": categories,
+        "current": acceptance(rows, category_mapper.calibration()),
+        "suggested": acceptance(rows, suggested),
+        "suggested_calibration": ";".join(f"{category}={scale}" for category, scale in suggested.items())
+    }
+
+
+def print_report(report: Dict):
+    """打印结果表格"""
+    print("\n" + "=" * 80)
+    print(f"{'类别':<20}{'映射数':>8}{'准确率':>10}{'最低得分':>12}{'建议系数':>12}{'当前系数':>12}")
+    print("=" * 80)
+    current = category_mapper.calibration()
+    for category, stats in report["categories"].items():
+        print(f"{category:<20}{stats['mapped']:>8}{stats['accuracy'] * 100:>9.1f}%"
+              f"{str(stats['min_score']):>12}{str(stats['suggested_scale']):>12}{str(current.get(category, '-')):>12}")
+    
+    for name, title in (("current", "当前配置"), ("suggested", "建议配置")):
+        stats = report[name]
+        precision = f"{stats['precision'] * 100:.1f}%" if stats["precision"] is not None else "-"
+        print(f"\n{title}: 不调用大模型 {stats['accepted']} 张（{stats['rate'] * 100:.1f}%），准确率 {precision}")
+    print(f"\n💡 LOCAL_FIRST_CALIBRATION={report['suggested_calibration']}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="本地优先分类校准")
+    parser.add_argument("--images", required=True, help="标注图片目录（每个类别一个子目录）")
+    parser.add_argument("--limit", type=int, default=100, help="每个类别最多使用的图片数")
+    parser.add_argument("--precision", type=float, default=0.95, help="不调用大模型的图片需达到的准确率")
+    parser.add_argument("--output", help="结果JSON输出路径")
+    args = parser.parse_args()
+    
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+    
+    samples = load_labeled(args.images, args.limit)
+    if not samples:
+        print(f"❌ 目录中没有按类别存放的图片: {args.images}")
+        sys.exit(1)
+    print(f"📸 标注图片: {len(samples)} 张，目标准确率 {args.precision * 100:.0f}%，阈值 {settings.LOCAL_FIRST_CONFIDENCE}")
+    
+    rows = await run(samples)
+    report = {
+        "environment": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "precision": args.precision,
+            "LOCAL_FIRST_CONFIDENCE": settings.LOCAL_FIRST_CONFIDENCE,
+            "LOCAL_FIRST_CALIBRATION": settings.LOCAL_FIRST_CALIBRATION
+        },
+        **build_report(rows, args.precision),
+        "images": rows
+    }
+    
+    print_report(report)
+    
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 结果已保存: {args.output}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
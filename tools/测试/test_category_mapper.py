@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+测试本地推理结果分类映射和置信度校准
+
+本地优先分类按映射结果和校准后的置信度决定是否跳过大模型：映射顺序错误会直接返回错误类别，
+LOCAL_FIRST_CALIBRATION中格式不对的项要跳过而不是让每个请求出错
+
+用法（在项目根目录执行）：
+    python -m pytest tools/测试/test_category_mapper.py
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+import pytest
+from app.config import settings
+from app.services.category_mapper import CategoryMapper
+
+
+def det(class_name: str, confidence: float) -> dict:
+    return {"className": class_name, "confidence": confidence}
+
+
+def local_result(id_cards=(), general=(), top=None) -> dict:
+    """构造本地推理原始结果"""
+    return {
+        "idCardDetections": list(id_cards),
+        "generalDetections": list(general),
+        "mobileNetV3Detections": {"topPrediction": top} if top else None
+    }
+
+
+@pytest.mark.parametrize("result, expected", [
+    (local_result(id_cards=[det("idcard", 0.7), det("idcard", 0.9)], general=[det("person", 0.9)]), ("idcard", 0.9)),
+    (local_result(general=[det("person", 0.8)], top={"index": 916, "probability": 0.6}), ("screenshot", 0.6)),
+    (local_result(general=[det("person", 0.8), det("cat", 0.9)]), ("single_person", 0.8)),
+    (local_result(general=[det("person", 0.9), det("person", 0.4), det("person", 0.7)]), ("social_activities", 0.7)),
+    (local_result(general=[det("dog", 0.6), det("cake", 0.9)]), ("pets", 0.6)),
+    (local_result(general=[det("pizza", 0.5), det("cake", 0.8), det("chair", 0.9)]), ("foods", 0.8)),
+    (local_result(general=[det("car", 0.9)]), ("travel_scenery", 0.0)),
+    (local_result(general=[det("car", 0.9)] * 4), ("other", 0.0)),
+    (local_result(top={"index": 1, "probability": 0.99}), ("travel_scenery", 0.0)),
+    ({}, ("travel_scenery", 0.0)),
+])
+def test_map(result, expected):
+    """按顺序匹配映射规则，返回类别和映射依据的原始得分"""
+    category, score, _ = CategoryMapper().map(result)
+    assert (category, score) == expected
+
+
+def test_calibrate(monkeypatch):
+    """原始得分乘以类别系数并限制在[0, 1]，未配置的类别为0"""
+    monkeypatch.setattr(settings, "LOCAL_FIRST_CALIBRATION", "idcard=1.2;pets=0.5")
+    mapper = CategoryMapper()
+    assert mapper.calibrate("idcard", 0.9) == 1.0
+    assert mapper.calibrate("pets", 0.9) == 0.45
+    assert mapper.calibrate("foods", 0.9) == 0.0
+
+
+def test_malformed_calibration(monkeypatch):
+    """格式不对、未知类别、负数和非有限的系数跳过，其余照常使用"""
+    monkeypatch.setattr(
+        settings, "LOCAL_FIRST_CALIBRATION",
+        "pets=;pets=x;foods=-1;screenshot=nan;other=inf;unknown=1;idcard;single_person=0.9; idcard = 1.02 ;;"
+    )
+    assert CategoryMapper().calibration() == {"single_person": 0.9, "idcard": 1.02}
+
+
+def test_calibration_cached(monkeypatch):
+    """配置不变时复用解析结果，修改后重新解析"""
+    monkeypatch.setattr(settings, "LOCAL_FIRST_CALIBRATION", "idcard=1.0")
+    mapper = CategoryMapper()
+    first = mapper.calibration()
+    assert mapper.calibration() is first
+    monkeypatch.setattr(settings, "LOCAL_FIRST_CALIBRATION", "pets=0.8")
+    assert mapper.calibration() == {"pets": 0.8}
+
+
+def test_classify(monkeypatch):
+    """classify返回映射类别和校准后的置信度"""
+    monkeypatch.setattr(settings, "LOCAL_FIRST_CALIBRATION", "pets=0.5")
+    result = CategoryMapper().classify(local_result(general=[det("cat", 0.8)]))
+    assert result["category"] == "pets"
+    assert result["confidence"] == 0.4
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+测试图片头解析
+
+上传校验在解码前按文件头拒绝无效、超大的图片，解析器面对截断和构造的异常文件头
+只能返回None（或空元数据），不能抛出异常，也不能返回宽高为0的结果
+
+用法（在项目根目录执行）：
+    python -m pytest tools/测试/test_image_header.py
+"""
+
+import io
+import os
+import struct
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+import pytest
+from PIL import Image
+from PIL.PngImagePlugin import PngInfo
+from app.utils.image_header import ImageHeader
+
+
+def encode(fmt: str, size=(64, 48), mode="RGB", **kwargs) -> bytes:
+    """用Pillow生成指定格式的图片"""
+    output = io.BytesIO()
+    Image.new(mode, size, 128).save(output, format=fmt, **kwargs)
+    return output.getvalue()
+
+
+def make_mpo() -> bytes:
+    """生成两帧的MPO图片"""
+    output = io.BytesIO()
+    first = Image.new("RGB", (64, 48), (200, 80, 40))
+    first.save(output, format="MPO", save_all=True, append_images=[Image.new("RGB", (64, 48))])
+    return output.getvalue()
+
+
+def jpeg_with_segment(marker: int, payload: bytes) -> bytes:
+    """在SOI之后插入一个自定义段"""
+    data = encode("JPEG")
+    return data[:2] + bytes([0xFF, marker]) + struct.pack(">H", len(payload) + 2) + payload + data[2:]
+
+
+SAMPLES = {
+    "jpeg": (lambda: encode("JPEG"), {"format": "jpeg", "width": 64, "height": 48, "mode": "RGB"}),
+    "jpeg_gray": (lambda: encode("JPEG", mode="L"), {"format": "jpeg", "width": 64, "height": 48, "mode": "L"}),
+    "jpeg_progressive": (lambda: encode("JPEG", progressive=True), {"format": "jpeg", "width": 64, "height": 48, "mode": "RGB"}),
+    "mpo": (make_mpo, {"format": "mpo", "width": 64, "height": 48, "mode": "RGB"}),
+    "png": (lambda: encode("PNG"), {"format": "png", "width": 64, "height": 48, "mode": "RGB"}),
+    "png_rgba": (lambda: encode("PNG", mode="RGBA"), {"format": "png", "width": 64, "height": 48, "mode": "RGBA"}),
+    "webp_lossy": (lambda: encode("WEBP", quality=80), {"format": "webp", "width": 64, "height": 48, "mode": "RGB"}),
+    "webp_lossless": (lambda: encode("WEBP", lossless=True), {"format": "webp", "width": 64, "height": 48, "mode": "RGB"}),
+    "webp_alpha": (lambda: encode("WEBP", mode="RGBA"), {"format": "webp", "width": 64, "height": 48, "mode": "RGBA"}),
+    "gif": (lambda: encode("GIF", mode="P"), {"format": "gif", "width": 64, "height": 48, "mode": "P"}),
+}
+
+
+@pytest.mark.parametrize("name", SAMPLES)
+def test_parse_valid(name):
+    """各格式读取的格式、宽高、颜色模式与Pillow一致"""
+    make, expected = SAMPLES[name]
+    assert ImageHeader.parse(make()) == expected
+
+
+@pytest.mark.parametrize("name", SAMPLES)
+def test_parse_truncated(name):
+    """任意位置截断都不抛异常，读不到帧头时返回None，读到时宽高与原图一致"""
+    make, expected = SAMPLES[name]
+    data = make()
+    for length in range(len(data)):
+        result = ImageHeader.parse(data[:length])
+        assert result is None or (result["width"], result["height"]) == (expected["width"], expected["height"]), length
+
+
+@pytest.mark.parametrize("data", [
+    b"",
+    b"\xff",
+    b"\xff\xd8",
+    b"not an image at all",
+    b"\x89PNG\r\n\x1a\n",
+    b"RIFF\x00\x00\x00\x00WEBP",
+    b"GIF89a",
+])
+def test_parse_unrecognized(data):
+    """空数据、只有签名或无法识别的数据返回None"""
+    assert ImageHeader.parse(data) is None
+
+
+def test_parse_other_formats_without_size():
+    """BMP/TIFF只识别格式（不在允许列表中，由上传校验拒绝）"""
+    assert ImageHeader.parse(encode("BMP"))["format"] == "bmp"
+    assert ImageHeader.parse(encode("TIFF"))["format"] == "tiff"
+
+
+def test_jpeg_zero_size():
+    """SOF中宽或高为0视为损坏"""
+    data = bytearray(encode("JPEG"))
+    sof = data.index(b"\xff\xc0")
+    data[sof + 5:sof + 9] = b"\x00\x00\x00\x40"
+    assert ImageHeader.parse(bytes(data)) is None
+
+
+def test_jpeg_invalid_segment_length():
+    """段长度小于2（自身长度字段）时停止解析，不会原地循环"""
+    data = encode("JPEG")
+    assert ImageHeader.parse(data[:2] + b"\xff\xe0\x00\x01" + data[2:]) is None
+
+
+def test_jpeg_garbage_between_segments():
+    """段之间出现非0xFF字节时返回None"""
+    data = encode("JPEG")
+    assert ImageHeader.parse(data[:2] + b"\x00" + data[2:]) is None
+
+
+def test_jpeg_sos_before_sof():
+    """帧头之前遇到SOS时返回None"""
+    data = encode("JPEG")
+    assert ImageHeader.parse(data[:2] + b"\xff\xda\x00\x02" + data[2:]) is None
+
+
+@pytest.mark.parametrize("payload", [
+    b"MPF\x00",
+    b"MPF\x00XX\x00\x2a\x00\x00\x00\x08",
+    b"MPF\x00II\x2a\x00\xff\xff\xff\x7f",
+    b"MPF\x00MM\x00\x2a\x00\x00\x00\x08\x00\x05",
+])
+def test_jpeg_malformed_mpf(payload):
+    """MPF段损坏（字节序无效、IFD偏移越界、条目被截断）时不抛异常，不会被识别为MPO"""
+    result = ImageHeader.parse(jpeg_with_segment(0xE2, payload))
+    assert result is None or result["format"] == "jpeg"
+
+
+def test_png_missing_ihdr():
+    """签名之后不是IHDR块时返回None"""
+    data = bytearray(encode("PNG"))
+    data[12:16] = b"IDAT"
+    assert ImageHeader.parse(bytes(data)) is None
+
+
+def test_png_zero_size():
+    data = bytearray(encode("PNG"))
+    data[16:20] = b"\x00\x00\x00\x00"
+    assert ImageHeader.parse(bytes(data)) is None
+
+
+def test_webp_bad_vp8_start_code():
+    """VP8关键帧起始码错误时返回None"""
+    data = bytearray(encode("WEBP", quality=80))
+    assert data[12:16] == b"VP8 "
+    data[23:26] = b"\x00\x00\x00"
+    assert ImageHeader.parse(bytes(data)) is None
+
+
+def test_webp_bad_vp8l_signature():
+    data = bytearray(encode("WEBP", lossless=True))
+    assert data[12:16] == b"VP8L"
+    data[20] = 0x00
+    assert ImageHeader.parse(bytes(data)) is None
+
+
+def test_webp_unknown_chunk():
+    data = bytearray(encode("WEBP", quality=80))
+    data[12:16] = b"ABCD"
+    assert ImageHeader.parse(bytes(data)) is None
+
+
+def test_gif_zero_size():
+    data = bytearray(encode("GIF", mode="P"))
+    data[6:10] = b"\x00\x00\x00\x00"
+    assert ImageHeader.parse(bytes(data)) is None
+
+
+def test_metadata_jpeg_exif():
+    """读取JPEG EXIF中的Make、Model、Software"""
+    exif = Image.Exif()
+    exif[0x010F] = "Apple"
+    exif[0x0110] = "iPhone 15"
+    exif[0x0131] = "17.0"
+    meta = ImageHeader.metadata(encode("JPEG", exif=exif.tobytes()))
+    assert meta["exif"] is True
+    assert (meta["make"], meta["model"], meta["software"]) == ("Apple", "iPhone 15", "17.0")
+
+
+def test_metadata_png_text():
+    """读取PNG tEXt中的Software和XMP"""
+    info = PngInfo()
+    info.add_text("Software", "Android Screenshot")
+    info.add_text("XML:com.adobe.xmp", "<x:xmpmeta>Screenshot</x:xmpmeta>")
+    meta = ImageHeader.metadata(encode("PNG", pnginfo=info))
+    assert meta["software"] == "Android Screenshot"
+    assert "Screenshot" in meta["xmp"]
+    assert meta["exif"] is False
+
+
+def test_metadata_truncated_and_malformed():
+    """元数据损坏或截断时不抛异常"""
+    exif = Image.Exif()
+    exif[0x010F] = "Apple"
+    data = encode("JPEG", exif=exif.tobytes())
+    for length in range(len(data)):
+        ImageHeader.metadata(data[:length])
+    
+    # IFD偏移越界
+    ImageHeader.metadata(jpeg_with_segment(0xE1, b"Exif\x00\x00II\x2a\x00\xff\xff\xff\x7f"))
+    # 条目数大于实际条目
+    meta = ImageHeader.metadata(jpeg_with_segment(0xE1, b"Exif\x00\x00MM\x00\x2a\x00\x00\x00\x08\x00\x09"))
+    assert meta["make"] == ""
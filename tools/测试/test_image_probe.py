@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+测试图片探针的解码复用
+
+降分辨率解码（本地推理、压缩）的结果不能用于MPO标准化：
+先按本地推理的下限解码，再取标准化字节，尺寸必须仍是原图尺寸
+
+用法（在项目根目录执行）：
+    python tools/测试/test_image_probe.py
+    python -m pytest tools/测试/test_image_probe.py
+"""
+
+import io
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from PIL import Image
+from app.utils.image_probe import ImageProbe
+
+WIDTH, HEIGHT = 2400, 1800
+
+
+def make_mpo() -> bytes:
+    """生成两帧的MPO图片（原图尺寸，足够大以触发降分辨率解码）"""
+    first = Image.new("RGB", (WIDTH, HEIGHT), (200, 80, 40))
+    second = Image.new("RGB", (WIDTH, HEIGHT), (40, 80, 200))
+    output = io.BytesIO()
+    first.save(output, format="MPO", save_all=True, append_images=[second])
+    return output.getvalue()
+
+
+def test_normalized_bytes_after_reduced_decode():
+    """先降分辨率解码（同本地推理的decode(640, 256)），标准化字节仍为原图尺寸"""
+    probe = ImageProbe(make_mpo())
+    assert probe.validate()[0] and probe.format == "mpo"
+    
+    _, scale = probe.decode(640, 256)
+    assert scale != (1.0, 1.0), "图片未触发降分辨率解码，测试无效"
+    
+    with Image.open(io.BytesIO(probe.normalized_bytes)) as normalized:
+        assert normalized.format == "JPEG"
+        assert normalized.size == (WIDTH, HEIGHT), f"标准化图片被缩小: {normalized.size}"
+
+
+def test_reduced_decode_after_full_decode():
+    """已完整解码时，降分辨率请求直接复用完整解码结果"""
+    probe = ImageProbe(make_mpo())
+    probe.normalized_bytes
+    img, scale = probe.decode(640, 256)
+    assert scale == (1.0, 1.0)
+    assert img.size == (WIDTH, HEIGHT)
+
+
+if __name__ == "__main__":
+    for test in (test_normalized_bytes_after_reduced_decode, test_reduced_decode_after_full_decode):
+        test()
+        print(f"✅ {test.__name__}")
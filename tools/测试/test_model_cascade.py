@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+测试大模型级联调用的升级判断
+
+调用失败、无法解析为JSON或置信度低于LLM_CASCADE_CONFIDENCE时升级到下一级模型，
+最后一级调用失败时返回前面各级中最后一个调用成功的结果（不调用真实的大模型接口）
+
+用法（在项目根目录执行）：
+    python -m pytest tools/测试/test_model_cascade.py
+"""
+
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+import pytest
+from app.config import settings
+from app.services.model_client import ModelClient
+
+
+def run_cascade(monkeypatch, responses, models="fast;medium;slow", confidence=0.8):
+    """
+    按模型名称返回预设结果执行级联调用
+    
+    Args:
+        responses: 模型名称 -> (置信度, 调用明细中的错误标记)，如 {"fast": (0.5, {})}
+    
+    Returns:
+        (最终结果, 调用明细列表)
+    """
+    monkeypatch.setattr(settings, "LLM_CASCADE_MODELS", models)
+    monkeypatch.setattr(settings, "LLM_CASCADE_CONFIDENCE", confidence)
+    client = ModelClient()
+    
+    async def fake_classify(image_bytes, telemetry=None, prompt_profile=None, model=None):
+        score, flags = responses[model]
+        telemetry.update({"model": model, "error": None, "parse_failed": False, **flags})
+        return {"category": "pets", "confidence": score, "description": model}
+    
+    monkeypatch.setattr(client, "classify_image", fake_classify)
+    calls = []
+    result = asyncio.run(client.classify_with_cascade(b"image", calls=calls, call_info={"purpose": "test"}))
+    return result, calls
+
+
+def test_confident_first_tier(monkeypatch):
+    """第一级置信度足够时不升级"""
+    result, calls = run_cascade(monkeypatch, {"fast": (0.9, {})})
+    assert result["description"] == "fast"
+    assert [(call["tier"], call["escalated"], call["purpose"]) for call in calls] == [(1, False, "test")]
+
+
+def test_threshold_is_inclusive(monkeypatch):
+    """置信度等于阈值时不升级"""
+    result, calls = run_cascade(monkeypatch, {"fast": (0.8, {})})
+    assert len(calls) == 1
+
+
+@pytest.mark.parametrize("flags", [{}, {"parse_failed": True}, {"error": "timeout"}])
+def test_escalation(monkeypatch, flags):
+    """低置信度、无法解析、调用失败时升级到下一级"""
+    score = 0.5 if not flags else 0.95
+    result, calls = run_cascade(monkeypatch, {"fast": (score, flags), "medium": (0.9, {})})
+    assert result["description"] == "medium"
+    assert [(call["tier"], call["escalated"]) for call in calls] == [(1, True), (2, False)]
+
+
+def test_last_tier_not_escalated(monkeypatch):
+    """最后一级置信度仍不足时直接返回最后一级的结果"""
+    result, calls = run_cascade(monkeypatch, {"fast": (0.3, {}), "medium": (0.4, {}), "slow": (0.5, {})})
+    assert result["description"] == "slow"
+    assert [call["escalated"] for call in calls] == [True, True, False]
+
+
+def test_last_tier_failed_returns_previous(monkeypatch):
+    """最后一级调用失败时返回前面最后一个调用成功的结果"""
+    result, _ = run_cascade(monkeypatch, {
+        "fast": (0.3, {}),
+        "medium": (0.4, {"error": "500"}),
+        "slow": (0.5, {"error": "timeout"})
+    })
+    assert result["description"] == "fast"
+
+
+def test_all_tiers_failed(monkeypatch):
+    """所有级别都失败时返回最后一级的结果"""
+    result, _ = run_cascade(monkeypatch, {"fast": (0.5, {"error": "a"}), "slow": (0.5, {"error": "b"})}, models="fast;slow")
+    assert result["description"] == "slow"
+
+
+def test_without_cascade_models(monkeypatch):
+    """未配置级联模型时只调用LLM_MODEL一次"""
+    monkeypatch.setattr(settings, "LLM_MODEL", "single")
+    result, calls = run_cascade(monkeypatch, {"single": (0.1, {})}, models="")
+    assert result["description"] == "single"
+    assert [(call["tier"], call["escalated"]) for call in calls] == [(1, False)]
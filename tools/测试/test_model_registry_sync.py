@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+测试模型版本同步
+
+其他进程切换版本后，各进程按间隔检查版本状态文件并在后台切换；
+正在加载其他版本、校验失败或加载失败时下一个同步间隔重试，不能永远停留在旧版本
+（使用假的推理实例，不加载真实模型）
+
+用法（在项目根目录执行）：
+    python -m pytest tools/测试/test_model_registry_sync.py
+"""
+
+import asyncio
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+import pytest
+from app.config import settings
+from app.services.model_registry import ModelRegistry, STATE_FILE
+
+
+class FakeInference:
+    """假的推理实例"""
+    
+    def __init__(self, version: str, fail: bool = False):
+        self.version = version
+        self.is_initialized = True
+        self.fail = fail
+    
+    async def initialize(self):
+        if self.fail:
+            raise RuntimeError("模型文件损坏")
+
+
+@pytest.fixture
+def registry(monkeypatch, tmp_path):
+    """当前版本为v1、版本状态文件指向v2的注册表"""
+    monkeypatch.setattr(settings, "LOCAL_MODEL_REGISTRY_SYNC_INTERVAL", 0)
+    registry = ModelRegistry()
+    registry.registry_dir = str(tmp_path)
+    registry.state_path = os.path.join(str(tmp_path), STATE_FILE)
+    registry._active = FakeInference("v1")
+    with open(registry.state_path, "w", encoding="utf-8") as f:
+        json.dump({"active": "v2", "previous": "v1"}, f)
+    registry.started = []
+    monkeypatch.setattr(registry, "validate_version", lambda version: None)
+    monkeypatch.setattr(registry, "_start_activation", lambda version: registry.started.append(version) or "loading")
+    return registry
+
+
+def test_sync_starts_activation(registry):
+    """状态文件指向其他版本时开始切换，同一次修改只切换一次"""
+    registry._maybe_sync()
+    registry._maybe_sync()
+    assert registry.started == ["v2"]
+
+
+def test_sync_already_active(registry):
+    """状态文件指向当前版本时不切换"""
+    registry._active = FakeInference("v2")
+    registry._maybe_sync()
+    assert registry.started == []
+    assert registry._state_mtime is not None
+
+
+def test_retry_after_validation_failure(registry, monkeypatch):
+    """校验失败后下一个同步间隔重试"""
+    failures = ["版本目录不完整"]
+    
+    def validate(version):
+        if failures:
+            raise ValueError(failures.pop())
+    
+    monkeypatch.setattr(registry, "validate_version", validate)
+    registry._maybe_sync()
+    assert registry.started == []
+    registry._maybe_sync()
+    assert registry.started == ["v2"]
+
+
+def test_retry_after_staging(registry, monkeypatch):
+    """正在加载其他版本时不切换，加载结束后的同步间隔重试"""
+    staging = [True]
+    monkeypatch.setattr(registry, "_is_staging", lambda: staging[0])
+    registry._maybe_sync()
+    assert registry.started == []
+    staging[0] = False
+    registry._maybe_sync()
+    assert registry.started == ["v2"]
+
+
+def test_retry_after_load_failure(registry, monkeypatch):
+    """后台加载失败时保持当前版本，并清除已记录的修改时间以便重试"""
+    monkeypatch.setattr(registry, "_create_inference", lambda version: FakeInference(version, fail=True))
+    registry._maybe_sync()
+    assert registry._state_mtime is not None
+    
+    asyncio.run(registry._stage("v2"))
+    assert registry.active_version == "v1"
+    assert registry.staging["status"] == "failed"
+    assert registry._state_mtime is None
+    
+    registry._maybe_sync()
+    assert registry.started == ["v2", "v2"]
+
+
+def test_sync_interval(registry, monkeypatch):
+    """未到同步间隔时不检查状态文件"""
+    monkeypatch.setattr(settings, "LOCAL_MODEL_REGISTRY_SYNC_INTERVAL", 3600)
+    registry._maybe_sync()
+    registry._maybe_sync()
+    assert registry.started == ["v2"]
+    with open(registry.state_path, "w", encoding="utf-8") as f:
+        json.dump({"active": "v3"}, f)
+    registry._maybe_sync()
+    assert registry.started == ["v2"]
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+测试流式multipart解析
+
+批量分类接口边接收边解析请求体：超过大小上限的部分只计数不保留数据，
+缺少boundary或请求体格式错误时抛出ValueError（接口返回400）
+
+用法（在项目根目录执行）：
+    python -m pytest tools/测试/test_multipart_stream.py
+"""
+
+import asyncio
+import hashlib
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+import pytest
+from app.utils.multipart_stream import MultipartStream
+
+BOUNDARY = "test-boundary-7d3a"
+CONTENT_TYPE = f"multipart/form-data; boundary={BOUNDARY}"
+
+
+def build_body(parts, closed: bool = True) -> bytes:
+    """按(name, filename, data)生成multipart请求体"""
+    body = b""
+    for name, filename, data in parts:
+        disposition = f'form-data; name="{name}"' + (f'; filename="{filename}"' if filename else "")
+        body += f"--{BOUNDARY}\r\nContent-Disposition: {disposition}\r\n\r\n".encode() + data + b"\r\n"
+    if closed:
+        body += f"--{BOUNDARY}--\r\n".encode()
+    return body
+
+
+async def chunked(data: bytes, size: int):
+    """按指定大小分块产出（模拟request.stream()）"""
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+def collect(body: bytes, max_file_size: int = 1024, chunk_size: int = 7):
+    """解析请求体，返回所有接收完成的部分"""
+    stream = MultipartStream(CONTENT_TYPE, max_file_size)
+    
+    async def run():
+        return [part async for part in stream.parts(chunked(body, chunk_size))]
+    
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64, 65536])
+def test_fields_and_files(chunk_size):
+    """表单字段和文件按顺序产出，与分块大小无关；文件边接收边计算SHA-256"""
+    image = os.urandom(300)
+    parts = collect(build_body([
+        ("image_hashes", None, b'["abc"]'),
+        ("images", "a.jpg", image),
+    ]), chunk_size=chunk_size)
+    
+    assert [(part.name, part.filename, part.is_file) for part in parts] == [
+        ("image_hashes", None, False),
+        ("images", "a.jpg", True),
+    ]
+    assert parts[0].text == '["abc"]'
+    assert parts[1].data == image
+    assert parts[1].size == len(image)
+    assert parts[1].sha256 == hashlib.sha256(image).hexdigest()
+
+
+def test_oversized_part():
+    """超过上限的部分标记too_large并丢弃数据，size仍为实际大小；后面的部分不受影响"""
+    parts = collect(build_body([
+        ("images", "big.jpg", b"x" * 5000),
+        ("images", "small.jpg", b"y" * 10),
+    ]), max_file_size=1024)
+    
+    big, small = parts
+    assert big.too_large
+    assert big.size == 5000
+    assert big.data == b""
+    assert not small.too_large
+    assert small.data == b"y" * 10
+
+
+def test_part_at_size_limit():
+    """正好等于上限的部分不算超限"""
+    (part,) = collect(build_body([("images", "a.jpg", b"z" * 1024)]), max_file_size=1024)
+    assert not part.too_large
+    assert part.size == 1024
+
+
+@pytest.mark.parametrize("content_type", [
+    "multipart/form-data",
+    "multipart/form-data; charset=utf-8",
+    "application/json; boundary=abc",
+    "",
+])
+def test_missing_boundary(content_type):
+    """不是multipart/form-data或缺少boundary时拒绝"""
+    with pytest.raises(ValueError):
+        MultipartStream(content_type, 1024)
+
+
+def test_body_with_wrong_boundary():
+    """请求体中的分隔符与Content-Type中的boundary不一致时抛出ValueError"""
+    body = build_body([("images", "a.jpg", b"data")]).replace(BOUNDARY.encode(), b"other-boundary-0000")
+    with pytest.raises(ValueError):
+        collect(body)
+
+
+def test_truncated_body():
+    """请求体在某个部分中间中断时只产出已接收完成的部分"""
+    body = build_body([
+        ("images", "a.jpg", b"first"),
+        ("images", "b.jpg", b"second-image-data"),
+    ], closed=False)
+    parts = collect(body[:-10])
+    assert [part.filename for part in parts] == ["a.jpg"]
+
+
+def test_empty_body():
+    assert collect(b"") == []
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+测试规则预分类
+
+规则命中时不调用任何模型，误判会直接返回错误类别：相机拍摄的照片（带Make/Model）不能命中任何规则，
+屏幕分辨率配置中格式不对的项要跳过而不是让每个请求出错
+
+用法（在项目根目录执行）：
+    python -m pytest tools/测试/test_pre_classifier.py
+"""
+
+import io
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+import pytest
+from PIL import Image
+from PIL.PngImagePlugin import PngInfo
+from app.config import settings
+from app.services.pre_classifier import PreClassifier
+from app.utils.image_probe import ImageProbe
+
+
+def make_probe(fmt: str = "PNG", size=(1170, 2532), software: str = "", make: str = "") -> ImageProbe:
+    """生成指定格式、尺寸和元数据的图片探针"""
+    output = io.BytesIO()
+    image = Image.new("RGB", size, (240, 240, 240))
+    exif = Image.Exif()
+    if make:
+        exif[0x010F] = make
+        exif[0x0110] = "Camera"
+    if fmt == "PNG":
+        info = PngInfo()
+        if software:
+            info.add_text("Software", software)
+        image.save(output, format="PNG", pnginfo=info, exif=exif.tobytes() if make else b"")
+    else:
+        if software:
+            exif[0x0131] = software
+        image.save(output, format="JPEG", exif=exif.tobytes())
+    return ImageProbe(output.getvalue())
+
+
+@pytest.fixture
+def classifier(monkeypatch):
+    monkeypatch.setattr(settings, "PRE_CLASSIFIER_RULES", "screenshot_metadata;screenshot_resolution")
+    return PreClassifier()
+
+
+def test_screenshot_resolution(classifier):
+    """没有相机EXIF、尺寸正好是手机屏幕分辨率的PNG命中（横竖屏均可）"""
+    assert classifier.classify(make_probe(size=(1170, 2532)))["rule"] == "screenshot_resolution"
+    assert classifier.classify(make_probe(size=(2532, 1170)))["rule"] == "screenshot_resolution"
+
+
+def test_screenshot_metadata(classifier):
+    """元数据标明是截图时命中，不限格式和尺寸"""
+    result = classifier.classify(make_probe(fmt="JPEG", size=(800, 600), software="Screenshot"))
+    assert result["category"] == "screenshot"
+    assert result["rule"] == "screenshot_metadata"
+    assert result["confidence"] == settings.PRE_CLASSIFIER_CONFIDENCE
+
+
+@pytest.mark.parametrize("probe_args", [
+    {"size": (1170, 2532), "make": "Apple"},
+    {"fmt": "JPEG", "size": (800, 600), "software": "Screenshot", "make": "Apple"},
+    {"fmt": "JPEG", "size": (1170, 2532)},
+    {"size": (1171, 2532)},
+])
+def test_no_hit(classifier, probe_args):
+    """相机照片、非PNG、非屏幕分辨率的图片不命中"""
+    assert classifier.classify(make_probe(**probe_args)) is None
+
+
+def test_disabled_rule(classifier, monkeypatch):
+    """未加入PRE_CLASSIFIER_RULES的规则不生效"""
+    monkeypatch.setattr(settings, "PRE_CLASSIFIER_RULES", "screenshot_metadata")
+    assert classifier.classify(make_probe(size=(1170, 2532))) is None
+
+
+def test_hit_stats(classifier):
+    """命中统计按规则计数，count=False时不计入"""
+    classifier.classify(make_probe(size=(1170, 2532)))
+    classifier.classify(make_probe(size=(1171, 2532)))
+    classifier.classify(make_probe(size=(1170, 2532)), count=False)
+    snapshot = classifier.snapshot()
+    assert snapshot["evaluated"] == 2
+    assert snapshot["hits"] == 1
+
+
+def test_malformed_resolutions(classifier, monkeypatch):
+    """格式不对的分辨率跳过，其余照常匹配"""
+    monkeypatch.setattr(settings, "PRE_CLASSIFIER_SCREEN_RESOLUTIONS", "1080x;abcx1920;0x100;x;1170X2532; 750x1334 ;;")
+    assert classifier.screen_resolutions() == {(1170, 2532), (750, 1334)}
+    assert classifier.classify(make_probe(size=(1170, 2532)))["rule"] == "screenshot_resolution"
+
+
+def test_resolutions_cached(classifier, monkeypatch):
+    """配置不变时复用解析结果，修改后重新解析"""
+    first = classifier.screen_resolutions()
+    assert classifier.screen_resolutions() is first
+    monkeypatch.setattr(settings, "PRE_CLASSIFIER_SCREEN_RESOLUTIONS", "100x200")
+    assert classifier.screen_resolutions() == {(100, 200)}
+
+
+def test_failing_rule_skipped(classifier):
+    """规则函数出错时跳过该规则，不影响其他规则"""
+    def broken(features):
+        raise KeyError("missing")
+    classifier.register_rule("screenshot_metadata", "screenshot", broken)
+    assert classifier.classify(make_probe(size=(1170, 2532)))["rule"] == "screenshot_resolution"
+
+
+def test_register_invalid_category(classifier):
+    with pytest.raises(ValueError):
+        classifier.register_rule("bad", "not_a_category", lambda features: None)